@@ -12,7 +12,7 @@ rtklib.
 
 import sys, time
 import bitstring as bs
-import satPosition, util, RTCMv2, positionEstimate
+import satPosition, util, RTCMv2, positionEstimate, orbitCache
 
 from bitstring import BitStream
 
@@ -40,6 +40,7 @@ corr_set = {}
 statid = 0 #initially only support 1 reference station
 
 eph = {}
+orbits = orbitCache.OrbitCache()
 prs = {}
 week = 0
 itow = 0
@@ -264,6 +265,8 @@ def decode_1019(pkt):
     l2p = pkt.read(1).uint
     fit = pkt.read(1).uint
 
+    if svid in eph and eph[svid].iode != iode:
+        orbits.evict(svid)
     eph[svid] = DynamicEph()
 
     eph[svid].crs = crs         * pow(2, -5)
@@ -299,26 +302,25 @@ def regen_v2_type1():
 
     errset = {}
     pranges = {}
-    for svid in prs:
 
-        if svid not in eph:
-            #print("Don't have ephemeris for {}, only {}".format(svid, eph.keys()))
-            continue
+    svids = [svid for svid in prs if svid in eph]
+    tofs = [prs[svid] / util.speedOfLight for svid in svids]
 
-        toc = eph[svid].toc
-        tof = prs[svid] / util.speedOfLight
+    # assume the time_of_week is the exact receiver time of week that the message arrived.
+    # subtract the time of flight to get the satellite transmit time
+    transmitTimes = [itow - tof for tof in tofs]
 
-        # assume the time_of_week is the exact receiver time of week that the message arrived.
-        # subtract the time of flight to get the satellite transmit time
-        transmitTime = itow - tof
-    
+    # satellite positions corrected for earths rotation during the time of flight
+    satposs = orbits.positions(eph, svids, transmitTimes, tofs)
+
+    for (svid, transmitTime) in zip(svids, transmitTimes):
+
+        toc = eph[svid].toc
         T = util.correctWeeklyTime(transmitTime - toc)
 
-        satpos = satPosition.satPosition_raw(eph[svid], svid, transmitTime)
+        satpos = satposs[svid]
         Trel = satpos.extra
 
-        satPosition.correctPosition_raw(satpos, tof)
-
         geo = satpos.distance(util.PosVector(*ref_pos))
     
         dTclck = eph[svid].af0 + eph[svid].af1 * T + eph[svid].af2 * T * T + Trel - eph[svid].Tgd
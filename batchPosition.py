@@ -0,0 +1,484 @@
+'''
+Batch position solutions for a whole log
+
+The per-epoch pipeline of positionEstimate, with carrier smoothing,
+satellite positions, clock, ionospheric and tropospheric corrections
+and a weighted least squares fix, run over every RXM_RAW epoch of a
+log with numpy operations stacked across epochs. Epochs are processed
+in chunks to bound memory.
+
+As the receiver position of each epoch is not known before it is
+solved, each chunk is solved twice: first without the atmospheric
+corrections and elevation weights, then with them computed from the
+first solution. The per-epoch pipeline uses the previous epoch's
+solution instead, so the two agree once that has converged.
+
+    (raw, ephemerides, ionospheric) = batchPosition.decodeLog('base.ubx')
+    sol = batchPosition.solveLog(raw, ephemerides, ionospheric)
+    batchPosition.saveSolutions(sol, 'base-solutions.npz')
+'''
+
+import numpy
+import util, ephemeris, satPosition, ublox
+import ublox.arrays
+
+# the per-satellite results have a column for each svid below this
+MAX_SVID = 33
+
+# per-satellite result columns
+SV_COLUMNS = ['residuals', 'azimuth', 'elevation']
+
+def decodeLog(filename):
+    '''decode the RXM_RAW, AID_EPH and RXM_SFRB messages of a log.
+
+    Returns (raw, ephemerides, ionospheric): raw is a structured array
+    of RXM_RAW records tagged with the iTOW and week of their message,
+    as from ublox.arrays.log_records(), and the others lists of
+    (time, EphemerisData) and (time, IonosphericData). The time of each
+    is the GPS time, in seconds since the GPS epoch, of the last
+    RXM_RAW epoch before the message arrived, or None if it came first
+    '''
+    dev = ublox.UBlox(filename)
+    dtype = ublox.arrays.record_dtype((ublox.CLASS_RXM, ublox.MSG_RXM_RAW))
+    chunks = []
+    epochs = []
+    ephemerides = []
+    ionospheric = []
+    last = None
+    while True:
+        msg = dev.receive_message()
+        if msg is None:
+            break
+        name = msg.name()
+        if not name in ['RXM_RAW', 'AID_EPH', 'RXM_SFRB']:
+            continue
+        try:
+            msg.unpack()
+            if name == 'RXM_RAW':
+                recs = ublox.arrays.records(msg)
+                last = msg.week * 604800 + msg.iTOW * 1.0e-3
+                chunks.append(recs)
+                epochs.append((msg.iTOW, msg.week, len(recs)))
+            elif name == 'AID_EPH':
+                eph = ephemeris.EphemerisData(msg)
+                if eph.valid:
+                    ephemerides.append((last, eph))
+            elif name == 'RXM_SFRB':
+                ion = ephemeris.IonosphericData(msg)
+                if ion.valid:
+                    ionospheric.append((last, ion))
+        except ublox.UBloxError:
+            continue
+    dev.close()
+
+    raw = numpy.empty(sum([e[2] for e in epochs]),
+                      dtype=[('iTOW', '<i4'), ('week', '<i2')] + [(f, dtype.fields[f][0]) for f in dtype.names])
+    if chunks:
+        recs = numpy.concatenate(chunks)
+        for f in dtype.names:
+            raw[f] = recs[f]
+        counts = [e[2] for e in epochs]
+        raw['iTOW'] = numpy.repeat([e[0] for e in epochs], counts)
+        raw['week'] = numpy.repeat([e[1] for e in epochs], counts)
+    return (raw, ephemerides, ionospheric)
+
+class _History:
+    '''the versions of some per-satellite data over time, such as the
+    ephemeris. Each version gets a number, and lookup() gives the
+    version in use by each satellite at some epochs'''
+    def __init__(self, entries, initial=None):
+        self.objects = []
+        self.times = {}
+        self.versions = {}
+        if initial is not None:
+            for svid in sorted(initial):
+                self._add(None, svid, initial[svid])
+        for (t, obj) in entries:
+            self._add(t, obj.svid, obj)
+
+    def _add(self, t, svid, obj):
+        if svid >= MAX_SVID:
+            return
+        versions = self.versions.setdefault(svid, [])
+        if versions and self.objects[versions[-1]] == obj:
+            # a repeat of the data in use changes nothing
+            return
+        if t is None:
+            t = -numpy.inf
+        self.times.setdefault(svid, []).append(t)
+        versions.append(len(self.objects))
+        self.objects.append(obj)
+
+    def lookup(self, times):
+        '''return an array of the version numbers in use by each svid at
+        some epoch times, -1 where there is none. Data arriving after
+        an epoch is first used by the next one'''
+        ret = -numpy.ones((len(times), MAX_SVID), dtype=int)
+        for svid in self.versions:
+            idx = numpy.searchsorted(self.times[svid], times, side='left') - 1
+            ret[:,svid] = numpy.where(idx >= 0, numpy.array(self.versions[svid])[idx], -1)
+        return ret
+
+    def arrays(self, fields):
+        '''return a dictionary of arrays of some attributes of each version'''
+        ret = {}
+        for f in fields:
+            ret[f] = numpy.array([getattr(obj, f) for obj in self.objects], dtype=float)
+        return ret
+
+class _Smoother:
+    '''carrier smoothing of pseudo-ranges for all satellites at once, as
+    prSmooth does one epoch at a time'''
+    def __init__(self, slipmax=15.0, Nmax=200):
+        self.slipmax = slipmax
+        self.Nmax = Nmax
+        self.N = numpy.zeros(MAX_SVID, dtype=int)
+        self.P = numpy.zeros(MAX_SVID)
+        self.C = numpy.zeros(MAX_SVID)
+        self.S = numpy.zeros(MAX_SVID)
+
+    def step(self, present, reset, Pn, Cn, lli):
+        '''step the filters with the pseudo-ranges and carrier phases of
+        one epoch. Satellites that have disappeared or have a new
+        ephemeris start again'''
+        N = numpy.where(present & ~reset, self.N, 0)
+        N = numpy.where(present, numpy.minimum(N + 1, self.Nmax), 0)
+        slip = numpy.where(N > 1, numpy.abs((Pn - self.P) - (Cn - self.C)), 0)
+        N = numpy.where(present & ((slip > self.slipmax) | (lli != 0)), 1, N)
+        Nf = numpy.maximum(N, 1).astype(float)
+        S = numpy.where(N == 1, Pn, Pn / Nf + (self.S + Cn - self.C) * (Nf - 1) / Nf)
+        self.N = N
+        self.S = numpy.where(present, S, 0)
+        self.P = numpy.where(present, Pn, 0)
+        self.C = numpy.where(present, Cn, 0)
+        return (self.S, self.N)
+
+def _ecefToLLH(X, Y, Z):
+    '''convert arrays of ECEF coordinates to latitude and longitude in
+    radians and altitude, as util.PosVector.ToLLH() does'''
+    a = util.radius_of_earth
+    e = 8.1819190842622e-2
+    b = numpy.sqrt(a*a * (1 - e*e))
+    ep = numpy.sqrt((a*a - b*b) / (b*b))
+    p = numpy.sqrt(X*X + Y*Y)
+    th = numpy.arctan2(a*Z, b*p)
+    lon = numpy.arctan2(Y, X)
+    lat = numpy.arctan2(Z + ep*ep*b*numpy.sin(th)**3, p - e*e*a*numpy.cos(th)**3)
+    n = a / numpy.sqrt(1 - e*e*numpy.sin(lat)**2)
+    alt = p / numpy.cos(lat) - n
+    return (lat, lon, alt)
+
+def _azimuthElevation(rx, satpos):
+    '''return the azimuth and elevation in radians of satellites at
+    satpos (epochs x svid x 3) from receivers at rx (epochs x 3), as
+    satPosition.calculateAzimuthElevation() does'''
+    x = rx[:,0:1]
+    y = rx[:,1:2]
+    z = rx[:,2:3]
+    p = numpy.sqrt(x*x + y*y)
+    R = numpy.sqrt(x*x + y*y + z*z)
+    ok = p > 0
+    p = numpy.where(ok, p, 1)
+    R = numpy.where(ok, R, 1)
+    d = satpos - rx[:,None,:]
+    east = (-y * d[:,:,0] + x * d[:,:,1]) / p
+    north = (-x*z * d[:,:,0] - y*z * d[:,:,1]) / (p*R) + p * d[:,:,2] / R
+    up = (x * d[:,:,0] + y * d[:,:,1] + z * d[:,:,2]) / R
+    dist = numpy.sqrt(east*east + north*north + up*up)
+    el = numpy.arcsin(numpy.clip(up / numpy.where(dist > 0, dist, 1), -1, 1))
+    az = numpy.arctan2(east, north) % (2 * util.gpsPi)
+    return (numpy.where(ok, az, 0), numpy.where(ok, el, 0))
+
+def _ionosphericCorrection(lat, lon, az, el, transmitTime, ion):
+    '''Klobuchar ionospheric delay in metres, as
+    rangeCorrection.ionospheric_correction(), for arrays of receiver
+    positions, satellite directions and times with ion a dictionary of
+    coefficient arrays'''
+    pi = util.gpsPi
+    Latu = lat / pi
+    Lonu = lon / pi
+    Az = az / pi
+    El = el / pi
+
+    phi = 0.0137 / (El + 0.11) - 0.022
+    Lati = numpy.clip(Latu + phi * numpy.cos(Az * pi), -0.416, 0.416)
+    Loni = Lonu + phi * numpy.sin(Az * pi) / numpy.cos(Lati * pi)
+    Latm = Lati + 0.064 * numpy.cos((Loni - 1.617) * pi)
+
+    T = (4.32E+4 * Loni + transmitTime) % 86400
+
+    F = 1.0 + 16.0 * (0.53 - El)**3
+
+    per = numpy.maximum(ion['b0'] + ion['b1'] * Latm + ion['b2'] * Latm**2 + ion['b3'] * Latm**3, 72000.0)
+    x = 2 * pi * (T - 50400.0) / per
+    amp = numpy.maximum(ion['a0'] + ion['a1'] * Latm + ion['a2'] * Latm**2 + ion['a3'] * Latm**3, 0.0)
+    dTiono = numpy.where(numpy.abs(x) >= 1.57, F * 5.0E-9,
+                         F * (5.0E-9 + amp * (1.0 - x*x / 2.0 + x**4 / 24.0)))
+    return dTiono * util.speedOfLight
+
+def _troposphericCorrection(lat, alt, el):
+    '''Saastamoinen tropospheric delay in metres, as
+    rangeCorrection.tropospheric_correction_sass()'''
+    humidity = 0.7
+    temp0 = 15.0
+    alt = alt[:,None]
+    lat = lat[:,None]
+    ok = (alt >= -100.0) & (alt <= 1e4) & (el > 0)
+    alt = numpy.where(ok, alt, 0)
+    pres = 1013.25 * (1.0 - 2.2557e-5 * alt)**5.2568
+    temp = temp0 - 6.5e-3 * alt + 273.16
+    e = 6.108 * humidity * numpy.exp((17.15 * temp - 4684.0) / (temp - 38.45))
+    cosz = numpy.cos(util.gpsPi / 2.0 - el)
+    trph = 0.0022768 * pres / (1.0 - 0.00266 * numpy.cos(2.0 * lat) - 0.00028 * alt/1e3) / cosz
+    trpw = 0.002277 * (1255.0 / temp + 0.05) * e / cosz
+    return numpy.where(ok, trph + trpw, 0)
+
+def _solve(satpos, pranges, weights, x0, iterations=10, tolerance=1.0e-4):
+    '''Gauss-Newton weighted least squares fits of position and clock
+    range for many epochs at once, as positionEstimate.positionWLS().
+    satpos is epochs x svid x 3, pranges and weights epochs x svid with
+    zero weight for unused satellites, and x0 the starting X, Y, Z and
+    clock range of each epoch. Returns (x, ok) where ok marks the
+    epochs with a solution'''
+    # only work on the satellites used somewhere
+    cols = numpy.nonzero((weights > 0).any(axis=0))[0]
+    satpos = satpos[:,cols]
+    pranges = pranges[:,cols]
+    weights = weights[:,cols]
+    ok = (weights > 0).sum(axis=1) >= 4
+    x = x0.copy()
+    dx = numpy.zeros_like(x)
+    Hw = numpy.empty(satpos.shape[0:2] + (4,))
+    Hw[:,:,3] = -weights
+    eye = numpy.eye(4)
+    for i in range(iterations):
+        los = x[:,None,0:3] - satpos
+        dist = numpy.sqrt((los*los).sum(axis=2))
+        dist = numpy.where(dist > 0, dist, 1)
+        residuals = (dist - (pranges + x[:,3:4])) * weights
+        # the analytic Jacobian: unit vectors from the satellites and -1 for the clock
+        Hw[:,:,0:3] = los * (weights / dist)[:,:,None]
+        HwT = Hw.transpose(0, 2, 1)
+        N = numpy.matmul(HwT, Hw)
+        rhs = -numpy.matmul(HwT, residuals[:,:,None])
+        # epochs without enough satellites get a null step
+        N[~ok] = eye
+        rhs[~ok] = 0
+        try:
+            dx = numpy.linalg.solve(N, rhs)[:,:,0]
+        except numpy.linalg.LinAlgError:
+            dx = numpy.zeros_like(x)
+            for e in numpy.nonzero(ok)[0]:
+                try:
+                    dx[e] = numpy.linalg.solve(N[e], rhs[e,:,0])
+                except numpy.linalg.LinAlgError:
+                    ok[e] = False
+        x += dx
+        if (dx*dx).sum(axis=1).max() < tolerance*tolerance:
+            break
+    ok &= (dx[:,0:3]**2).sum(axis=1) < 1.0
+    return (x, ok)
+
+def _dop(x, satpos, used, lat, lon):
+    '''return a dictionary of DOP arrays for the satellites marked in
+    used, seen from the fixes x'''
+    cols = numpy.nonzero(used.any(axis=0))[0]
+    los = satpos[:,cols] - x[:,None,0:3]
+    dist = numpy.sqrt((los*los).sum(axis=2))
+    G = numpy.empty(los.shape[0:2] + (4,))
+    G[:,:,0:3] = los / numpy.where(dist > 0, dist, 1)[:,:,None]
+    G[:,:,3] = 1.0
+    G *= used[:,cols,None]
+    ok = used.sum(axis=1) >= 4
+    N = numpy.matmul(G.transpose(0, 2, 1), G)
+    N[~ok] = numpy.eye(4)
+    Q = numpy.linalg.inv(N)
+    sl = numpy.sin(lat)
+    cl = numpy.cos(lat)
+    so = numpy.sin(lon)
+    co = numpy.cos(lon)
+    zero = numpy.zeros_like(lat)
+    R = numpy.array([[-so, co, zero],
+                     [-sl*co, -sl*so, cl],
+                     [cl*co, cl*so, sl]]).transpose(2, 0, 1)
+    enu = numpy.einsum('eij,ejk,eik->ei', R, Q[:,0:3,0:3], R)
+    t = Q[:,3,3]
+    ret = { 'gdop' : numpy.sqrt(enu.sum(axis=1) + t),
+            'pdop' : numpy.sqrt(enu.sum(axis=1)),
+            'hdop' : numpy.sqrt(enu[:,0] + enu[:,1]),
+            'vdop' : numpy.sqrt(enu[:,2]),
+            'tdop' : numpy.sqrt(t) }
+    for k in ret:
+        ret[k][~ok] = numpy.nan
+    return ret
+
+def solveLog(raw, ephemerides, ionospheric=[], initial_ephemeris=None, initial_ionospheric=None,
+             reference=None, chunk=3600, min_elevation=5.0, passes=2):
+    '''solve the position of every epoch of a log.
+
+    raw, ephemerides and ionospheric are as returned by decodeLog().
+    initial_ephemeris and initial_ionospheric are optional dictionaries
+    keyed by svid of data in use before the log starts, like those
+    SatelliteData loads. reference is an optional util.PosVector of the
+    true position, giving reference_clock_error and
+    reference_residuals. Epochs are solved chunk at a time, each with
+    passes fixes using the atmospheric corrections from the last.
+
+    Returns a dictionary of arrays with one row per epoch: week,
+    time_of_week, X, Y, Z, clock_error, lat, lon, alt, num_sv and the
+    DOPs, plus residuals, azimuth and elevation (in degrees) with a
+    column per svid, NaN where a satellite wasn't used
+    '''
+    c = util.speedOfLight
+    eph = _History(ephemerides, initial_ephemeris)
+    ion = _History(ionospheric, initial_ionospheric)
+    orbit = eph.arrays(satPosition.ORBIT_FIELDS + ['toc', 'af0', 'af1', 'af2', 'Tgd'])
+    klobuchar = ion.arrays(['a0', 'a1', 'a2', 'a3', 'b0', 'b1', 'b2', 'b3'])
+
+    # the rows of each epoch
+    key = raw['week'].astype(numpy.int64) * 604800000 + raw['iTOW']
+    starts = numpy.concatenate(([0], numpy.nonzero(numpy.diff(key))[0] + 1)) if len(raw) else numpy.zeros(0, dtype=int)
+    ends = numpy.concatenate((starts[1:], [len(raw)]))
+    nepochs = len(starts)
+
+    sol = {}
+    sol['week'] = raw['week'][starts].astype(int)
+    sol['time_of_week'] = raw['iTOW'][starts] * 1.0e-3
+    for f in ['X', 'Y', 'Z', 'clock_error', 'lat', 'lon', 'alt', 'gdop', 'pdop', 'hdop', 'vdop', 'tdop']:
+        sol[f] = numpy.full(nepochs, numpy.nan)
+    sol['num_sv'] = numpy.zeros(nepochs, dtype=int)
+    for f in SV_COLUMNS:
+        sol[f] = numpy.full((nepochs, MAX_SVID), numpy.nan)
+    if reference is not None:
+        sol['reference_clock_error'] = numpy.full(nepochs, numpy.nan)
+        sol['reference_residuals'] = numpy.full((nepochs, MAX_SVID), numpy.nan)
+
+    smoother = _Smoother()
+    last_eph = -numpy.ones(MAX_SVID, dtype=int)
+    last_x = numpy.zeros(4)
+    for first in range(0, nepochs, chunk):
+        epochs = numpy.arange(first, min(first + chunk, nepochs))
+        ne = len(epochs)
+        tow = sol['time_of_week'][epochs]
+        times = sol['week'][epochs] * 604800.0 + tow
+
+        # dense epoch x svid matrices of the measurements
+        rows = raw[starts[epochs[0]]:ends[epochs[-1]]]
+        e = numpy.repeat(numpy.arange(ne), ends[epochs] - starts[epochs])
+        sv = rows['sv'].astype(int)
+        keep = sv < MAX_SVID
+        (e, sv, rows) = (e[keep], sv[keep], rows[keep])
+        present = numpy.zeros((ne, MAX_SVID), dtype=bool)
+        present[e, sv] = True
+        Pm = numpy.zeros((ne, MAX_SVID))
+        Cm = numpy.zeros((ne, MAX_SVID))
+        lli = numpy.zeros((ne, MAX_SVID), dtype=int)
+        quality = numpy.zeros((ne, MAX_SVID), dtype=int)
+        Pm[e, sv] = rows['prMes']
+        Cm[e, sv] = rows['cpMes'] * (c / 1.57542e9)
+        lli[e, sv] = rows['lli']
+        quality[e, sv] = rows['mesQI']
+
+        # the ephemeris in use, with the smoothing restarted when it changes
+        ephidx = eph.lookup(times)
+        changed = ephidx != numpy.vstack((last_eph, ephidx[:-1]))
+        last_eph = ephidx[-1]
+        S = numpy.empty((ne, MAX_SVID))
+        N = numpy.empty((ne, MAX_SVID), dtype=int)
+        for i in range(ne):
+            (S[i], N[i]) = smoother.step(present[i], changed[i], Pm[i], Cm[i], lli[i])
+
+        # satellite positions and clock corrections of the usable measurements
+        valid = present & (ephidx >= 0)
+        (ve, vs) = numpy.nonzero(valid)
+        k = ephidx[ve, vs]
+        tof = S[ve, vs] / c
+        transmitTime = tow[ve] - tof
+        arrays = dict([(f, orbit[f][k]) for f in satPosition.ORBIT_FIELDS])
+        (pos, Trel) = satPosition.satPositions(arrays, transmitTime, tof)
+        T = transmitTime - orbit['toc'][k]
+        T = numpy.where(T > 302400, T - 604800, numpy.where(T < -302400, T + 604800, T))
+        sat_clock_error = orbit['af0'][k] + orbit['af1'][k] * T + orbit['af2'][k] * T * T + Trel
+        prc = numpy.zeros((ne, MAX_SVID))
+        prc[ve, vs] = S[ve, vs] + (sat_clock_error - orbit['Tgd'][k]) * c
+        satpos = numpy.zeros((ne, MAX_SVID, 3))
+        satpos[ve, vs] = pos
+
+        # weights from the receiver quality and the smoothing history
+        weights = numpy.zeros((ne, MAX_SVID))
+        weights[valid] = (1.0 / (8 - numpy.minimum(quality, 7))**2 * numpy.minimum(N / 20.0, 1.0))[valid]
+
+        # first fix without the atmosphere, from the last fix
+        x0 = numpy.tile(last_x, (ne, 1))
+        (x, ok) = _solve(satpos, prc, weights, x0)
+
+        # then fixes with the atmospheric corrections and elevation weights
+        # seen from the previous fix
+        ionidx = ion.lookup(times)
+        (ie, isv) = numpy.nonzero(valid & (ionidx >= 0))
+        tt = numpy.zeros((ne, MAX_SVID))
+        tt[ve, vs] = transmitTime
+        coefs = dict([(f, klobuchar[f][ionidx[ie, isv]]) for f in klobuchar])
+        max_el = numpy.radians(2 * min_elevation)
+        for i in range(passes):
+            (lat, lon, alt) = _ecefToLLH(x[:,0], x[:,1], x[:,2])
+            (az, el) = _azimuthElevation(x[:,0:3], satpos)
+            iono = numpy.zeros((ne, MAX_SVID))
+            if len(ie):
+                iono[ie, isv] = _ionosphericCorrection(lat[ie], lon[ie], az[ie, isv], el[ie, isv], tt[ie, isv], coefs)
+            tropo = _troposphericCorrection(lat, alt, el)
+            corrected = numpy.where(valid, prc - (iono + tropo), 0)
+            w = weights * (1.0 - (max_el - numpy.clip(el, numpy.radians(1), max_el)) / max_el)
+            (x, ok) = _solve(satpos, corrected, w, numpy.where(ok[:,None], x, x0))
+        (prc, weights) = (corrected, w)
+        if ok.any():
+            last_x = x[numpy.nonzero(ok)[0][-1]]
+
+        # results
+        (lat, lon, alt) = _ecefToLLH(x[:,0], x[:,1], x[:,2])
+        used = valid & (weights > 0) & ok[:,None]
+        los = x[:,None,0:3] - satpos
+        residuals = numpy.sqrt((los*los).sum(axis=2)) - (prc + x[:,3:4])
+        for (f, v) in [('X', x[:,0]), ('Y', x[:,1]), ('Z', x[:,2]), ('clock_error', x[:,3] / c),
+                       ('lat', numpy.degrees(lat)), ('lon', numpy.degrees(lon)), ('alt', alt)]:
+            sol[f][epochs] = numpy.where(ok, v, numpy.nan)
+        sol['num_sv'][epochs] = numpy.where(ok, used.sum(axis=1), 0)
+        dop = _dop(x, satpos, used, lat, lon)
+        for f in dop:
+            sol[f][epochs] = dop[f]
+        sol['residuals'][epochs] = numpy.where(used, residuals, numpy.nan)
+        sol['azimuth'][epochs] = numpy.where(used, numpy.degrees(az), numpy.nan)
+        sol['elevation'][epochs] = numpy.where(used, numpy.degrees(el), numpy.nan)
+
+        if reference is not None:
+            # with the position known the clock range is the weighted mean range error
+            d = satpos - numpy.array([reference.X, reference.Y, reference.Z])
+            err = numpy.sqrt((d*d).sum(axis=2)) - prc
+            w2 = numpy.where(used, weights * weights, 0)
+            den = w2.sum(axis=1)
+            b = (w2 * err).sum(axis=1) / numpy.where(den > 0, den, 1)
+            sol['reference_clock_error'][epochs] = numpy.where(den > 0, b / c, numpy.nan)
+            sol['reference_residuals'][epochs] = numpy.where(used, err - b[:,None], numpy.nan)
+    return sol
+
+def processLog(filename, initial_ephemeris=None, initial_ionospheric=None, reference=None,
+               chunk=3600, passes=2):
+    '''decode a log and solve all of its epochs, see solveLog()'''
+    (raw, ephemerides, ionospheric) = decodeLog(filename)
+    return solveLog(raw, ephemerides, ionospheric,
+                    initial_ephemeris=initial_ephemeris, initial_ionospheric=initial_ionospheric,
+                    reference=reference, chunk=chunk, passes=passes)
+
+def saveSolutions(sol, filename, compress=True):
+    '''save the result of solveLog() as a .npz archive of columns'''
+    if compress:
+        numpy.savez_compressed(filename, **sol)
+    else:
+        numpy.savez(filename, **sol)
+
+def loadSolutions(filename):
+    '''load solutions saved by saveSolutions() as a dictionary of arrays'''
+    archive = numpy.load(filename)
+    ret = dict([(k, archive[k]) for k in archive.files])
+    archive.close()
+    return ret
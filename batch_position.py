@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+'''
+solve the receiver position of every epoch of a log in one batch
+'''
+
+import sys, time
+import numpy
+import util, batchPosition
+
+from optparse import OptionParser
+
+parser = OptionParser("batch_position.py [options] <file>")
+parser.add_option("--output", help="solutions file (default <file>.pos.npz)", default=None)
+parser.add_option("--reference", help="reference position (lat,lon,alt)", default=None)
+parser.add_option("--ephemeris", help="saved ephemeris to start with, such as ephemeris.dat", default=None)
+parser.add_option("--ionospheric", help="saved ionospheric data to start with, such as ionospheric.dat", default=None)
+parser.add_option("--chunk", type='int', default=3600, help="epochs solved at a time")
+parser.add_option("--passes", type='int', default=2, help="fixes with atmospheric corrections per epoch")
+
+(opts, args) = parser.parse_args()
+
+if len(args) != 1:
+    print("usage: batch_position.py <file>")
+    sys.exit(1)
+
+filename = args[0]
+output = opts.output or filename + '.pos.npz'
+
+reference = None
+if opts.reference is not None:
+    reference = util.ParseLLH(opts.reference).ToECEF()
+
+initial_ephemeris = None
+if opts.ephemeris is not None:
+    initial_ephemeris = util.loadObject(opts.ephemeris)
+initial_ionospheric = None
+if opts.ionospheric is not None:
+    initial_ionospheric = util.loadObject(opts.ionospheric)
+
+t0 = time.time()
+(raw, ephemerides, ionospheric) = batchPosition.decodeLog(filename)
+t1 = time.time()
+sol = batchPosition.solveLog(raw, ephemerides, ionospheric,
+                             initial_ephemeris=initial_ephemeris,
+                             initial_ionospheric=initial_ionospheric,
+                             reference=reference, chunk=opts.chunk, passes=opts.passes)
+t2 = time.time()
+batchPosition.saveSolutions(sol, output)
+
+ok = ~numpy.isnan(sol['X'])
+print("%u of %u epochs solved, decoded in %.1fs, solved in %.1fs" % (
+    ok.sum(), len(ok), t1 - t0, t2 - t1))
+if ok.any():
+    avg = util.PosVector(numpy.mean(sol['X'][ok]), numpy.mean(sol['Y'][ok]), numpy.mean(sol['Z'][ok]))
+    print("average position %s" % avg.ToLLH())
+    print("std dev X %.2f Y %.2f Z %.2f m, median HDOP %.2f VDOP %.2f" % (
+        numpy.std(sol['X'][ok]), numpy.std(sol['Y'][ok]), numpy.std(sol['Z'][ok]),
+        numpy.median(sol['hdop'][ok]), numpy.median(sol['vdop'][ok])))
+    if reference is not None:
+        err = numpy.sqrt((sol['X'][ok] - reference.X)**2 + (sol['Y'][ok] - reference.Y)**2 +
+                         (sol['Z'][ok] - reference.Z)**2)
+        print("error from reference: mean %.2f max %.2f m" % (numpy.mean(err), numpy.max(err)))
+print("saved %s" % output)
@@ -3,7 +3,7 @@
 two receiver DGPS test code
 '''
 
-import ublox, sys, time, struct
+import ublox, ublox.reactor, sys, time, struct
 import ephemeris, util
 import RTCMv2
 
@@ -138,8 +138,8 @@ def svinfo_to_rtcm(svinfo):
 
     resid = {}
 
-    for i in range(msg.numCh):
-        sv = msg.recs[i].svid
+    for i in range(svinfo.numCh):
+        sv = svinfo.recs[i].svid
         tnow = time.time()
         if not sv in svid_seen or tnow > svid_seen[sv]+30:
             dev1.configure_poll(ublox.CLASS_AID, ublox.MSG_AID_EPH, struct.pack('<B', sv))
@@ -166,30 +166,24 @@ def svinfo_to_rtcm(svinfo):
             dev2.write(rtcm)
     
 
-last_msg1_time = time.time()
-last_msg2_time = time.time()
-last_msg3_time = time.time()
-
-def handle_device1(msg):
-    '''handle message from reference GPS'''
-    global messages, satinfo, itow, week, rx1_pos, svid_seen
-
-    if msg.name() in ['NAV_SVINFO', 'NAV_SOL', 'AID_EPH']:
-        try:
-            msg.unpack()
-        except ublox.UBloxError as e:
-            print(e)
-
-    if msg.name() == 'NAV_SVINFO':
-        svinfo_to_rtcm(msg)
-    elif msg.name() == 'NAV_SOL':
-        itow = msg.iTOW * 0.001
-        week = msg.week
-        rx1_pos = util.PosVector(msg.ecefX / 100., msg.ecefY / 100., msg.ecefZ / 100.)
-    elif msg.name() == 'AID_EPH':
-        eph = ephemeris.EphemerisData(msg)
-        if eph.valid:
-            svid_iode[eph.svid] = eph.iode
+def handle_sol1(msg):
+    '''handle solution from reference GPS'''
+    global itow, week, rx1_pos
+    itow = msg.iTOW * 0.001
+    week = msg.week
+    rx1_pos = util.PosVector(msg.ecefX / 100., msg.ecefY / 100., msg.ecefZ / 100.)
+
+def handle_eph1(msg):
+    '''handle ephemeris from reference GPS'''
+    eph = ephemeris.EphemerisData(msg)
+    if eph.valid:
+        svid_iode[eph.svid] = eph.iode
+
+def subscribe_device1(dev):
+    '''register the handlers for the reference GPS'''
+    dev.subscribe((ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO), svinfo_to_rtcm)
+    dev.subscribe((ublox.CLASS_NAV, ublox.MSG_NAV_SOL), handle_sol1)
+    dev.subscribe((ublox.CLASS_AID, ublox.MSG_AID_EPH), handle_eph1)
 
 errlog = open('errlog.txt', mode='w')
 errlog.write("normal DGPS normal-XY DGPS-XY\n")
@@ -197,70 +191,85 @@ errlog.write("normal DGPS normal-XY DGPS-XY\n")
 def display_diff(name, pos1, pos2):
     print("%13s err: %6.2f errXY: %6.2f pos=%s" % (name, pos1.distance(pos2), pos1.distanceXY(pos2), pos1.ToLLH()))
 
+def handle_dgps2(msg):
+    '''handle DGPS status from rover GPS'''
+    print("DGPS: age=%u numCh=%u" % (msg.age, msg.numCh))
+
 def handle_device2(msg):
-    '''handle message from rover GPS'''
-    if msg.name() == 'NAV_DGPS':
-        msg.unpack()
-        print("DGPS: age=%u numCh=%u" % (msg.age, msg.numCh))
-    if msg.name() == "NAV_POSECEF":
-        msg.unpack()
-        rx2_pos = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
-
-        print("-----------------")
-        display_diff("RECV1<->RECV2", rx1_pos, rx2_pos)
-        
-        if dev3 is not None:
-            display_diff("RECV1<->RECV3", rx1_pos, rx3_pos)
-            errlog.write("%f %f %f %f\n" % (
-                rx1_pos.distance(rx3_pos),
-                rx1_pos.distance(rx2_pos),
-                rx1_pos.distanceXY(rx3_pos),
-                rx1_pos.distanceXY(rx2_pos)))
-            errlog.flush()
+    '''handle position from rover GPS'''
+    rx2_pos = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
+
+    print("-----------------")
+    display_diff("RECV1<->RECV2", rx1_pos, rx2_pos)
+    
+    if dev3 is not None:
+        display_diff("RECV1<->RECV3", rx1_pos, rx3_pos)
+        errlog.write("%f %f %f %f\n" % (
+            rx1_pos.distance(rx3_pos),
+            rx1_pos.distance(rx2_pos),
+            rx1_pos.distanceXY(rx3_pos),
+            rx1_pos.distanceXY(rx2_pos)))
+        errlog.flush()
+
+def subscribe_device2(dev):
+    '''register the handlers for the rover GPS'''
+    dev.subscribe((ublox.CLASS_NAV, ublox.MSG_NAV_DGPS), handle_dgps2)
+    dev.subscribe((ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF), handle_device2)
 
 def handle_device3(msg):
+    '''handle position from uncorrected rover GPS'''
     global rx3_pos
-    '''handle message from uncorrected rover GPS'''
-    if msg.name() == "NAV_POSECEF":
-        msg.unpack()
-        pos = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
-        rx3_pos = pos
+    pos = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
+    rx3_pos = pos
+
+def subscribe_device3(dev):
+    '''register the handlers for the uncorrected rover GPS'''
+    dev.subscribe((ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF), handle_device3)
                                             
 
-while True:
-    # get a message from the reference GPS
-    msg = dev1.receive_message_noerror()
-    if msg is not None:
-        handle_device1(msg)
-        last_msg1_time = time.time()
+def reopen_device1(dev):
+    global dev1
+    reactor.remove(dev1)
+    dev1.close()
+    dev1 = setup_port(opts.port1, opts.log1, append=True)
+    subscribe_device1(dev1)
+    reactor.add(dev1, idle_timeout=idle_timeout, idle_handler=reopen_device1)
+    sys.stdout.write('R1')
+    sys.stdout.flush()
 
-    msg = dev2.receive_message_noerror()
-    if msg is not None:
-        handle_device2(msg)
-        last_msg2_time = time.time()
+def reopen_device2(dev):
+    global dev2
+    reactor.remove(dev2)
+    dev2.close()
+    dev2 = setup_port(opts.port2, opts.log2, append=True)
+    subscribe_device2(dev2)
+    reactor.add(dev2, idle_timeout=idle_timeout, idle_handler=reopen_device2)
+    sys.stdout.write('R2')
+    sys.stdout.flush()
 
-    if dev3 is not None:
-        msg = dev3.receive_message_noerror()
-        if msg is not None:
-            handle_device3(msg)
-            last_msg3_time = time.time()
-
-    if opts.reopen and time.time() > last_msg1_time + 5:
-        dev1.close()
-        dev1 = setup_port(opts.port1, opts.log1, append=True)
-        last_msg1_time = time.time()
-        sys.stdout.write('R1')
-
-    if opts.reopen and time.time() > last_msg2_time + 5:
-        dev2.close()
-        dev2 = setup_port(opts.port2, opts.log2, append=True)
-        last_msg2_time = time.time()
-        sys.stdout.write('R2')
-
-    if dev3 is not None and opts.reopen and time.time() > last_msg3_time + 5:
-        dev3.close()
-        dev3 = setup_port(opts.port3, opts.log3, append=True)
-        last_msg3_time = time.time()
-        sys.stdout.write('R3')
+def reopen_device3(dev):
+    global dev3
+    reactor.remove(dev3)
+    dev3.close()
+    dev3 = setup_port(opts.port3, opts.log3, append=True)
+    subscribe_device3(dev3)
+    reactor.add(dev3, idle_timeout=idle_timeout, idle_handler=reopen_device3)
+    sys.stdout.write('R3')
+    sys.stdout.flush()
+
+# each receiver is handled as soon as its messages arrive
+reactor = ublox.reactor.UBloxReactor()
+idle_timeout = None
+if opts.reopen:
+    idle_timeout = 5
+subscribe_device1(dev1)
+subscribe_device2(dev2)
+reactor.add(dev1, idle_timeout=idle_timeout, idle_handler=reopen_device1)
+reactor.add(dev2, idle_timeout=idle_timeout, idle_handler=reopen_device2)
+if dev3 is not None:
+    subscribe_device3(dev3)
+    reactor.add(dev3, idle_timeout=idle_timeout, idle_handler=reopen_device3)
 
+while True:
+    reactor.run_once()
     sys.stdout.flush()
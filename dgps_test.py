@@ -3,7 +3,7 @@
 two receiver DGPS test code
 '''
 
-import ublox, sys, time, struct
+import ublox, ublox.reactor, sys, time, struct
 import ephemeris, util, positionEstimate, satelliteData
 import RTCMv2
 
@@ -84,34 +84,43 @@ if opts.module_reset:
         dev3 = None
 
 
-dev1.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH, 1)
-dev1.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF, 1)
-dev1.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_RAW, 1)
-dev1.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SFRB, 1)
-dev1.configure_message_rate(ublox.CLASS_AID, ublox.MSG_AID_EPH, 1)
-dev1.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO, 1)
-dev1.configure_solution_rate(rate_ms=200)
-
-
-dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH, 1)
-dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF, 1)
-dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_DGPS, 1)
-dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO, 1)
-dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELECEF, 0)
-dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELNED, 0)
-dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
-dev2.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SVSI, 0)
-dev2.configure_solution_rate(rate_ms=1000)
+with dev1.transaction() as t:
+    dev1.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH, 1)
+    dev1.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF, 1)
+    dev1.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_RAW, 1)
+    dev1.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SFRB, 1)
+    dev1.configure_message_rate(ublox.CLASS_AID, ublox.MSG_AID_EPH, 1)
+    dev1.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO, 1)
+    dev1.configure_solution_rate(rate_ms=200)
+for r in t.failed():
+    print(r)
+
+
+with dev2.transaction() as t:
+    dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH, 1)
+    dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF, 1)
+    dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_DGPS, 1)
+    dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO, 1)
+    dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELECEF, 0)
+    dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELNED, 0)
+    dev2.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
+    dev2.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SVSI, 0)
+    dev2.configure_solution_rate(rate_ms=1000)
+for r in t.failed():
+    print(r)
 
 if dev3 is not None:
-    dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH, 1)
-    dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF, 1)
-    dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO, 0)
-    dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELECEF, 0)
-    dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELNED, 0)
-    dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
-    dev3.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SVSI, 0)
-    dev3.configure_solution_rate(rate_ms=1000)
+    with dev3.transaction() as t:
+        dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH, 1)
+        dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF, 1)
+        dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO, 0)
+        dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELECEF, 0)
+        dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELNED, 0)
+        dev3.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
+        dev3.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SVSI, 0)
+        dev3.configure_solution_rate(rate_ms=1000)
+    for r in t.failed():
+        print(r)
 
 # we want the ground station to use a stationary model, and the roving
 # GPS to use a highly dynamic model
@@ -194,10 +203,6 @@ def handle_rxm_raw(msg):
             dev1.configure_poll(ublox.CLASS_AID, ublox.MSG_AID_EPH, struct.pack('<B', sv))
             svid_seen[sv] = tnow
 
-last_msg1_time = time.time()
-last_msg2_time = time.time()
-last_msg3_time = time.time()
-
 messages = {}
 satinfo = satelliteData.SatelliteData()
 
@@ -214,18 +219,21 @@ satinfo.min_quality = opts.minquality
 
 def handle_device1(msg):
     '''handle message from reference GPS'''
-    global messages, satinfo
-    
-    if msg.name() in [ 'RXM_RAW', 'NAV_POSECEF', 'RXM_SFRB', 'RXM_RAW', 'AID_EPH', 'NAV_POSECEF' ]:
-        try:
-            msg.unpack()
-            messages[msg.name()] = msg
-            satinfo.add_message(msg)
-        except ublox.UBloxError as e:
-            print(e)
-    if msg.name() == 'RXM_RAW':
-        handle_rxm_raw(msg)
-        position_estimate(messages, satinfo)
+    messages[msg.name()] = msg
+    satinfo.add_message(msg)
+
+def handle_device1_raw(msg):
+    '''handle raw measurements from reference GPS'''
+    handle_device1(msg)
+    handle_rxm_raw(msg)
+    position_estimate(messages, satinfo)
+
+def subscribe_device1(dev):
+    '''register the handlers for the reference GPS'''
+    dev.subscribe([(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF),
+                   (ublox.CLASS_RXM, ublox.MSG_RXM_SFRB),
+                   (ublox.CLASS_AID, ublox.MSG_AID_EPH)], handle_device1)
+    dev.subscribe((ublox.CLASS_RXM, ublox.MSG_RXM_RAW), handle_device1_raw)
 
 if opts.append:
     errlog = open(time.strftime('errlog-%y%m%d-%H%M.txt'), mode='a')
@@ -238,90 +246,104 @@ def display_diff(name, pos1, pos2):
 
 pos_count = 0
 
+def handle_dgps2(msg):
+    '''handle DGPS status from rover GPS'''
+    print("DGPS: age=%u numCh=%u pos_count=%u" % (msg.age, msg.numCh, pos_count))
+
 def handle_device2(msg):
-    '''handle message from rover GPS'''
+    '''handle position from rover GPS'''
     global pos_count
-    if msg.name() == 'NAV_DGPS':
-        msg.unpack()
-        print("DGPS: age=%u numCh=%u pos_count=%u" % (msg.age, msg.numCh, pos_count))
-    if msg.name() == "NAV_POSECEF":
-        msg.unpack()
-        pos = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
-        satinfo.recv2_position = pos
-        if satinfo.average_position is None or satinfo.position_estimate is None:
-            return
-        print("-----------------")
-        display_diff("RECV1<->RECV2", satinfo.receiver_position, pos)
-        display_diff("RECV2<->AVG",   satinfo.receiver_position, satinfo.average_position)
-        display_diff("AVG<->RECV1",   satinfo.average_position, satinfo.receiver_position)
-        display_diff("AVG<->RECV2",   satinfo.average_position, pos)
-        if satinfo.reference_position is not None:
-            display_diff("REF<->AVG",   satinfo.reference_position, satinfo.average_position)
-            display_diff("POS<->REF",   satinfo.position_estimate, satinfo.reference_position)
-            if satinfo.rtcm_position is not None:
-                display_diff("RTCM<->REF", satinfo.rtcm_position, satinfo.reference_position)                
-                display_diff("RTCM<->RECV2", satinfo.rtcm_position, satinfo.recv2_position)                
-            display_diff("RECV1<->REF", satinfo.receiver_position, satinfo.reference_position)
-            display_diff("RECV2<->REF", satinfo.recv2_position, satinfo.reference_position)
-            pos_count += 1
-            if satinfo.recv3_position is not None:
-                display_diff("RECV3<->REF", satinfo.recv3_position, satinfo.reference_position)
-                errlog.write("%f %f %f %f\n" % (
-                    satinfo.reference_position.distance(satinfo.recv3_position),
-                    satinfo.reference_position.distance(satinfo.recv2_position),
-                    satinfo.reference_position.distanceXY(satinfo.recv3_position),
-                    satinfo.reference_position.distanceXY(satinfo.recv2_position)))
-                errlog.flush()
-            else:
-                errlog.write("%f %f %f %f\n" % (
-                    satinfo.reference_position.distance(satinfo.receiver_position),
-                    satinfo.reference_position.distance(satinfo.recv2_position),
-                    satinfo.reference_position.distanceXY(satinfo.receiver_position),
-                    satinfo.reference_position.distanceXY(satinfo.recv2_position)))
-                errlog.flush()
+    pos = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
+    satinfo.recv2_position = pos
+    if satinfo.average_position is None or satinfo.position_estimate is None:
+        return
+    print("-----------------")
+    display_diff("RECV1<->RECV2", satinfo.receiver_position, pos)
+    display_diff("RECV2<->AVG",   satinfo.receiver_position, satinfo.average_position)
+    display_diff("AVG<->RECV1",   satinfo.average_position, satinfo.receiver_position)
+    display_diff("AVG<->RECV2",   satinfo.average_position, pos)
+    if satinfo.reference_position is not None:
+        display_diff("REF<->AVG",   satinfo.reference_position, satinfo.average_position)
+        display_diff("POS<->REF",   satinfo.position_estimate, satinfo.reference_position)
+        if satinfo.rtcm_position is not None:
+            display_diff("RTCM<->REF", satinfo.rtcm_position, satinfo.reference_position)                
+            display_diff("RTCM<->RECV2", satinfo.rtcm_position, satinfo.recv2_position)                
+        display_diff("RECV1<->REF", satinfo.receiver_position, satinfo.reference_position)
+        display_diff("RECV2<->REF", satinfo.recv2_position, satinfo.reference_position)
+        pos_count += 1
+        if satinfo.recv3_position is not None:
+            display_diff("RECV3<->REF", satinfo.recv3_position, satinfo.reference_position)
+            errlog.write("%f %f %f %f\n" % (
+                satinfo.reference_position.distance(satinfo.recv3_position),
+                satinfo.reference_position.distance(satinfo.recv2_position),
+                satinfo.reference_position.distanceXY(satinfo.recv3_position),
+                satinfo.reference_position.distanceXY(satinfo.recv2_position)))
+            errlog.flush()
+        else:
+            errlog.write("%f %f %f %f\n" % (
+                satinfo.reference_position.distance(satinfo.receiver_position),
+                satinfo.reference_position.distance(satinfo.recv2_position),
+                satinfo.reference_position.distanceXY(satinfo.receiver_position),
+                satinfo.reference_position.distanceXY(satinfo.recv2_position)))
+            errlog.flush()
+
+def subscribe_device2(dev):
+    '''register the handlers for the rover GPS'''
+    dev.subscribe((ublox.CLASS_NAV, ublox.MSG_NAV_DGPS), handle_dgps2)
+    dev.subscribe((ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF), handle_device2)
 
 def handle_device3(msg):
-    '''handle message from uncorrected rover GPS'''
-    if msg.name() == "NAV_POSECEF":
-        msg.unpack()
-        pos = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
-        satinfo.recv3_position = pos
-                                            
+    '''handle position from uncorrected rover GPS'''
+    pos = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
+    satinfo.recv3_position = pos
+
+def subscribe_device3(dev):
+    '''register the handlers for the uncorrected rover GPS'''
+    dev.subscribe((ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF), handle_device3)
+
+def reopen_device1(dev):
+    global dev1
+    reactor.remove(dev1)
+    dev1.close()
+    dev1 = setup_port(opts.port1, opts.log1, append=True)
+    subscribe_device1(dev1)
+    reactor.add(dev1, idle_timeout=idle_timeout, idle_handler=reopen_device1)
+    sys.stdout.write('R1')
+    sys.stdout.flush()
 
-while True:
-    # get a message from the reference GPS
-    msg = dev1.receive_message_noerror()
-    if msg is not None:
-        handle_device1(msg)
-        last_msg1_time = time.time()
+def reopen_device2(dev):
+    global dev2
+    reactor.remove(dev2)
+    dev2.close()
+    dev2 = setup_port(opts.port2, opts.log2, append=True)
+    subscribe_device2(dev2)
+    reactor.add(dev2, idle_timeout=idle_timeout, idle_handler=reopen_device2)
+    sys.stdout.write('R2')
+    sys.stdout.flush()
 
-    msg = dev2.receive_message_noerror()
-    if msg is not None:
-        handle_device2(msg)
-        last_msg2_time = time.time()
+def reopen_device3(dev):
+    global dev3
+    reactor.remove(dev3)
+    dev3.close()
+    dev3 = setup_port(opts.port3, opts.log3, append=True)
+    subscribe_device3(dev3)
+    reactor.add(dev3, idle_timeout=idle_timeout, idle_handler=reopen_device3)
+    sys.stdout.write('R3')
+    sys.stdout.flush()
 
-    if dev3 is not None:
-        msg = dev3.receive_message_noerror()
-        if msg is not None:
-            handle_device3(msg)
-            last_msg3_time = time.time()
-
-    if opts.reopen and time.time() > last_msg1_time + 5:
-        dev1.close()
-        dev1 = setup_port(opts.port1, opts.log1, append=True)
-        last_msg1_time = time.time()
-        sys.stdout.write('R1')
-
-    if opts.reopen and time.time() > last_msg2_time + 5:
-        dev2.close()
-        dev2 = setup_port(opts.port2, opts.log2, append=True)
-        last_msg2_time = time.time()
-        sys.stdout.write('R2')
-
-    if dev3 is not None and opts.reopen and time.time() > last_msg3_time + 5:
-        dev3.close()
-        dev3 = setup_port(opts.port3, opts.log3, append=True)
-        last_msg3_time = time.time()
-        sys.stdout.write('R3')
+# each receiver is handled as soon as its messages arrive
+reactor = ublox.reactor.UBloxReactor()
+idle_timeout = None
+if opts.reopen:
+    idle_timeout = 5
+subscribe_device1(dev1)
+subscribe_device2(dev2)
+reactor.add(dev1, idle_timeout=idle_timeout, idle_handler=reopen_device1)
+reactor.add(dev2, idle_timeout=idle_timeout, idle_handler=reopen_device2)
+if dev3 is not None:
+    subscribe_device3(dev3)
+    reactor.add(dev3, idle_timeout=idle_timeout, idle_handler=reopen_device3)
 
+while True:
+    reactor.run_once()
     sys.stdout.flush()
@@ -3,7 +3,7 @@
 Locally-generated DGPS corrections, publish as UDP datagrams
 '''
 
-import ublox, sys, time, socket, struct
+import ublox, ublox.reactor, sys, time, socket, struct
 import ephemeris, util, positionEstimate, satelliteData
 import RTCMv2
 
@@ -100,8 +100,6 @@ def handle_rxm_raw(msg):
             dev1.configure_poll(ublox.CLASS_AID, ublox.MSG_AID_EPH, struct.pack('<B', sv))
             svid_seen[sv] = tnow
 
-last_msg1_time = time.time()
-
 messages = {}
 satinfo = satelliteData.SatelliteData()
 
@@ -120,18 +118,21 @@ satinfo.min_quality = opts.minquality
 
 def handle_device1(msg):
     '''handle message from reference GPS'''
-    global messages, satinfo
-    
-    if msg.name() in [ 'RXM_RAW', 'NAV_POSECEF', 'RXM_SFRB', 'RXM_RAW', 'AID_EPH', 'NAV_POSECEF' ]:
-        try:
-            msg.unpack()
-            messages[msg.name()] = msg
-            satinfo.add_message(msg)
-        except ublox.UBloxError as e:
-            print(e)
-    if msg.name() == 'RXM_RAW':
-        handle_rxm_raw(msg)
-        position_estimate(messages, satinfo)
+    messages[msg.name()] = msg
+    satinfo.add_message(msg)
+
+def handle_device1_raw(msg):
+    '''handle raw measurements from reference GPS'''
+    handle_device1(msg)
+    handle_rxm_raw(msg)
+    position_estimate(messages, satinfo)
+
+def subscribe_device1(dev):
+    '''register the handlers for the reference GPS'''
+    dev.subscribe([(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF),
+                   (ublox.CLASS_RXM, ublox.MSG_RXM_SFRB),
+                   (ublox.CLASS_AID, ublox.MSG_AID_EPH)], handle_device1)
+    dev.subscribe((ublox.CLASS_RXM, ublox.MSG_RXM_RAW), handle_device1_raw)
 
 def position_estimate(messages, satinfo):
     '''process raw messages to calculate position
@@ -168,21 +169,24 @@ def position_estimate(messages, satinfo):
 
 pos_count = 0
 
-while True:
-    # get a message from the reference GPS
-    msg = dev1.receive_message_noerror()
-    if msg is None:
-        time.sleep(0.1)
-        continue
-
-    #if msg is not None:
-    handle_device1(msg)
-    last_msg1_time = time.time()
+def reopen_device1(dev):
+    global dev1
+    reactor.remove(dev1)
+    dev1.close()
+    dev1 = setup_port(opts.port, opts.log, append=True)
+    subscribe_device1(dev1)
+    reactor.add(dev1, idle_timeout=idle_timeout, idle_handler=reopen_device1)
+    sys.stdout.write('R1')
+    sys.stdout.flush()
 
-    if opts.reopen and time.time() > last_msg1_time + 5:
-        dev1.close()
-        dev1 = setup_port(opts.port1, opts.log1, append=True)
-        last_msg1_time = time.time()
-        sys.stdout.write('R1')
+# corrections are sent as soon as the messages they need arrive
+reactor = ublox.reactor.UBloxReactor()
+idle_timeout = None
+if opts.reopen:
+    idle_timeout = 5
+subscribe_device1(dev1)
+reactor.add(dev1, idle_timeout=idle_timeout, idle_handler=reopen_device1)
 
+while True:
+    reactor.run_once()
     sys.stdout.flush()
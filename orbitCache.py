@@ -0,0 +1,116 @@
+'''
+cache of satellite orbits as Chebyshev polynomials
+
+The orbit of each ephemeris is fitted piecewise over its fit interval on
+first use, after which a satellite position is a few multiply-adds
+instead of the full Keplerian model of satPosition
+'''
+
+import util, satPosition
+from collections import OrderedDict
+
+class OrbitCache:
+    '''hold Chebyshev fits of satellite orbits, keyed by (svid, IODE, toe)'''
+    def __init__(self, span=7200.0, segment=900.0, degree=9, max_entries=64):
+        # fits cover toe-span to toe+span in segments of segment seconds
+        self.span = span
+        self.segment = segment
+        self.degree = degree
+        self.max_entries = max_entries
+        self.nsegments = int(2 * span / segment + 0.5)
+        self.fits = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def evict(self, svid):
+        '''forget the fits for a svid - used on IODE change'''
+        for key in [k for k in self.fits if k[0] == svid]:
+            self.fits.pop(key)
+
+    def clear(self):
+        '''forget all fits'''
+        self.fits.clear()
+
+    def _fit(self, eph):
+        '''fit X, Y, Z and the relativistic term of an ephemeris over its
+        fit interval. Returns an array of coefficients indexed by
+        segment, coefficient and component'''
+        import numpy
+        from numpy.polynomial import chebyshev
+        n = self.degree + 1
+        # Chebyshev nodes on [-1,1]
+        nodes = numpy.cos(numpy.pi * (numpy.arange(n) + 0.5) / n)
+        starts = -self.span + self.segment * numpy.arange(self.nsegments)
+        times = (starts[:,None] + (nodes[None,:] + 1) * 0.5 * self.segment).ravel()
+        arrays = satPosition.ephemerisArrays([eph])
+        for f in arrays:
+            arrays[f] = arrays[f].repeat(len(times))
+        pos, rel = satPosition.satPositions(arrays, eph.toe + times)
+        values = numpy.hstack((pos, rel[:,None])).reshape(self.nsegments, n, 4)
+        coefs = numpy.empty((self.nsegments, n, 4))
+        for s in range(self.nsegments):
+            coefs[s] = chebyshev.chebfit(nodes, values[s], self.degree)
+        return coefs
+
+    def _coefs(self, svid, eph):
+        '''return the fit for an ephemeris, fitting it if needed. Returns
+        None for ephemerides that can't be fitted'''
+        key = (svid, getattr(eph, 'iode', None), getattr(eph, 'toe', None))
+        coefs = self.fits.get(key, None)
+        if coefs is not None:
+            self.hits += 1
+            return coefs
+        if key[1] is None or not all(hasattr(eph, f) for f in satPosition.ORBIT_FIELDS):
+            return None
+        self.misses += 1
+        coefs = self._fit(eph)
+        self.fits[key] = coefs
+        while len(self.fits) > self.max_entries:
+            self.fits.popitem(last=False)
+        return coefs
+
+    def positions(self, eph, svids, transmitTimes, time_of_flight=None):
+        '''calculate the positions of the satellites in svids at their
+        transmitTimes, like satPosition.satPositionVectors(). Times
+        outside the fit interval use the full orbit model'''
+        import numpy
+        from numpy.polynomial import chebyshev
+        svids = list(svids)
+        transmitTimes = numpy.asarray(transmitTimes, dtype=float)
+        if time_of_flight is not None:
+            time_of_flight = numpy.asarray(time_of_flight, dtype=float)
+        ret = {}
+        fitted = []
+        coefs = []
+        x = []
+        others = []
+        for k, t in enumerate(transmitTimes.tolist()):
+            svid = svids[k]
+            c = self._coefs(svid, eph[svid])
+            if c is None:
+                others.append(k)
+                continue
+            T = util.correctWeeklyTime(t - eph[svid].toe)
+            s = int((T + self.span) // self.segment)
+            if s < 0 or s >= self.nsegments:
+                others.append(k)
+                continue
+            fitted.append(k)
+            coefs.append(c[s])
+            # position within the segment scaled to [-1,1]
+            x.append(2 * (T + self.span - s * self.segment) / self.segment - 1)
+
+        if others:
+            ret.update(satPosition.satPositionVectors(eph, [svids[k] for k in others],
+                                                      transmitTimes[others],
+                                                      None if time_of_flight is None else time_of_flight[others]))
+        if not fitted:
+            return ret
+
+        # the Chebyshev polynomials at each x, dotted with the coefficients
+        values = numpy.einsum('nj,njc->nc', chebyshev.chebvander(x, self.degree), numpy.array(coefs))
+        if time_of_flight is not None:
+            satPosition.correctPositions(values, time_of_flight[fitted])
+        for i, v in enumerate(values.tolist()):
+            ret[svids[fitted[i]]] = util.PosVector(v[0], v[1], v[2], extra=v[3])
+        return ret
@@ -17,82 +17,160 @@ def save_satlog(t, errset):
     satlog.write(str(t) + "," + ",".join(eset) + "\n")
     satlog.flush()
 
-def positionErrorFunction(p, data):
-    '''error function for least squares position fit'''
-    pos = util.PosVector(p[0], p[1], p[2])
-    recv_clockerr = p[3]
-    ret = []
-    for d in data:
-        satpos, prange, weight = d
-        dist = pos.distance(satpos)
-        ret.append((dist - (prange + util.speedOfLight*recv_clockerr))*weight)
-    return ret
-
-def positionLeastSquares_ranges(satinfo, pranges, lastpos, last_clock_error, weights=None):
+class PositionSolution:
+    '''a weighted least squares position fix'''
+    def __init__(self, pos, clock_error, covariance, dop, residuals, iterations):
+        # ECEF position, with the receiver clock error in .extra
+        self.pos = pos
+        # receiver clock error in seconds
+        self.clock_error = clock_error
+        # 4x4 covariance of X, Y, Z in m^2 and the clock error in s^2, scaled by
+        # the a posteriori variance of unit weight
+        self.covariance = covariance
+        # dictionary of GDOP, PDOP, HDOP, VDOP and TDOP
+        self.dop = dop
+        # weighted residuals of the pseudo-ranges in metres
+        self.residuals = residuals
+        self.iterations = iterations
+
+def calculateDOP(satpos, pos):
+    '''return a dictionary of the dilutions of precision for satellites at
+       the rows of the Nx3 array satpos seen from pos'''
+    import numpy
+    los = numpy.asarray(satpos, dtype=float) - numpy.array([pos.X, pos.Y, pos.Z])
+    H = numpy.empty((len(los), 4))
+    H[:,0:3] = los / numpy.sqrt((los*los).sum(axis=1))[:,None]
+    H[:,3] = -1.0
+    return _dop(numpy.linalg.inv(numpy.dot(H.T, H)), pos)
+
+def _dop(Q, pos):
+    '''return the DOP dictionary for the ECEF cofactor matrix Q at pos'''
+    import numpy
+    from math import radians, sin, cos, sqrt
+
+    # rotate the position part into east, north and up
+    llh = pos.ToLLH()
+    lat = radians(llh.lat)
+    lon = radians(llh.lon)
+    R = numpy.array([[-sin(lon),           cos(lon),          0],
+                     [-sin(lat)*cos(lon), -sin(lat)*sin(lon), cos(lat)],
+                     [ cos(lat)*cos(lon),  cos(lat)*sin(lon), sin(lat)]])
+    (e, n, u) = numpy.einsum('ij,jk,ik->i', R, Q[0:3,0:3], R).tolist()
+    t = float(Q[3,3])
+    return { 'gdop' : sqrt(e + n + u + t),
+             'pdop' : sqrt(e + n + u),
+             'hdop' : sqrt(e + n),
+             'vdop' : sqrt(u),
+             'tdop' : sqrt(t) }
+
+def positionWLS(satpos, pranges, weights, p0, iterations=10, tolerance=1.0e-4):
+    '''Gauss-Newton weighted least squares fit of position and receiver clock
+       error to satellite positions and pseudo-ranges.
+
+    satpos is an Nx3 array of satellite positions, pranges and weights arrays
+    of pseudo-ranges and weights, with each residual scaled by its weight.
+    p0 is the starting X, Y, Z and clock error. Returns a PositionSolution
+    '''
+    import numpy
+    satpos = numpy.asarray(satpos, dtype=float)
+    pranges = numpy.asarray(pranges, dtype=float)
+    weights = numpy.asarray(weights, dtype=float)
+    n = len(pranges)
+    if n < 4:
+        raise RuntimeError("Unable to find solution")
+
+    # solve for the clock error as a range to keep the problem well scaled
+    x = numpy.array([p0[0], p0[1], p0[2], p0[3]*util.speedOfLight], dtype=float)
+    H = numpy.empty((n, 4))
+    H[:,3] = -1.0
+    Hw = numpy.empty((n, 4))
+    Hw[:,3] = -weights
+    for i in range(iterations):
+        los = x[0:3] - satpos
+        dist = numpy.sqrt((los*los).sum(axis=1))
+        residuals = (dist - (pranges + x[3])) * weights
+        # the analytic Jacobian: unit vectors from the satellites and -1 for the clock
+        H[:,0:3] = los / dist[:,None]
+        Hw[:,0:3] = H[:,0:3] * weights[:,None]
+        N = numpy.dot(Hw.T, Hw)
+        try:
+            dx = numpy.linalg.solve(N, -numpy.dot(Hw.T, residuals))
+        except numpy.linalg.LinAlgError:
+            raise RuntimeError("Unable to find solution")
+        x += dx
+        if numpy.dot(dx, dx) < tolerance*tolerance:
+            break
+    else:
+        if numpy.dot(dx[0:3], dx[0:3]) > 1.0:
+            raise RuntimeError("Unable to find solution")
+
+    los = x[0:3] - satpos
+    residuals = (numpy.sqrt((los*los).sum(axis=1)) - (pranges + x[3])) * weights
+
+    # covariance scaled by the variance of unit weight, with the clock in seconds.
+    # The geometry of the last step is close enough to that of the solution
+    sigma2 = numpy.dot(residuals, residuals) / (n - 4) if n > 4 else 1.0
+    scale = numpy.array([1.0, 1.0, 1.0, 1.0/util.speedOfLight])
+    covariance = numpy.linalg.inv(N) * (sigma2 * numpy.outer(scale, scale))
+
+    clock_error = x[3] / util.speedOfLight
+    pos = util.PosVector(x[0], x[1], x[2], extra=clock_error)
+    dop = _dop(numpy.linalg.inv(numpy.dot(H.T, H)), pos)
+    return PositionSolution(pos, clock_error, covariance, dop, residuals, i+1)
+
+def positionLeastSquares_ranges(satinfo, pranges, lastpos, last_clock_error, weights=None, solution=False):
     '''estimate ECEF position of receiver via least squares fit to satellite positions and pseudo-ranges
     The weights dictionary is optional. If supplied, it is the weighting from 0 to 1 for each satellite.
-    A weight of 1 means it has more influence on the solution
+    A weight of 1 means it has more influence on the solution.
+    Returns the position with the clock error in .extra, or the PositionSolution if solution is set
     '''
-    import scipy
-    from scipy import optimize
-    data = []
-
-    for svid in satinfo.satpos:
-        if svid in pranges:
-            if weights is not None:
-                weight = weights[svid]
-            else:
-                weight = 1.0
-            data.append((satinfo.satpos[svid], pranges[svid], weight))
+    svids = [svid for svid in satinfo.satpos if svid in pranges]
+    satpos = [(satinfo.satpos[svid].X, satinfo.satpos[svid].Y, satinfo.satpos[svid].Z) for svid in svids]
+    if weights is not None:
+        w = [weights[svid] for svid in svids]
+    else:
+        w = [1.0] * len(svids)
     p0 = [lastpos.X, lastpos.Y, lastpos.Z, last_clock_error]
-    p1, ier = optimize.leastsq(positionErrorFunction, p0[:], args=(data))
-    if not ier in [1, 2, 3, 4]:
-        raise RuntimeError("Unable to find solution")
+    sol = positionWLS(satpos, [pranges[svid] for svid in svids], w, p0)
+    if solution:
+        return sol
 
     # return position and clock error
-    return util.PosVector(p1[0], p1[1], p1[2], extra=p1[3])
-
-def clockErrorFunction(p, data):
-    '''error function for least squares position fit'''
-    pos = util.PosVector(*data[0])
-    recv_clockerr = p[0]
-    ret = []
-    for d in data[1:]:
-        satpos, prange, weight = d
-        dist = pos.distance(satpos)
-        ret.append((dist - (prange + util.speedOfLight*recv_clockerr))*weight)
-    return ret
-
-def clockLeastSquares_ranges(eph, pranges, itow, ref_pos, last_clock_error, weights=None):
-    '''estimate ECEF position of receiver via least squares fit to satellite positions and pseudo-ranges
+    return sol.pos
+
+def clockLeastSquares_ranges(eph, pranges, itow, ref_pos, last_clock_error, weights=None, orbits=None):
+    '''estimate the receiver clock error via least squares fit to satellite positions and
+    pseudo-ranges from a known position.
     The weights dictionary is optional. If supplied, it is the weighting from 0 to 1 for each satellite.
     A weight of 1 means it has more influence on the solution
     '''
-    import scipy
-    from scipy import optimize
-    data = [ref_pos]
-
-    for svid in pranges:
-        if svid in eph:
-            if weights is not None:
-                weight = weights[svid]
-            else:
-                weight = 1.0
-
-            tof = pranges[svid] / util.speedOfLight
-            transmitTime = itow - tof
-            satpos = satPosition.satPosition_raw(eph[svid], svid, transmitTime)
-
-            data.append((satpos, pranges[svid], weight))
-
-    if len(data) < 4:
+    svids = [svid for svid in pranges if svid in eph]
+    transmitTimes = [itow - pranges[svid] / util.speedOfLight for svid in svids]
+    if orbits is not None:
+        satpos = orbits.positions(eph, svids, transmitTimes)
+    else:
+        satpos = satPosition.satPositionVectors(eph, svids, transmitTimes)
+
+    if len(svids) < 3:
         return
 
-    p1, ier = optimize.leastsq(clockErrorFunction, [last_clock_error], args=(data))
-    if not ier in [1, 2, 3, 4]:
+    # with the position known the clock error is linear, so the weighted
+    # mean of the range errors solves it directly
+    pos = util.PosVector(*ref_pos)
+    num = 0
+    den = 0
+    for svid in svids:
+        if weights is not None:
+            weight = weights[svid]
+        else:
+            weight = 1.0
+        w2 = weight * weight
+        num += w2 * (pos.distance(satpos[svid]) - pranges[svid])
+        den += w2
+    if den == 0:
         raise RuntimeError("Unable to find solution")
 
-    return p1[0]
+    return num / den / util.speedOfLight
 
 def satelliteWeightings(satinfo):
     '''return a dictionary of weightings for the contribution to the least squares
@@ -121,11 +199,13 @@ def positionLeastSquares(satinfo):
     weights = satelliteWeightings(satinfo)
 
     # Estimate position and rx clk error
-    newpos = positionLeastSquares_ranges(satinfo,
-                                         satinfo.prCorrected,
-                                         satinfo.lastpos,
-                                         satinfo.receiver_clock_error,
-                                         weights)
+    satinfo.position_solution = positionLeastSquares_ranges(satinfo,
+                                                            satinfo.prCorrected,
+                                                            satinfo.lastpos,
+                                                            satinfo.receiver_clock_error,
+                                                            weights,
+                                                            solution=True)
+    newpos = satinfo.position_solution.pos
     satinfo.lastpos = newpos
     satinfo.receiver_clock_error = newpos.extra
 
@@ -137,7 +217,8 @@ def positionLeastSquares(satinfo):
                                            satinfo.raw.time_of_week,
                                            (satinfo.reference_position.X, satinfo.reference_position.Y, satinfo.reference_position.Z),
                                            0,
-                                           weights)
+                                           weights,
+                                           satinfo.orbits)
 
         satinfo.receiver_clock_error = clk_err
 
@@ -149,34 +230,32 @@ def calculatePrCorrections(satinfo):
     raw = satinfo.raw
     satinfo.reset()
     errset={}
-    for svid in raw.prMeasured:
 
-        if not satinfo.valid(svid):
-            # we don't have ephemeris data for this space vehicle
-            #print("not valid")
-            continue
+    # only use space vehicles we have ephemeris data for
+    svids = [svid for svid in raw.prMeasured if satinfo.valid(svid)]
+
+    # calculate the time of flight for each pseudo range
+    tofs = [satinfo.smooth.prSmoothed[svid] / util.speedOfLight for svid in svids]
+
+    # assume the time_of_week is the exact receiver time of week that the message arrived.
+    # subtract the time of flight to get the satellite transmit time
+    transmitTimes = [raw.time_of_week - tof for tof in tofs]
+
+    # calculate all the satellite positions at their transmitTimes, corrected for
+    # earths rotation in the time it took the messages to get to the receiver
+    satinfo.satpos.update(satinfo.orbits.positions(satinfo.ephemeris, svids, transmitTimes, tofs))
+
+    for (svid, tof, transmitTime) in zip(svids, tofs, transmitTimes):
 
         # get the ephemeris and pseudo-range for this space vehicle
         ephemeris = satinfo.ephemeris[svid]
         prMes = raw.prMeasured[svid]
         prSmooth = satinfo.smooth.prSmoothed[svid]
 
-        # calculate the time of flight for this pseudo range
-        tof = prSmooth / util.speedOfLight
-
-        # assume the time_of_week is the exact receiver time of week that the message arrived.
-        # subtract the time of flight to get the satellite transmit time
-        transmitTime = raw.time_of_week - tof
-
         timesec = util.gpsTimeToTime(raw.gps_week, raw.time_of_week)
 
-        # calculate the satellite position at the transmitTime
-        satPosition.satPosition(satinfo, svid, transmitTime)
         Trel = satinfo.satpos[svid].extra
 
-        # correct for earths rotation in the time it took the messages to get to the receiver
-        satPosition.correctPosition(satinfo, svid, tof)
-
         # calculate satellite azimuth and elevation
         satPosition.calculateAzimuthElevation(satinfo, svid, satinfo.lastpos)
 
@@ -220,7 +299,28 @@ def positionEstimate(satinfo):
         return None
 
     posestimate = positionLeastSquares(satinfo)
+    _savePosition(satinfo, posestimate)
+    return posestimate
+
+def positionEstimateEKF(satinfo, ekf):
+    '''process raw messages to calculate position with a
+    positionFilter.PositionEKF instead of a least squares fit. The
+    filter can carry on through epochs with fewer than 4 satellites
+    '''
 
+    calculatePrCorrections(satinfo)
+
+    posestimate = ekf.step(satinfo)
+    if posestimate is None:
+        return None
+    satinfo.lastpos = posestimate
+    satinfo.receiver_clock_error = posestimate.extra
+
+    _savePosition(satinfo, posestimate)
+    return posestimate
+
+def _savePosition(satinfo, posestimate):
+    '''record a new position estimate in satinfo'''
     satinfo.position_sum += posestimate
     satinfo.position_count += 1
     satinfo.average_position = satinfo.position_sum / satinfo.position_count
@@ -233,5 +333,3 @@ def positionEstimate(satinfo):
             satinfo.geometricRange[svid] = satinfo.receiver_position.distance(satinfo.satpos[svid])
         else:
             satinfo.geometricRange[svid] = satinfo.average_position.distance(satinfo.satpos[svid])
-
-    return posestimate
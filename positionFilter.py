@@ -0,0 +1,234 @@
+'''
+Extended Kalman filter position and clock engine
+
+An alternative to the per-epoch least squares fix of positionEstimate.
+The filter carries position, velocity, receiver clock bias and clock
+drift from epoch to epoch, so each epoch is one linearised update with
+the corrected pseudo-ranges instead of a fresh nonlinear solve, and the
+solution is smoothed by the motion model.
+
+All state is held in the PositionEKF object, so any number of filters,
+for instance with different tunings, can be stepped side by side on the
+corrections of one epoch:
+
+    positionEstimate.calculatePrCorrections(satinfo)
+    for f in filters:
+        f.step(satinfo)
+'''
+
+import util, positionEstimate
+
+# state vector indexes
+POS = slice(0, 3)
+VEL = slice(3, 6)
+BIAS = 6
+DRIFT = 7
+
+class PositionEKF:
+    '''an EKF with state X, Y, Z, velocity, clock bias and clock drift,
+    the clock terms in metres and metres per second'''
+    def __init__(self, accel_noise=0.01, bias_noise=1.0, drift_noise=1.0,
+                 range_sigma=5.0, gate=5.0, clock_jump=1000.0, max_gap=10.0,
+                 vel_sigma=10.0, drift_sigma=1000.0):
+        # process noise spectral densities of acceleration, m^2/s^3,
+        # and of the clock bias and drift, m^2/s and m^2/s^3
+        self.accel_noise = accel_noise
+        self.bias_noise = bias_noise
+        self.drift_noise = drift_noise
+
+        # pseudo-range sigma in metres for a weight of 1. A satellite's
+        # sigma is this divided by its weight
+        self.range_sigma = range_sigma
+
+        # innovations beyond gate sigmas are rejected
+        self.gate = gate
+
+        # a common innovation of more than clock_jump metres is taken as
+        # a receiver clock jump and resets the bias
+        self.clock_jump = clock_jump
+
+        # gaps between epochs of more than max_gap seconds restart the filter
+        self.max_gap = max_gap
+
+        # initial sigmas of velocity and clock drift
+        self.vel_sigma = vel_sigma
+        self.drift_sigma = drift_sigma
+
+        # transition matrices of the last time step
+        self._dt = None
+        self._F = None
+        self._Q = None
+
+        self.reset()
+
+    def reset(self):
+        '''forget the state, so the next step starts from a least squares fix'''
+        self.x = None
+        self.P = None
+        self.time = None
+        self.pos = None
+        self.innovations = {}
+        self.rejected = []
+
+    def initialise(self, pos, time, covariance=None):
+        '''start the filter from a position with the clock error in
+        .extra, such as a least squares fix, at a GPS time. covariance is
+        the optional 4x4 covariance of the fix, as in PositionSolution'''
+        import numpy
+        c = util.speedOfLight
+        self.x = numpy.array([pos.X, pos.Y, pos.Z, 0, 0, 0, pos.extra * c, 0], dtype=float)
+        self.P = numpy.zeros((8, 8))
+        if covariance is not None:
+            scale = numpy.array([1.0, 1.0, 1.0, c])
+            cov = covariance * numpy.outer(scale, scale)
+            idx = [0, 1, 2, BIAS]
+            self.P[numpy.ix_(idx, idx)] = cov
+        else:
+            self.P[POS, POS] = numpy.eye(3) * (10 * self.range_sigma)**2
+            self.P[BIAS, BIAS] = (10 * self.range_sigma)**2
+        self.P[VEL, VEL] = numpy.eye(3) * self.vel_sigma**2
+        self.P[DRIFT, DRIFT] = self.drift_sigma**2
+        self.time = time
+        self._set_pos()
+
+    def _set_pos(self):
+        self.pos = util.PosVector(self.x[0], self.x[1], self.x[2], extra=self.x[BIAS] / util.speedOfLight)
+
+    def predict(self, time):
+        '''move the state on to a GPS time with the constant velocity and
+        clock drift model'''
+        import numpy
+        dt = time - self.time
+        if dt == 0:
+            return
+        if dt != self._dt:
+            (self._F, self._Q) = self._transition(dt)
+            self._dt = dt
+        self.x = numpy.dot(self._F, self.x)
+        self.P = numpy.dot(numpy.dot(self._F, self.P), self._F.T) + self._Q
+        self.time = time
+
+    def _transition(self, dt):
+        '''return the state transition and process noise matrices for a
+        step of dt seconds'''
+        import numpy
+        F = numpy.eye(8)
+        F[POS, VEL] = numpy.eye(3) * dt
+        F[BIAS, DRIFT] = dt
+        Q = numpy.zeros((8, 8))
+        q = self.accel_noise
+        Q[POS, POS] = numpy.eye(3) * (q * dt**3 / 3)
+        Q[POS, VEL] = Q[VEL, POS] = numpy.eye(3) * (q * dt**2 / 2)
+        Q[VEL, VEL] = numpy.eye(3) * (q * dt)
+        g = self.drift_noise
+        Q[BIAS, BIAS] = self.bias_noise * dt + g * dt**3 / 3
+        Q[BIAS, DRIFT] = Q[DRIFT, BIAS] = g * dt**2 / 2
+        Q[DRIFT, DRIFT] = g * dt
+        return (F, Q)
+
+    def _innovations(self, satpos, pranges):
+        '''return the innovations of the pseudo-ranges, measured less
+        predicted, and H, the gradient of the predicted ranges'''
+        import numpy
+        los = self.x[0:3] - satpos
+        dist = numpy.sqrt((los*los).sum(axis=1))
+        H = numpy.zeros((len(pranges), 8))
+        H[:,0:3] = los / dist[:,None]
+        H[:,BIAS] = -1.0
+        return ((pranges + self.x[BIAS]) - dist, H)
+
+    def update(self, satpos, pranges, weights):
+        '''update the state with pseudo-ranges from satellites at the rows
+        of the Nx3 array satpos, with the satellite weights of the least
+        squares fit. Returns (used, innovations): a boolean array of the
+        measurements used and the array of their innovations'''
+        import numpy
+        satpos = numpy.asarray(satpos, dtype=float)
+        pranges = numpy.asarray(pranges, dtype=float)
+        weights = numpy.asarray(weights, dtype=float)
+        used = weights > 0
+        if not used.any():
+            return (used, numpy.zeros(len(used)))
+        R = (self.range_sigma / numpy.where(used, weights, 1))**2
+
+        (v, H) = self._innovations(satpos, pranges)
+        # the innovations are ranges less the predicted ranges, so a clock
+        # jump shows as the same large innovation for every satellite
+        if used.sum() >= 4 and numpy.abs(v[used]).min() > self.clock_jump:
+            jump = numpy.median(v[used])
+            self.x[BIAS] -= jump
+            self.P[BIAS, BIAS] += jump * jump
+            (v, H) = self._innovations(satpos, pranges)
+
+        PHt = numpy.dot(self.P, H.T)
+        S = numpy.dot(H, PHt)
+        S.flat[::len(v)+1] += R
+        used &= v*v <= self.gate * self.gate * S.diagonal()
+        innovations = v
+        if not used.any():
+            return (used, innovations)
+        if not used.all():
+            v = v[used]
+            PHt = PHt[:,used]
+            S = S[numpy.ix_(used, used)]
+
+        K = numpy.linalg.solve(S, PHt.T).T
+        self.x += numpy.dot(K, v)
+        # P - K H P, kept symmetric
+        P = self.P - numpy.dot(K, PHt.T)
+        self.P = 0.5 * (P + P.T)
+        self._set_pos()
+        return (used, innovations)
+
+    def step(self, satinfo, weights=None):
+        '''update the filter with the corrected pseudo-ranges of the current
+        epoch of satinfo, after positionEstimate.calculatePrCorrections().
+        The filter starts, or restarts after a gap, from a least squares
+        fix. Returns the position with the clock error in .extra, or None
+        if there weren't enough satellites to start'''
+        if weights is None:
+            weights = positionEstimate.satelliteWeightings(satinfo)
+        time = satinfo.raw.gps_time
+        svids = [svid for svid in satinfo.satpos if svid in satinfo.prCorrected]
+
+        if self.x is None or abs(time - self.time) > self.max_gap:
+            if len(svids) < 4:
+                self.reset()
+                return None
+            sol = positionEstimate.positionLeastSquares_ranges(satinfo,
+                                                               satinfo.prCorrected,
+                                                               satinfo.lastpos,
+                                                               satinfo.receiver_clock_error,
+                                                               weights,
+                                                               solution=True)
+            self.initialise(sol.pos, time, sol.covariance)
+            self.innovations = {}
+            self.rejected = []
+            return self.pos
+
+        self.predict(time)
+        if not svids:
+            self._set_pos()
+            return self.pos
+        satpos = [(satinfo.satpos[svid].X, satinfo.satpos[svid].Y, satinfo.satpos[svid].Z) for svid in svids]
+        pranges = [satinfo.prCorrected[svid] for svid in svids]
+        (used, v) = self.update(satpos, pranges, [weights.get(svid, 0) for svid in svids])
+        self.innovations = dict(zip(svids, v.tolist()))
+        self.rejected = [svid for (svid, u) in zip(svids, used.tolist()) if not u]
+        self._set_pos()
+        return self.pos
+
+    def velocity(self):
+        '''return the velocity estimate as a PosVector'''
+        return util.PosVector(self.x[3], self.x[4], self.x[5])
+
+    def clock_drift(self):
+        '''return the receiver clock drift in seconds per second'''
+        return self.x[DRIFT] / util.speedOfLight
+
+    def covariance(self):
+        '''return the 4x4 covariance of X, Y, Z in m^2 and the clock error in s^2'''
+        import numpy
+        idx = [0, 1, 2, BIAS]
+        scale = numpy.array([1.0, 1.0, 1.0, 1.0/util.speedOfLight])
+        return self.P[numpy.ix_(idx, idx)] * numpy.outer(scale, scale)
@@ -4,13 +4,14 @@ estimate receiver position from RXM_RAW uBlox messages
 '''
 
 import ublox, sys
-import util, ephemeris, positionEstimate, satelliteData, dataPlotter, time
+import util, ephemeris, positionEstimate, positionFilter, satelliteData, dataPlotter, time
 
 from optparse import OptionParser
 
 parser = OptionParser("position_estimate.py [options] <file>")
 parser.add_option("--plot", action='store_true', default=False, help="plot points")
 parser.add_option("--reference", help="reference position (lat,lon,alt)", default=None)
+parser.add_option("--ekf", action='store_true', default=False, help="use the Kalman filter instead of least squares")
 
 (opts, args) = parser.parse_args()
 
@@ -28,13 +29,20 @@ if opts.plot:
     reference = util.ParseLLH(opts.reference).ToECEF()
     plotter = dataPlotter.dataPlotter(reference)
 
+ekf = None
+if opts.ekf:
+    ekf = positionFilter.PositionEKF()
+
 def position_estimate(messages, satinfo):
     '''process raw messages to calculate position
     '''
 
     # get get position the receiver calculated. We use this to check the calculations
 
-    pos = positionEstimate.positionEstimate(satinfo)
+    if ekf is not None:
+        pos = positionEstimate.positionEstimateEKF(satinfo, ekf)
+    else:
+        pos = positionEstimate.positionEstimate(satinfo)
     if pos is None:
         # not enough information for a fix
         return
@@ -66,23 +74,34 @@ messages = {}
 pos_sum = util.PosVector(0,0,0)
 pos_count = 0
 
+def handle_message(msg):
+    '''keep the messages we need for the position'''
+    messages[msg.name()] = msg
+    satinfo.add_message(msg)
+
+def handle_rxm_raw(msg):
+    '''calculate a position for each set of raw measurements'''
+    global pos_sum, pos_count
+    handle_message(msg)
+    pos = position_estimate(messages, satinfo)
+    if pos is not None:
+        pos_sum += pos
+        pos_count += 1
+
+dev.subscribe([(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF),
+               (ublox.CLASS_RXM, ublox.MSG_RXM_SFRB),
+               (ublox.CLASS_AID, ublox.MSG_AID_EPH)], handle_message)
+dev.subscribe((ublox.CLASS_RXM, ublox.MSG_RXM_RAW), handle_rxm_raw)
+
 while True:
     '''process the ublox messages, extracting the ones we need for the position'''
     msg = dev.receive_message()
     if msg is None:
         break
-    if msg.name() in [ 'RXM_RAW', 'NAV_POSECEF', 'RXM_SFRB', 'RXM_RAW', 'AID_EPH' ]:
-        try:
-            msg.unpack()
-            messages[msg.name()] = msg
-            satinfo.add_message(msg)
-        except ublox.UBloxError as e:
-            print(e)
-    if msg.name() == 'RXM_RAW':
-        pos = position_estimate(messages, satinfo)
-        if pos is not None:
-            pos_sum += pos
-            pos_count += 1
+    try:
+        dev.dispatch(msg)
+    except ublox.UBloxError as e:
+        print(e)
 
 # get the receivers estimate of position. This should be quite accurate if
 # we had PPP enabled
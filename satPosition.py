@@ -106,6 +106,120 @@ def satPosition_raw(eph, svid, transmitTime):
 
     return satpos
 
+# ephemeris attributes used by the orbit model
+ORBIT_FIELDS = ['crs', 'deltaN', 'M0', 'cuc', 'ecc', 'cus', 'A', 'toe',
+                'cic', 'omega0', 'cis', 'i0', 'crc', 'omega', 'omega_dot', 'idot']
+
+def ephemerisArrays(ephs):
+    '''gather the orbit parameters of a list of ephemerides into a
+    dictionary of numpy arrays keyed by attribute name'''
+    import numpy
+    return dict([(f, numpy.array([getattr(e, f) for e in ephs], dtype=float)) for f in ORBIT_FIELDS])
+
+def satPositions(ephs, transmitTimes, time_of_flight=None):
+    '''calculate the positions of many satellites in one numpy pass.
+    Same model as satPosition_raw()
+
+    ephs is a list of ephemerides, or a dictionary of arrays from
+    ephemerisArrays(), and transmitTimes the matching transmit times.
+    If time_of_flight is given the positions are corrected for the
+    earth's rotation during it, as correctPosition_raw() does.
+
+    Returns an Nx3 array of ECEF positions and an array of the
+    relativistic correction terms
+    '''
+    import numpy
+
+    # WGS 84 value of earth's univ. grav. par.
+    mu = 3.986005E+14
+
+    # WGS 84 value of earth's rotation rate
+    Wedot = 7.2921151467E-5
+
+    # relativistic correction term constant
+    F = -4.442807633E-10
+
+    if not isinstance(ephs, dict):
+        ephs = ephemerisArrays(ephs)
+    A = ephs['A']
+    ec = ephs['ecc']
+    Toe = ephs['toe']
+
+    T = numpy.asarray(transmitTimes, dtype=float) - Toe
+    T = numpy.where(T > 302400, T - 604800, T)
+    T = numpy.where(T < -302400, T + 604800, T)
+
+    n = numpy.sqrt(mu / (A*A*A)) + ephs['deltaN']
+
+    M = ephs['M0'] + n*T
+    E = M
+    for ii in range(20):
+        Eold = E
+        E = M + ec * numpy.sin(E)
+        if numpy.all(numpy.abs(E - Eold) < 1.0e-12):
+            break
+    else:
+        for k in numpy.nonzero(numpy.abs(E - Eold) >= 1.0e-12)[0]:
+            print("WARNING: Kepler Eqn didn't converge for sat index {} (last step {})".format(k, E[k] - Eold[k]))
+
+    sinE = numpy.sin(E)
+    cosE = numpy.cos(E)
+    # the true anomaly, in the quadrant given by the signs of its
+    # sine and cosine
+    nu = numpy.arctan2(numpy.sqrt(1 - ec*ec) * sinE, cosE - ec)
+
+    phi = nu + ephs['omega']
+    cos2phi = numpy.cos(2*phi)
+    sin2phi = numpy.sin(2*phi)
+
+    u = phi + ephs['cuc']*cos2phi + ephs['cus']*sin2phi
+    r = A*(1 - ec*cosE) + ephs['crc']*cos2phi + ephs['crs']*sin2phi
+    i = ephs['i0'] + ephs['idot']*T + ephs['cic']*cos2phi + ephs['cis']*sin2phi
+
+    Xdash = r*numpy.cos(u)
+    Ydash = r*numpy.sin(u)
+
+    Wc = ephs['omega0'] + (ephs['omega_dot'] - Wedot)*T - Wedot*Toe
+    cosWc = numpy.cos(Wc)
+    sinWc = numpy.sin(Wc)
+
+    pos = numpy.empty((len(T), 3))
+    pos[:,0] = Xdash*cosWc - Ydash*numpy.cos(i)*sinWc
+    pos[:,1] = Xdash*sinWc + Ydash*numpy.cos(i)*cosWc
+    pos[:,2] = Ydash*numpy.sin(i)
+
+    if time_of_flight is not None:
+        correctPositions(pos, time_of_flight)
+
+    # relativistic correction term
+    return pos, F * ec * numpy.sqrt(A) * sinE
+
+def satPositionVectors(eph, svids, transmitTimes, time_of_flight=None):
+    '''calculate the positions of the satellites in svids with
+    satPositions(), taking their ephemerides from the eph dictionary.
+    Returns a dictionary of PosVectors keyed by svid, with the
+    relativistic correction term in .extra'''
+    import numpy
+    ret = {}
+    # like satPosition_raw(), an ephemeris without the orbit fields
+    # gives no position
+    usable = []
+    for k, svid in enumerate(svids):
+        if all(hasattr(eph[svid], f) for f in ORBIT_FIELDS):
+            usable.append(k)
+        else:
+            ret[svid] = None
+    if not usable:
+        return ret
+    svids = [svids[k] for k in usable]
+    transmitTimes = numpy.asarray(transmitTimes, dtype=float)[usable]
+    if time_of_flight is not None:
+        time_of_flight = numpy.asarray(time_of_flight, dtype=float)[usable]
+    pos, rel = satPositions([eph[svid] for svid in svids], transmitTimes, time_of_flight)
+    for k in range(len(svids)):
+        ret[svids[k]] = util.PosVector(pos[k,0], pos[k,1], pos[k,2], extra=rel[k])
+    return ret
+
 def correctPosition(satinfo, svid, time_of_flight):
     correctPosition_raw(satinfo.satpos[svid], time_of_flight)
 
@@ -123,6 +237,21 @@ def correctPosition_raw(satpos, time_of_flight):
     satpos.Y = -X * sin(alpha) + Y * cos(alpha)
 
 
+def correctPositions(pos, time_of_flight):
+    '''correct an Nx3 array of satellite positions in place for the
+    time their messages took to get to the receiver'''
+    import numpy
+
+    # WGS-84 earth rotation rate
+    We = 7.292115E-5
+
+    alpha = numpy.asarray(time_of_flight, dtype=float) * We
+    X = pos[:,0].copy()
+    Y = pos[:,1].copy()
+    pos[:,0] = X * numpy.cos(alpha) + Y * numpy.sin(alpha)
+    pos[:,1] = -X * numpy.sin(alpha) + Y * numpy.cos(alpha)
+
+
 def calculateAzimuthElevation(satinfo, svid, ourpos):
     '''calculate Azimuth and elevation for a sattelite given our position in ECEF
     based upon calcAzEl() in
@@ -1,4 +1,4 @@
-import util, ephemeris, prSmooth
+import util, ephemeris, prSmooth, ublox, orbitCache
 
 class rawPseudoRange:
     '''class to hold raw range information from a receiver'''
@@ -55,6 +55,9 @@ class SatelliteData:
         # the last position calculated from smoothed pseudo ranges
         self.position_estimate = None
 
+        # the PositionSolution behind it, with covariance and DOP
+        self.position_solution = None
+
         self.ephemeris = util.loadObject('ephemeris.dat')
         if self.ephemeris is None:
             self.ephemeris = {}
@@ -67,6 +70,9 @@ class SatelliteData:
 
         self.smooth = prSmooth.prSmooth()
 
+        # fitted satellite orbits, refitted when the ephemeris changes
+        self.orbits = orbitCache.OrbitCache()
+
     def reset(self):
         self.satpos = {}
         self.prMeasured = {}
@@ -96,6 +102,7 @@ class SatelliteData:
             self.ephemeris[eph.svid] = eph
             if old_eph is None or old_eph != eph:
                 self.smooth.reset(eph.svid)
+                self.orbits.evict(eph.svid)
                 util.saveObject('ephemeris.dat', self.ephemeris)
 
     def add_RXM_SFRB(self, msg):
@@ -127,14 +134,21 @@ class SatelliteData:
         '''add a NAV_POSECEF message'''
         self.receiver_position = util.PosVector(msg.ecefX*0.01, msg.ecefY*0.01, msg.ecefZ*0.01)
             
+    # the message types used, and the method handling each
+    message_handlers = {
+        (ublox.CLASS_AID, ublox.MSG_AID_EPH)     : add_AID_EPH,
+        (ublox.CLASS_RXM, ublox.MSG_RXM_SFRB)    : add_RXM_SFRB,
+        (ublox.CLASS_RXM, ublox.MSG_RXM_RAW)     : add_RXM_RAW,
+        (ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF) : add_NAV_POSECEF,
+        }
+
     def add_message(self, msg):
         '''add information from ublox messages'''
-        if msg.name() == 'AID_EPH':
-            self.add_AID_EPH(msg)
-        elif msg.name() == 'RXM_SFRB':
-            self.add_RXM_SFRB(msg)
-        elif msg.name() == 'RXM_RAW':
-            self.add_RXM_RAW(msg)
-        elif msg.name() == 'NAV_POSECEF':
-            self.add_NAV_POSECEF(msg)
+        handler = self.message_handlers.get(msg.msg_type(), None)
+        if handler is not None:
+            handler(self, msg)
+
+    def subscribe(self, dev):
+        '''add the messages used from a UBlox device as they are dispatched'''
+        dev.subscribe(list(self.message_handlers.keys()), self.add_message)
 
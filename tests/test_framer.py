@@ -0,0 +1,101 @@
+'''
+check the UBX framer and batch checksums against the bundled log and
+corrupted copies of it
+'''
+
+import os, random, struct
+import numpy
+import ublox, ublox.benchmark
+
+LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', '6P-raw-PPP.ubx')
+
+def read_log():
+    f = open(LOG, 'rb')
+    ret = f.read()
+    f.close()
+    return ret
+
+def frames(data, chunk=None):
+    '''return the frames found in data, fed in one go or in chunks'''
+    framer = ublox.UBloxFramer()
+    if chunk is None:
+        chunk = len(data)
+    ret = []
+    for ofs in range(0, len(data), chunk):
+        framer.feed(data[ofs:ofs+chunk])
+        ret.extend([bytes(bytearray(f)) for f in framer.frames()])
+    return ret
+
+def valid(frame):
+    '''return True if a frame has the preamble, its length and a good checksum'''
+    f = bytearray(frame)
+    (length,) = struct.unpack_from('<H', f, 4)
+    return (f[0] == ublox.PREAMBLE1 and f[1] == ublox.PREAMBLE2 and len(f) == length + 8 and
+            ublox.fletcher_checksum(f[2:-2]) == (f[-2], f[-1]))
+
+def test_clean_log():
+    found = frames(read_log())
+    assert len(found) == 1615
+    assert all([valid(f) for f in found])
+
+def test_corrupted_log():
+    data = read_log()
+    original = set(frames(data))
+    for kind in ublox.benchmark.CORRUPTIONS:
+        bad = ublox.benchmark.corrupt(data, kind)
+        found = frames(bad)
+        assert len(found) > 0
+        assert all([valid(f) for f in found]), kind
+        # nothing is made up from the damage
+        assert set(found) <= original, kind
+        for chunk in [1000, 4096, 65536]:
+            assert frames(bad, chunk) == found, (kind, chunk)
+
+def test_find_frame_resync():
+    good = ublox.UBlox.pack_message(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, b'\0' * 52)._buf
+    good = bytes(bytearray(good))
+    # junk, then a false preamble whose length reaches into the real frame
+    junk = b'\x01\x02' + bytes(bytearray([ublox.PREAMBLE1, ublox.PREAMBLE2, 1, 6, 4, 0])) + b'\x03'
+    buf = bytearray(junk + good + good)
+    (start, end, bad) = ublox.find_frame(buf, 0, len(buf))
+    assert (start, end) == (len(junk), len(junk) + len(good))
+    assert bad == 1
+    (start, end, bad) = ublox.find_frame(buf, end, len(buf))
+    assert (start, end, bad) == (len(junk) + len(good), len(buf), 0)
+    # a frame cut short needs more data
+    (start, end, bad) = ublox.find_frame(buf, 0, len(buf) - 1)
+    assert end == len(junk) + len(good)
+    (start, end, bad) = ublox.find_frame(buf, end, len(buf) - 1)
+    assert (start, end) == (len(junk) + len(good), None)
+
+def test_buffer_checksums():
+    rand = random.Random(1)
+    buf = bytearray([rand.randint(0, 255) for i in range(5000)])
+    sums = ublox.BufferChecksums(buf, 100, 4900)
+    starts = []
+    ends = []
+    for i in range(200):
+        a = rand.randint(100, 4900)
+        b = rand.randint(a, 4900)
+        assert sums.checksum(a, b) == ublox.fletcher_checksum(buf[a:b])
+        starts.append(a)
+        ends.append(b)
+    (ck_a, ck_b) = sums.checksums(starts, ends)
+    want = [ublox.fletcher_checksum(buf[a:b]) for (a, b) in zip(starts, ends)]
+    assert list(zip(ck_a.tolist(), ck_b.tolist())) == want
+
+def test_verify_frames():
+    data = bytearray(read_log())
+    found = frames(bytes(data))
+    starts = []
+    pos = 0
+    for f in found:
+        pos = data.find(f, pos)
+        starts.append(pos)
+        pos += len(f)
+    ends = [s + len(f) for (s, f) in zip(starts, found)]
+    assert ublox.verify_frames(data, starts, ends).all()
+    data[starts[10] + 7] ^= 0x10
+    ok = ublox.verify_frames(data, starts, ends)
+    assert numpy.nonzero(~ok)[0].tolist() == [10]
+    assert len(ublox.verify_frames(data, [], [])) == 0
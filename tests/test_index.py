@@ -0,0 +1,53 @@
+'''
+check UBloxIndex time searches against a linear scan of the bundled log
+'''
+
+import os, shutil, tempfile
+import numpy
+import ublox, ublox.index
+
+LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', '6P-raw-PPP.ubx')
+
+def open_index():
+    '''index a copy of the bundled log, so no sidecar is left in data'''
+    tmpdir = tempfile.mkdtemp()
+    logfile = os.path.join(tmpdir, 'log.ubx')
+    shutil.copy(LOG, logfile)
+    return (tmpdir, ublox.index.UBloxIndex(logfile))
+
+def test_select_matches_linear_scan():
+    (tmpdir, index) = open_index()
+    try:
+        times = index.times
+        # the log has frames stamped before frames logged ahead of them
+        assert (numpy.diff(times) < 0).any()
+        week = index._first_week
+        raw = [(ublox.CLASS_RXM, ublox.MSG_RXM_RAW)]
+        # frames ahead of the first iTOW have time -1
+        first = int(times[index.entries['itow'] >= 0].min()) - week * ublox.index.WEEK_MS
+        last = int(times.max()) - week * ublox.index.WEEK_MS
+        for start in range(first - 1000, last + 1000, 1000):
+            for (a, b) in [(start, start + 1000), (start + 1, start + 2500)]:
+                want = numpy.nonzero((times >= index.time_key(a)) & (times < index.time_key(b)))[0]
+                assert list(index.select(start=a, end=b)) == list(want)
+                e = index.entries[want]
+                want_raw = want[(e['msg_class'] == ublox.CLASS_RXM) & (e['msg_id'] == ublox.MSG_RXM_RAW)]
+                assert list(index.select(raw, a, b)) == list(want_raw)
+        assert list(index.select()) == list(range(len(index)))
+    finally:
+        index.close()
+        shutil.rmtree(tmpdir)
+
+def test_find_time_matches_linear_scan():
+    (tmpdir, index) = open_index()
+    try:
+        times = index.times
+        week = index._first_week
+        for t in numpy.unique(times):
+            itow = int(t) - week * ublox.index.WEEK_MS
+            later = numpy.nonzero(times >= t)[0]
+            assert index.find_time(itow) == int(later[0])
+        assert index.find_time(int(times.max()) - week * ublox.index.WEEK_MS + 1) == len(index)
+    finally:
+        index.close()
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,103 @@
+'''
+check the background log writer's file naming, appending and compression
+'''
+
+import os, shutil, tempfile, time, zlib, bz2
+import ublox.logwriter
+
+def drain(w):
+    '''wait for the writer thread to write out the queued data'''
+    while w.pending:
+        time.sleep(0.001)
+
+def write_all(w, chunks):
+    '''write each chunk as its own batch, then close the writer'''
+    for c in chunks:
+        w.write(c)
+        drain(w)
+    w.close()
+
+def read(filename):
+    f = open(filename, 'rb')
+    ret = f.read()
+    f.close()
+    return ret
+
+def decompress(data, compress):
+    '''decode all the concatenated streams of a compressed log'''
+    ret = b''
+    while data:
+        if compress == 'gz':
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            d = bz2.BZ2Decompressor()
+        ret += d.decompress(data)
+        data = d.unused_data
+    return ret
+
+class TempDir:
+    def __enter__(self):
+        self.path = tempfile.mkdtemp()
+        return self
+    def __exit__(self, *args):
+        shutil.rmtree(self.path)
+    def join(self, name):
+        return os.path.join(self.path, name)
+    def files(self):
+        return sorted(os.listdir(self.path))
+
+def test_rotation_naming():
+    with TempDir() as d:
+        w = ublox.logwriter.UBloxLogWriter(d.join('r.ubx'), rotate_size=100)
+        write_all(w, [b'a' * 100, b'b' * 100, b'c' * 100])
+        # no empty file is left after the last rotation
+        assert d.files() == ['r-001.ubx', 'r-002.ubx', 'r.ubx']
+        assert read(d.join('r.ubx')) == b'a' * 100
+        assert read(d.join('r-001.ubx')) == b'b' * 100
+        assert read(d.join('r-002.ubx')) == b'c' * 100
+
+def test_no_overwrite():
+    with TempDir() as d:
+        f = open(d.join('ow.ubx'), 'wb')
+        f.write(b'OLDDATA')
+        f.close()
+        w = ublox.logwriter.UBloxLogWriter(d.join('ow.ubx'))
+        write_all(w, [b'new'])
+        assert read(d.join('ow.ubx')) == b'OLDDATA'
+        assert read(d.join('ow-001.ubx')) == b'new'
+
+        # a second rotating session skips the files of the first
+        w = ublox.logwriter.UBloxLogWriter(d.join('ow.ubx'), rotate_size=3)
+        write_all(w, [b'one', b'two'])
+        assert d.files() == ['ow-001.ubx', 'ow-002.ubx', 'ow-003.ubx', 'ow.ubx']
+        assert read(d.join('ow-001.ubx')) == b'new'
+        assert read(d.join('ow-002.ubx')) == b'one'
+        assert read(d.join('ow-003.ubx')) == b'two'
+
+def test_append_reopen():
+    with TempDir() as d:
+        w = ublox.logwriter.UBloxLogWriter(d.join('r.ubx'), append=True, rotate_size=100)
+        write_all(w, [b'a' * 100, b'b' * 100, b'c' * 50])
+        assert d.files() == ['r-001.ubx', 'r-002.ubx', 'r.ubx']
+
+        # a reopened capture carries on in the latest file of the series
+        w = ublox.logwriter.UBloxLogWriter(d.join('r.ubx'), append=True, rotate_size=100)
+        write_all(w, [b'd' * 50, b'e' * 100])
+        assert d.files() == ['r-001.ubx', 'r-002.ubx', 'r-003.ubx', 'r.ubx']
+        assert read(d.join('r-002.ubx')) == b'c' * 50 + b'd' * 50
+        data = b''.join([read(d.join(f)) for f in ['r.ubx', 'r-001.ubx', 'r-002.ubx', 'r-003.ubx']])
+        assert data == b'a' * 100 + b'b' * 100 + b'c' * 50 + b'd' * 50 + b'e' * 100
+
+def test_compressed():
+    data = bytes(bytearray(range(256))) * 40
+    for compress in ['gz', 'bz2']:
+        with TempDir() as d:
+            w = ublox.logwriter.UBloxLogWriter(d.join('c.ubx'), compress=compress)
+            write_all(w, [data[:1000], data[1000:]])
+            assert d.files() == ['c.ubx.' + compress]
+            assert decompress(read(d.join('c.ubx.' + compress)), compress) == data
+
+            w = ublox.logwriter.UBloxLogWriter(d.join('c.ubx'), append=True, compress=compress)
+            write_all(w, [b'more'])
+            assert d.files() == ['c.ubx.' + compress]
+            assert decompress(read(d.join('c.ubx.' + compress)), compress) == data + b'more'
@@ -0,0 +1,69 @@
+'''
+check the Kalman filter position engine against the least squares fix
+over the bundled log
+'''
+
+import os, sys, shutil, tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'ublox')]
+
+import numpy
+import ublox
+try:
+    import util, satelliteData, positionEstimate, positionFilter
+except SyntaxError:
+    # ublox/util only runs under python 2
+    positionFilter = None
+
+LOG = os.path.join(ROOT, 'data', '6P-raw-PPP.ubx')
+
+def positions(estimate):
+    '''run the log through estimate(satinfo), returning the positions and
+    clock errors of the RXM_RAW epochs, NaN where there is no fix'''
+    satinfo = satelliteData.SatelliteData()
+    dev = ublox.UBlox(LOG)
+    ret = []
+    while True:
+        msg = dev.receive_message()
+        if msg is None:
+            break
+        if msg.name() in ['AID_EPH', 'RXM_RAW', 'RXM_SFRB']:
+            msg.unpack()
+            satinfo.add_message(msg)
+            if msg.name() == 'RXM_RAW':
+                pos = estimate(satinfo)
+                if pos is None:
+                    ret.append((numpy.nan,) * 4)
+                else:
+                    ret.append((pos.X, pos.Y, pos.Z, pos.extra))
+    dev.close()
+    return numpy.array(ret)
+
+def test_ekf_follows_least_squares():
+    if positionFilter is None:
+        import pytest
+        pytest.skip('needs python 2')
+    # SatelliteData saves ephemeris and the fixes save a satellite log in
+    # the current directory
+    cwd = os.getcwd()
+    tmpdir = tempfile.mkdtemp()
+    os.chdir(tmpdir)
+    try:
+        ls = positions(positionEstimate.positionEstimate)
+        os.unlink('ephemeris.dat')
+        ekf = positionFilter.PositionEKF()
+        kf = positions(lambda satinfo: positionEstimate.positionEstimateEKF(satinfo, ekf))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+    assert len(ls) == len(kf) > 200
+    ok = ~numpy.isnan(ls[:,0])
+    assert (ok == ~numpy.isnan(kf[:,0])).all()
+    d = numpy.sqrt(((ls[ok,:3] - kf[ok,:3])**2).sum(axis=1))
+    # the filter starts from a least squares fix and takes a few epochs
+    # to learn the velocity and clock drift
+    assert numpy.median(d) < 0.5
+    assert d[20:].max() < 3.0
+    assert numpy.median(abs(ls[ok,3] - kf[ok,3])) * util.speedOfLight < 0.5
+    assert ekf.rejected == []
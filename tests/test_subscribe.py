@@ -0,0 +1,60 @@
+'''
+check UBlox message subscriptions against the frames of the bundled log
+'''
+
+import os, struct
+import ublox
+
+LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', '6P-raw-PPP.ubx')
+
+def count_types():
+    '''count the messages of each type in the log by a plain scan'''
+    dev = ublox.UBlox(LOG)
+    ret = {}
+    while True:
+        msg = dev.receive_message()
+        if msg is None:
+            break
+        ret[msg.msg_type()] = ret.get(msg.msg_type(), 0) + 1
+    dev.close()
+    return ret
+
+def test_dispatch_log():
+    counts = count_types()
+    dev = ublox.UBlox(LOG)
+    got = {}
+    def handler(msg):
+        # messages arrive decoded
+        assert msg.iTOW >= 0
+        got[msg.msg_type()] = got.get(msg.msg_type(), 0) + 1
+    nav = [(ublox.CLASS_NAV, ublox.MSG_NAV_SOL), (ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH)]
+    dev.subscribe(tuple(nav), handler)
+    dev.subscribe((ublox.CLASS_RXM, ublox.MSG_RXM_RAW), handler)
+    dev.dispatch_messages()
+    dev.close()
+    want = dict([(t, counts[t]) for t in nav + [(ublox.CLASS_RXM, ublox.MSG_RXM_RAW)] if t in counts])
+    assert len(want) > 0
+    assert got == want
+
+def test_unsubscribe():
+    dev = ublox.UBlox(LOG)
+    handler = lambda msg: None
+    types = ((ublox.CLASS_NAV, ublox.MSG_NAV_SOL), (ublox.CLASS_AID, ublox.MSG_AID_EPH))
+    dev.subscribe(types, handler)
+    assert sorted(dev.handlers) == sorted(types)
+    dev.unsubscribe(types, handler)
+    assert dev.handlers == {}
+    dev.close()
+
+def test_dispatch_mga():
+    dev = ublox.UBlox(LOG)
+    got = []
+    key = (ublox.CLASS_MGA, ublox.MSG_MGA_INI_TIME_UTC, ublox.MSG_MGA_INI_TYPE_TIME_UTC)
+    dev.subscribe(key, got.append)
+    assert list(dev.handlers) == [key[:2]]
+    msg = ublox.UBlox.pack_message(ublox.CLASS_MGA, ublox.MSG_MGA_INI_TIME_UTC,
+                                   struct.pack('<BBBbHBBBBBBIH2BI', ublox.MSG_MGA_INI_TYPE_TIME_UTC,
+                                               0, 0, 18, 2020, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+    assert dev.dispatch(msg)
+    assert got == [msg]
+    dev.close()
@@ -0,0 +1,137 @@
+'''
+check pipelined configuration transactions against the simulated receiver
+'''
+
+import struct, threading
+import ublox, ublox.simulator, ublox.transaction
+from ublox.transaction import ACK, NACK, TIMEOUT
+
+class Simulator(ublox.simulator.UBloxSimulator):
+    '''a simulator that loses the acknowledgements of the CFG types in drop
+    the first time it sends them'''
+    def __init__(self, drop=[], **kwargs):
+        ublox.simulator.UBloxSimulator.__init__(self, **kwargs)
+        self.drop = list(drop)
+
+    def _ack(self, out, msg_class, msg_id, ok=True):
+        if (msg_class, msg_id) in self.drop:
+            self.drop.remove((msg_class, msg_id))
+            return
+        ublox.simulator.UBloxSimulator._ack(self, out, msg_class, msg_id, ok)
+
+class Link:
+    '''a device for the transaction that hands its frames straight to
+    the simulator and keeps the replies'''
+    read_only = False
+    def __init__(self, sim):
+        self.sim = sim
+        self.sent = []
+        self.replies = []
+        sim.reply = lambda out, msg: self.replies.append(msg)
+
+    def send(self, msg):
+        self.sent.append(msg.msg_type())
+        frame = bytearray(msg._buf)
+        self.sim.handle_frame(None, frame[2], frame[3], frame)
+
+def cfg_msg(rate=1):
+    return ublox.UBlox.pack_message(ublox.CLASS_CFG, ublox.MSG_CFG_SET_RATE,
+                                    struct.pack('<BBB', ublox.CLASS_NAV, ublox.MSG_NAV_SOL, rate))
+
+def cfg_rate(rate_ms):
+    return ublox.UBlox.pack_message(ublox.CLASS_CFG, ublox.MSG_CFG_RATE,
+                                    struct.pack('<HHH', rate_ms, 1, 0))
+
+def cfg_cfg():
+    return ublox.UBlox.pack_message(ublox.CLASS_CFG, ublox.MSG_CFG_CFG,
+                                    struct.pack('<IIIB', 0, 0, 0, 0))
+
+def test_window():
+    link = Link(Simulator())
+    t = ublox.transaction.UBloxConfigTransaction(link, window=2)
+    for i in range(5):
+        t.add(cfg_msg(i))
+    t.start()
+    assert len(link.sent) == 2
+    while link.replies:
+        # each acknowledgement lets one more message go
+        assert t.handle(link.replies.pop(0))
+        assert len(t._inflight) <= 2
+    assert t.done()
+    assert len(link.sent) == 5
+    assert [r.status for r in t.results] == [ACK] * 5
+    assert [r.attempts for r in t.results] == [1] * 5
+
+def test_matching():
+    link = Link(Simulator())
+    t = ublox.transaction.UBloxConfigTransaction(link, window=8)
+    a = t.add(cfg_msg())
+    b = t.add(cfg_rate(10))
+    c = t.add(cfg_cfg())
+    t.start()
+    replies = link.replies
+    assert [m.msg_type() for m in replies] == [(ublox.CLASS_ACK, ublox.MSG_ACK_ACK),
+                                               (ublox.CLASS_ACK, ublox.MSG_ACK_NACK),
+                                               (ublox.CLASS_ACK, ublox.MSG_ACK_ACK)]
+    # acknowledgements are matched by clsID and msgID, not by order
+    assert t.handle(replies[2])
+    assert c.status == ACK and a.status is None and b.status is None
+    assert t.handle(replies[1])
+    assert b.status == NACK and a.status is None
+    # a second acknowledgement of the same type matches nothing
+    assert not t.handle(replies[1])
+    assert t.handle(replies[0])
+    assert a.status == ACK
+    assert t.done()
+    assert t.failed() == [b]
+    # other messages aren't acknowledgements
+    assert not t.handle(cfg_msg())
+
+def test_retry():
+    sim = Simulator(drop=[(ublox.CLASS_CFG, ublox.MSG_CFG_RATE)])
+    link = Link(sim)
+    t = ublox.transaction.UBloxConfigTransaction(link, timeout=0, retries=2)
+    a = t.add(cfg_rate(1000))
+    t.start()
+    assert link.replies == []
+    t.check()
+    assert a.status is None and a.attempts == 2
+    assert t.handle(link.replies.pop(0))
+    assert a.status == ACK and a.attempts == 2 and t.done()
+
+    # with every acknowledgement lost the message times out
+    sim.drop = [(ublox.CLASS_CFG, ublox.MSG_CFG_RATE)] * 3
+    t = ublox.transaction.UBloxConfigTransaction(link, timeout=0, retries=2)
+    a = t.add(cfg_rate(1000))
+    t.start()
+    while not t.done():
+        t.check()
+    assert a.status == TIMEOUT and a.attempts == 3
+    assert link.replies == []
+
+def test_device_transaction():
+    # the whole path, through UBlox.transaction() over TCP
+    sim = Simulator(drop=[(ublox.CLASS_CFG, ublox.MSG_CFG_NAVX5)], rate_ms=100)
+    port = sim.listen_tcp(0, '127.0.0.1')
+    thread = threading.Thread(target=sim.run, kwargs={'duration': 20, 'wait': True})
+    thread.daemon = True
+    thread.start()
+    dev = ublox.UBlox('tcp:127.0.0.1:%u' % port)
+    try:
+        with dev.transaction(window=2, timeout=0.2, retries=3) as t:
+            dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
+            dev.configure_solution_rate(rate_ms=10)
+            dev.configure_min_max_sats(4, 16)
+            dev.configure_loadsave()
+        assert [r.key for r in t.results] == [(ublox.CLASS_CFG, ublox.MSG_CFG_SET_RATE),
+                                              (ublox.CLASS_CFG, ublox.MSG_CFG_RATE),
+                                              (ublox.CLASS_CFG, ublox.MSG_CFG_NAVX5),
+                                              (ublox.CLASS_CFG, ublox.MSG_CFG_CFG)]
+        assert [r.status for r in t.results] == [ACK, NACK, ACK, ACK]
+        assert [r.attempts for r in t.results] == [1, 1, 2, 1]
+        assert t.failed() == [t.results[1]]
+    finally:
+        sim.stop()
+        thread.join()
+        dev.close()
+        sim.close()
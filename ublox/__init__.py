@@ -1,2 +1,2 @@
 '''Python UBlox utilities'''
-from ublox import *
+from .ublox import *
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+'''
+asyncio transport for UBlox receivers, TCP connections and logs
+
+AsyncUBlox shares the message descriptors, framer, logging and
+special_handling() of UBlox, but reads through the event loop, so one
+loop can serve many receivers and sockets without threads:
+
+    dev = await AsyncUBlox('/dev/ttyACM0').connect()
+    await dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
+    async with dev.transaction() as t:
+        dev.configure_solution_rate(rate_ms=200)
+    async for msg in dev:
+        print(msg)
+
+This module needs python3.
+
+Released under GNU GPL version 3 or later
+'''
+
+import asyncio, os, socket
+import ublox
+from . import transaction
+
+class UBloxProtocol(asyncio.Protocol):
+    '''asyncio protocol passing data and flow control events to an AsyncUBlox'''
+    def __init__(self, dev):
+        self.dev = dev
+
+    def data_received(self, data):
+        self.dev._data_received(data)
+
+    def eof_received(self):
+        self.dev._connection_lost(None)
+        return False
+
+    def connection_lost(self, exc):
+        self.dev._connection_lost(exc)
+
+    def pause_writing(self):
+        self.dev._pause_writing()
+
+    def resume_writing(self):
+        self.dev._resume_writing()
+
+class AsyncUBloxTransaction(transaction.UBloxConfigTransaction):
+    '''configuration transaction for an AsyncUBlox, run by leaving an
+    async with block or awaiting run()'''
+    async def __aenter__(self):
+        self.dev._transaction = self
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.dev._transaction = None
+        if exc_type is None:
+            await self.run()
+
+    async def run(self):
+        '''send the messages and wait for their acknowledgements,
+        returning the results. Other messages received meanwhile are
+        passed to the device's dispatch()'''
+        self.start()
+        while not self.done():
+            try:
+                msg = await asyncio.wait_for(self.dev.receive_message(), self.next_timeout())
+            except asyncio.TimeoutError:
+                msg = None
+            if msg is not None:
+                if not self.handle(msg):
+                    self.dev.dispatch(msg)
+            elif self.dev._eof:
+                self._abandon(transaction.TIMEOUT)
+                break
+            self.check()
+        return self.results
+
+class AsyncUBlox(ublox.UBlox):
+    '''asyncio UBlox control class.
+
+    port can be a file object or log filename (for reading only), a
+    serial device or tcp:host:port. Call connect() before use.
+
+    send() and the configure_*() calls queue the data straight away and
+    return a future that completes once it has been handed to the OS,
+    so they can be awaited for flow control or just called
+    '''
+    def __init__(self, port, baudrate=115200, lazy=True, read_limit=1<<20):
+        self._init_state(port, baudrate, lazy)
+        self.dev = None
+        # reading from the device is paused while more than this many
+        # bytes are waiting to be framed
+        self.read_limit = read_limit
+        self.error = None
+        self._loop = None
+        self._transport = None
+        self._write_transport = None
+        self._waiter = None
+        self._eof = False
+        self._reading_paused = False
+        self._writing_paused = False
+        self._drain_waiters = []
+
+    async def connect(self):
+        '''open the device, returning self'''
+        self._loop = asyncio.get_running_loop()
+        port = self.serial_device
+        if hasattr(port, 'read'):
+            self.dev = port
+            self.read_only = True
+        elif port.startswith("tcp:"):
+            a = port.split(':')
+            (self._transport, protocol) = await self._loop.create_connection(lambda: UBloxProtocol(self),
+                                                                             a[1], int(a[2]))
+            self._transport.get_extra_info('socket').setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+            self._write_transport = self._transport
+            self.dev = self._transport
+        elif os.path.isfile(port):
+            self.dev = open(port, mode='rb')
+            self.read_only = True
+        else:
+            import serial
+            # the serial port is only used to set up the line, all I/O
+            # goes through the event loop on its file descriptor
+            self.dev = serial.Serial(port, baudrate=self.baudrate,
+                                     dsrdtr=False, rtscts=False, xonxoff=False, timeout=0)
+            (self._transport, protocol) = await self._loop.connect_read_pipe(lambda: UBloxProtocol(self),
+                                                                             self.dev)
+            wpipe = os.fdopen(os.dup(self.dev.fileno()), 'wb', buffering=0)
+            (self._write_transport, protocol) = await self._loop.connect_write_pipe(lambda: UBloxProtocol(self),
+                                                                                    wpipe)
+        return self
+
+    async def __aenter__(self):
+        if self.dev is None:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        '''close the device and any log'''
+        for t in (self._write_transport, self._transport):
+            if t is not None:
+                t.close()
+        if self._transport is None and self.dev is not None:
+            self.dev.close()
+        self._transport = None
+        self._write_transport = None
+        self.dev = None
+        self._connection_lost(None)
+        self.set_logfile(None)
+
+    def _wakeup(self):
+        '''wake a receive_message() waiting for data'''
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _data_received(self, data):
+        self.feed(data)
+        if (self.framer.buffered() > self.read_limit and self._transport is not None and
+            not self._reading_paused):
+            self._transport.pause_reading()
+            self._reading_paused = True
+        self._wakeup()
+
+    def _connection_lost(self, exc):
+        if exc is not None and self.error is None:
+            self.error = exc
+        self._eof = True
+        self._resume_writing()
+        self._wakeup()
+
+    def _pause_writing(self):
+        self._writing_paused = True
+
+    def _resume_writing(self):
+        self._writing_paused = False
+        waiters = self._drain_waiters
+        self._drain_waiters = []
+        for w in waiters:
+            if not w.done():
+                w.set_result(None)
+
+    def drained(self):
+        '''return a future that completes when the write buffer has drained'''
+        fut = self._loop.create_future()
+        if self._writing_paused:
+            self._drain_waiters.append(fut)
+        else:
+            fut.set_result(None)
+        return fut
+
+    def write(self, buf):
+        '''queue some bytes for writing, returning a future for the write'''
+        if not self.read_only and self._write_transport is not None and not self._eof:
+            self._write_transport.write(buf)
+        return self.drained()
+
+    def send(self, msg):
+        '''send a preformatted ublox message, returning a future for the write'''
+        ret = ublox.UBlox.send(self, msg)
+        if ret is None:
+            ret = self.drained()
+        return ret
+
+    def read(self, n):
+        raise ublox.UBloxError("AsyncUBlox does not support blocking reads")
+
+    def transaction(self, window=8, timeout=1.0, retries=3):
+        '''return an AsyncUBloxTransaction, for use in an async with block'''
+        return AsyncUBloxTransaction(self, window=window, timeout=timeout, retries=retries)
+
+    def seek(self, offset):
+        '''seek to a byte offset in a log'''
+        if not self.read_only:
+            raise ublox.UBloxError("can only seek in a log")
+        ublox.UBlox.seek(self, offset)
+
+    async def receive_message(self, ignore_eof=False):
+        '''receive one ublox message. Returns None at the end of a log
+        or when the connection is closed'''
+        while True:
+            msg = self.next_buffered_message()
+            if msg is not None:
+                return msg
+            if self.read_only:
+                b = self.dev.read(self.read_chunk_size)
+                if b:
+                    self.feed(b)
+                    # let other tasks run between chunks of a log
+                    await asyncio.sleep(0)
+                    continue
+                if not ignore_eof:
+                    return None
+                await asyncio.sleep(0.01)
+                continue
+            if self._eof:
+                return None
+            if self._reading_paused:
+                self._reading_paused = False
+                self._transport.resume_reading()
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    async def messages(self, ignore_eof=False):
+        '''iterate over received messages'''
+        while True:
+            msg = await self.receive_message(ignore_eof=ignore_eof)
+            if msg is None:
+                return
+            yield msg
+
+    def __aiter__(self):
+        return self.messages()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+'''
+Columnar archives of decoded UBlox logs
+
+A log is decoded once into one array per field of each message type
+and saved as a NumPy .npz archive, or as a directory of .npy files
+that can be memory mapped. The repeated records of a message are
+flattened into their own columns, each record tagged with the iTOW
+and week of the message it came from. Loading an archive only reads
+the columns that are used:
+
+    archive = ublox.archive.load_log('capture.ubx')
+    raw = archive['RXM_RAW']
+    print(raw.numSV, raw.recs.sv, raw.recs.prMes)
+
+Released under GNU GPL version 3 or later
+'''
+
+import os
+import numpy
+import ublox
+from . import parallel
+
+ARCHIVE_VERSION = 1
+
+def archive_filename(logfile):
+    '''return the default archive filename for a log'''
+    return logfile + '.npz'
+
+def _columns(name, a):
+    '''split a structured array into a dictionary of archive keys and columns'''
+    ret = {}
+    for f in a.dtype.names:
+        ret['%s.%s' % (name, f)] = numpy.ascontiguousarray(a[f])
+    return ret
+
+def export_log(logfile, filename=None, types=None, parent_fields=['iTOW', 'week'],
+               processes=None, compress=True):
+    '''decode a log and save it as a columnar archive, returning the
+    archive filename.
+
+    types is a list of message type tuples, defaulting to all known
+    types. Records are tagged with the parent_fields of their message.
+    A filename ending in .npz gives a single archive, compressed if
+    compress is set. Any other filename is created as a directory of
+    .npy files, which are memory mapped when loaded. The log is
+    decoded by processes worker processes, see parallel_log_records()
+    '''
+    if filename is None:
+        filename = archive_filename(logfile)
+    if types is None:
+        types = list(ublox.msg_types.keys())
+    log_size = os.path.getsize(logfile)
+    (records, messages) = parallel.parallel_log_records(logfile, types, parent_fields,
+                                                        processes=processes, messages=True)
+    columns = {}
+    for name in messages:
+        columns.update(_columns(name, messages[name]))
+    for name in records:
+        columns.update(_columns(name + '.recs', records[name]))
+    columns['_version'] = numpy.array(ARCHIVE_VERSION)
+    columns['_log_size'] = numpy.array(log_size, dtype=numpy.int64)
+
+    if filename.endswith('.npz'):
+        if compress:
+            numpy.savez_compressed(filename, **columns)
+        else:
+            numpy.savez(filename, **columns)
+        return filename
+    if not os.path.isdir(filename):
+        os.makedirs(filename)
+    for f in os.listdir(filename):
+        if f.endswith('.npy'):
+            os.unlink(os.path.join(filename, f))
+    for key in columns:
+        numpy.save(os.path.join(filename, key + '.npy'), columns[key])
+    return filename
+
+class UBloxColumns:
+    '''the columns of one message type, or of its repeated records, in
+    an archive. Columns are read as attributes or items the first time
+    they are used. recs holds the columns of the repeated records, or
+    is None for types without them'''
+    def __init__(self, archive, prefix, fields, recs=None):
+        self._archive = archive
+        self._prefix = prefix
+        self._fields = fields
+        self._cache = {}
+        self.recs = recs
+
+    def keys(self):
+        '''return the field names'''
+        return list(self._fields)
+
+    def __contains__(self, field):
+        return field in self._fields
+
+    def __getitem__(self, field):
+        if not field in self._fields:
+            raise KeyError(field)
+        if not field in self._cache:
+            self._cache[field] = self._archive._load('%s.%s' % (self._prefix, field))
+        return self._cache[field]
+
+    def __getattr__(self, field):
+        if field.startswith('_'):
+            raise AttributeError(field)
+        try:
+            return self[field]
+        except KeyError:
+            raise AttributeError(field)
+
+    def __len__(self):
+        if not self._fields:
+            return 0
+        return len(self[self._fields[0]])
+
+class UBloxArchive:
+    '''read access to a columnar archive written by export_log().
+    Indexing by message name gives its UBloxColumns'''
+    def __init__(self, filename):
+        self.filename = filename
+        if os.path.isdir(filename):
+            self._npz = None
+            keys = [f[:-4] for f in sorted(os.listdir(filename)) if f.endswith('.npy')]
+        else:
+            self._npz = numpy.load(filename)
+            keys = self._npz.files
+        if not '_version' in keys or int(self._load('_version')) != ARCHIVE_VERSION:
+            self.close()
+            raise ublox.UBloxError("%s is not a UBlox archive" % filename)
+        self.log_size = int(self._load('_log_size'))
+
+        # group the keys into message and record columns, keeping
+        # the order they were saved in
+        fields = {}
+        for key in keys:
+            if key.startswith('_'):
+                continue
+            (name, field) = key.split('.', 1)
+            if field.startswith('recs.'):
+                name += '.recs'
+                field = field[5:]
+            fields.setdefault(name, []).append(field)
+        self._types = {}
+        for name in fields:
+            if name.endswith('.recs'):
+                continue
+            recs = None
+            if name + '.recs' in fields:
+                recs = UBloxColumns(self, name + '.recs', fields[name + '.recs'])
+            self._types[name] = UBloxColumns(self, name, fields[name], recs)
+
+    def _load(self, key):
+        '''read one column'''
+        if self._npz is not None:
+            return self._npz[key]
+        return numpy.load(os.path.join(self.filename, key + '.npy'), mmap_mode='r')
+
+    def names(self):
+        '''return the names of the message types in the archive'''
+        return sorted(self._types.keys())
+
+    def __contains__(self, name):
+        return name in self._types
+
+    def __getitem__(self, name):
+        return self._types[name]
+
+    def close(self):
+        '''close the archive file'''
+        if self._npz is not None:
+            self._npz.close()
+            self._npz = None
+
+def load_log(logfile, filename=None, update=True, **kwargs):
+    '''return a UBloxArchive for a log, exporting the log first if the
+    archive doesn't exist, or if update is set and the log has changed
+    size since it was exported. Other arguments are passed to
+    export_log()'''
+    if filename is None:
+        filename = archive_filename(logfile)
+    archive = None
+    if os.path.exists(filename):
+        try:
+            archive = UBloxArchive(filename)
+        except (ublox.UBloxError, IOError, OSError, ValueError):
+            archive = None
+    if archive is not None and update and archive.log_size != os.path.getsize(logfile):
+        archive.close()
+        archive = None
+    if archive is None:
+        export_log(logfile, filename, **kwargs)
+        archive = UBloxArchive(filename)
+    return archive
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+'''
+NumPy structured array decoding of the repeated blocks of UBlox
+messages, such as the per-satellite records of RXM_RAW and NAV_SVINFO
+
+Released under GNU GPL version 3 or later
+'''
+
+import struct
+import numpy
+import ublox
+
+# numpy types for struct format codes
+_numpy_types = {
+    'c' : 'S1',
+    'b' : 'i1',
+    'B' : 'u1',
+    '?' : 'b1',
+    'h' : 'i2',
+    'H' : 'u2',
+    'i' : 'i4',
+    'I' : 'u4',
+    'l' : 'i4',
+    'L' : 'u4',
+    'q' : 'i8',
+    'Q' : 'u8',
+    'f' : 'f4',
+    'd' : 'f8',
+}
+
+_dtypes = {}
+_message_dtypes = {}
+
+def _numpy_type(order, token):
+    '''return the numpy type string for one struct format token'''
+    if order in ('>', '!'):
+        prefix = '>'
+    elif order == '<':
+        prefix = '<'
+    else:
+        prefix = '='
+    if token.endswith('s'):
+        return 'S%u' % int(token[:-1] or 1)
+    if not token in _numpy_types:
+        raise ublox.UBloxError("no numpy type for format %s" % token)
+    return prefix + _numpy_types[token]
+
+def record_dtype(msg_type):
+    '''return the numpy dtype of the repeated records of a message type'''
+    if msg_type in _dtypes:
+        return _dtypes[msg_type]
+    desc = ublox.msg_types[msg_type]
+    if desc.format2 is None:
+        raise ublox.UBloxError("%s has no repeated block" % desc.name)
+    (order, tokens) = ublox.FormatTokens(desc.format2)
+    names = []
+    formats = []
+    offsets = []
+    values = [i for i in range(len(tokens)) if not tokens[i].endswith('x')]
+    for (fieldname, i) in zip(desc.fields2, values):
+        names.append(fieldname)
+        formats.append(_numpy_type(order, tokens[i]))
+        # offset of the token, allowing for any native alignment
+        offsets.append(struct.calcsize(order + ''.join(tokens[:i+1])) - struct.calcsize(order + tokens[i]))
+    dtype = numpy.dtype({'names' : names, 'formats' : formats, 'offsets' : offsets,
+                         'itemsize' : struct.calcsize(desc.format2)})
+    _dtypes[msg_type] = dtype
+    return dtype
+
+def records(msg):
+    '''return the repeated records of a message as a numpy structured
+    array. The array is a read-only view of the message buffer'''
+    if not msg.valid():
+        raise ublox.UBloxError('INVALID MESSAGE')
+    msg_type = msg.msg_type()
+    if not msg_type in ublox.msg_types:
+        raise ublox.UBloxError('Unknown message %s' % str(msg_type))
+    dtype = record_dtype(msg_type)
+    (ofs, count) = ublox.msg_types[msg_type].layout(msg)
+    return numpy.frombuffer(msg._buf, dtype=dtype, count=count, offset=ofs)
+
+def message_dtype(msg_type):
+    '''return the numpy dtype of the main fields of a message type.
+    Array fields become subarrays. Optional blocks missing from a
+    message are decoded as zeros'''
+    if msg_type in _message_dtypes:
+        return _message_dtypes[msg_type]
+    desc = ublox.msg_types[msg_type]
+    names = []
+    formats = []
+    offsets = []
+    itemsize = 0
+    for f in desc.fields:
+        (fieldname, alen) = ublox.ArrayParse(f)
+        if fieldname.strip() in names:
+            # a repeated name only has its last position in the layout
+            continue
+        (s, ofs, alen, block_end) = desc._field_layout[fieldname]
+        (order, tokens) = ublox.FormatTokens(s.format)
+        ntype = _numpy_type(order, tokens[0])
+        if alen != -1:
+            ntype = (ntype, alen)
+        names.append(fieldname.strip())
+        formats.append(ntype)
+        offsets.append(ofs - 6)
+        itemsize = max(itemsize, block_end - 6)
+    dtype = numpy.dtype({'names' : names, 'formats' : formats, 'offsets' : offsets,
+                         'itemsize' : itemsize})
+    _message_dtypes[msg_type] = dtype
+    return dtype
+
+class _LogArrays:
+    '''collect the messages of a log into per-type columns. The main
+    fields are collected for types without repeated records, or for
+    all types if messages is set'''
+    def __init__(self, types, parent_fields, messages=False):
+        # the main payload of each message
+        self.payloads = {}
+        # for each type with repeated records, the record byte strings,
+        # the record counts and the parent field values of each message
+        self.records = {}
+        self.parents = {}
+        for t in types:
+            desc = ublox.msg_types[t]
+            if desc.format2 is None or messages:
+                message_dtype(t)
+                self.payloads[t] = []
+            if desc.format2 is None:
+                continue
+            dtype = record_dtype(t)
+            columns = []
+            for f in parent_fields:
+                layout = desc._field_layout.get(f, None)
+                if layout is None or layout[2] != -1 or f in dtype.names:
+                    continue
+                (s, ofs, alen, block_end) = layout
+                (order, tokens) = ublox.FormatTokens(s.format)
+                columns.append((f, s, ofs, _numpy_type(order, tokens[0])))
+            self.parents[t] = columns
+            self.records[t] = ([], [], [[] for c in columns])
+
+    def add(self, msg):
+        '''add a message, ignoring types not being collected and
+        messages with a bad length'''
+        t = msg.msg_type()
+        if not t in self.payloads and not t in self.records:
+            return
+        desc = ublox.msg_types[t]
+        try:
+            (ofs, count) = desc.layout(msg)
+        except ublox.UBloxError:
+            return
+        if t in self.payloads:
+            self.payloads[t].append(msg._buf[6:ofs])
+        if not t in self.records:
+            return
+        (chunks, counts, values) = self.records[t]
+        chunks.append(msg._buf[ofs:ofs+count*desc._struct2.size])
+        counts.append(count)
+        for ((f, s, fofs, ntype), v) in zip(self.parents[t], values):
+            v.append(s.unpack_from(msg._buf, fofs)[0])
+
+    def message_arrays(self):
+        '''return a dictionary of main field arrays keyed by message type'''
+        ret = {}
+        for t in self.payloads:
+            payloads = self.payloads[t]
+            if not payloads:
+                continue
+            dtype = message_dtype(t)
+            pad = b'\0' * dtype.itemsize
+            ret[t] = numpy.frombuffer(b''.join([bytes(p) + pad[len(p):] for p in payloads]),
+                                      dtype=dtype)
+        return ret
+
+    def record_arrays(self):
+        '''return a dictionary of repeated record arrays keyed by message type'''
+        ret = {}
+        for t in self.records:
+            (chunks, counts, values) = self.records[t]
+            if not chunks:
+                continue
+            dtype = record_dtype(t)
+            recs = numpy.frombuffer(b''.join(chunks), dtype=dtype)
+            out = numpy.empty(len(recs), dtype=[(f, ntype) for (f, s, fofs, ntype) in self.parents[t]] +
+                              [(f, dtype.fields[f][0]) for f in dtype.names])
+            for ((f, s, fofs, ntype), v) in zip(self.parents[t], values):
+                out[f] = numpy.repeat(numpy.array(v, dtype=ntype), counts)
+            for f in dtype.names:
+                out[f] = recs[f]
+            ret[t] = out
+        return ret
+
+    def arrays(self):
+        '''return a dictionary of arrays keyed by message type, holding
+        the repeated records of types that have them and the main
+        fields of the others'''
+        ret = self.record_arrays()
+        messages = self.message_arrays()
+        for t in messages:
+            if not t in self.records:
+                ret[t] = messages[t]
+        return ret
+
+def log_records(dev, types=None, parent_fields=['iTOW', 'week']):
+    '''decode the repeated records of a whole log into one structured
+    array per message type.
+
+    dev is a UBlox object or a log filename. types is a list of
+    message type tuples, defaulting to all types with repeated
+    records. Any of parent_fields that are scalar fields of a message
+    type are added as columns, so each record is tagged with the epoch
+    it came from. Types without repeated records give one row of main
+    fields per message. Returns a dictionary of arrays keyed by
+    message name
+    '''
+    if not isinstance(dev, ublox.UBlox):
+        dev = ublox.UBlox(dev)
+    if types is None:
+        types = [t for t in ublox.msg_types if ublox.msg_types[t].format2 is not None]
+
+    collector = _LogArrays(types, parent_fields)
+    while True:
+        msg = dev.receive_message()
+        if msg is None:
+            break
+        collector.add(msg)
+
+    ret = {}
+    arrays = collector.arrays()
+    for t in arrays:
+        ret[ublox.msg_types[t].name] = arrays[t]
+    return ret
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+'''
+Parser throughput benchmarks
+
+Each benchmark runs over the bytes of a log and reports messages and
+megabytes per second, taking the best of a number of repeats:
+
+  framing      finding frames with UBloxFramer
+  mmap_framing finding frames in a memory mapped log
+  checksum     the Fletcher checksum of every frame
+  checksum_numpy  the same with BufferChecksums, when numpy is available,
+               counting frames where it differs from the frame checksum
+  unpack       decoding every frame, and per message type as unpack.NAME
+  pack         re-encoding the decoded messages
+  roundtrip    decode and re-encode, counting frames that differ
+  receive      UBlox.receive_message() over the log
+
+Corrupted copies of each log, with flipped bits, deleted spans and
+inserted junk, are benchmarked for framing and receive. Results are
+kept as JSON so runs can be compared:
+
+    results = ublox.benchmark.run_benchmarks(['data/6P-raw-PPP.ubx'])
+    ublox.benchmark.save_results(results, 'bench.json')
+    for r in ublox.benchmark.compare_results(old, results):
+        print(r)
+
+Released under GNU GPL version 3 or later
+'''
+
+import json, os, platform, random, tempfile, time
+import ublox
+
+# kinds of corruption applied to logs
+CORRUPTIONS = ['bitflip', 'truncate', 'junk']
+
+def bundled_logs():
+    '''return the logs shipped in the data directory'''
+    data = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+    if not os.path.isdir(data):
+        return []
+    return sorted([os.path.join(data, f) for f in os.listdir(data) if f.endswith('.ubx')])
+
+def corrupt(data, kind, seed=0, interval=2000):
+    '''return a copy of data with damage about every interval bytes.
+    kind is bitflip to flip single bits, truncate to delete spans of
+    up to 64 bytes, or junk to insert random bytes, some of them
+    starting with the UBX preamble'''
+    rand = random.Random(seed)
+    def randint(a, b):
+        # randint() differs between python versions, random() doesn't
+        return a + int(rand.random() * (b - a + 1))
+    out = bytearray()
+    pos = 0
+    while pos < len(data):
+        n = randint(1, 2 * interval)
+        out.extend(data[pos:pos+n])
+        pos += n
+        if pos >= len(data):
+            break
+        if kind == 'bitflip':
+            out.append(bytearray(data[pos:pos+1])[0] ^ (1 << randint(0, 7)))
+            pos += 1
+        elif kind == 'truncate':
+            pos += randint(1, 64)
+        elif kind == 'junk':
+            junk = bytearray([randint(0, 255) for i in range(randint(1, 64))])
+            if rand.random() < 0.5:
+                junk[0:2] = bytearray([ublox.PREAMBLE1, ublox.PREAMBLE2])
+            out.extend(junk)
+        else:
+            raise ValueError("unknown corruption %s" % kind)
+    return bytes(out)
+
+def split_frames(data):
+    '''return the valid frames of some bytes as a list of bytes'''
+    framer = ublox.UBloxFramer()
+    framer.feed(data)
+    return [bytes(bytearray(f)) for f in framer.frames()]
+
+def _best(func, repeat):
+    '''return (seconds, result) for the fastest of repeat calls of func'''
+    best = None
+    for i in range(repeat):
+        t0 = time.time()
+        ret = func()
+        t = time.time() - t0
+        if best is None or t < best[0]:
+            best = (t, ret)
+    return best
+
+def _result(seconds, messages, nbytes, **extra):
+    '''return a benchmark result dictionary'''
+    seconds = max(seconds, 1.0e-9)
+    ret = {'seconds': seconds, 'messages': messages, 'bytes': nbytes,
+           'msgs_per_sec': messages / seconds, 'mb_per_sec': nbytes / seconds / 1.0e6}
+    ret.update(extra)
+    return ret
+
+def bench_framing(data, chunk=4096):
+    '''feed data to a UBloxFramer in chunks, returning (frames, bad checksums)'''
+    framer = ublox.UBloxFramer()
+    count = 0
+    for ofs in range(0, len(data), chunk):
+        framer.feed(data[ofs:ofs+chunk])
+        for f in framer.frames():
+            count += 1
+    return (count, framer.bad_checksums)
+
+def bench_mmap_framing(filename):
+    '''count the frames of a memory mapped log'''
+    log = ublox.UBloxMmapLog(filename)
+    count = 0
+    while log.next_frame() is not None:
+        count += 1
+    log.close()
+    return count
+
+def bench_checksum(frames):
+    '''checksum every frame'''
+    for f in frames:
+        ublox.fletcher_checksum(f[2:-2])
+    return len(frames)
+
+def bench_checksum_numpy(frames):
+    '''checksum every frame from one BufferChecksums pass, returning the
+    arrays of ck_a and ck_b'''
+    buf = b''.join(frames)
+    sums = ublox.BufferChecksums(buf, 0, len(buf))
+    ofs = 0
+    starts = []
+    ends = []
+    for f in frames:
+        starts.append(ofs + 2)
+        ends.append(ofs + len(f) - 2)
+        ofs += len(f)
+    return sums.checksums(starts, ends)
+
+def checksums_differ(frames, checksums):
+    '''return the number of frames whose (ck_a, ck_b) arrays differ from
+    the scalar checksum or the checksum stored in the frame'''
+    differ = 0
+    (ck_a, ck_b) = checksums
+    for (f, a, b) in zip(frames, ck_a.tolist(), ck_b.tolist()):
+        stored = tuple(bytearray(f[-2:]))
+        if (a, b) != stored or ublox.fletcher_checksum(f[2:-2]) != stored:
+            differ += 1
+    return differ
+
+def _message(frame):
+    '''return a UBloxMessage for a frame known to be valid'''
+    msg = ublox.UBloxMessage()
+    msg._buf = frame
+    msg._checked_buf = frame
+    return msg
+
+def bench_unpack(frames):
+    '''decode every frame, returning the messages'''
+    ret = []
+    for f in frames:
+        msg = _message(f)
+        msg.unpack()
+        ret.append(msg)
+    return ret
+
+def bench_pack(messages):
+    '''re-encode decoded messages'''
+    for msg in messages:
+        msg.pack()
+    return len(messages)
+
+def bench_roundtrip(frames):
+    '''decode and re-encode every frame, returning the number that differ'''
+    differ = 0
+    for f in frames:
+        msg = _message(f)
+        msg.unpack()
+        msg.pack()
+        if bytes(bytearray(msg._buf)) != f:
+            differ += 1
+    return differ
+
+def bench_receive(filename):
+    '''receive every message of a log through UBlox'''
+    dev = ublox.UBlox(filename)
+    count = 0
+    while dev.receive_message() is not None:
+        count += 1
+    dev.close()
+    return count
+
+def decodable(frames):
+    '''return the frames of known message types, grouped by type name'''
+    ret = {}
+    for f in frames:
+        msg = _message(f)
+        t = msg.msg_type()
+        if not t in ublox.msg_types:
+            continue
+        try:
+            msg.unpack()
+        except Exception:
+            continue
+        ret.setdefault(ublox.msg_types[t].name, []).append(f)
+    return ret
+
+def benchmark_log(filename, repeat=3, corruptions=CORRUPTIONS):
+    '''run the benchmarks over one log, returning a dictionary of
+    results keyed by benchmark name'''
+    data = open(filename, 'rb').read()
+    frames = split_frames(data)
+    nbytes = sum([len(f) for f in frames])
+    by_type = decodable(frames)
+    good = [f for name in sorted(by_type) for f in by_type[name]]
+    good_bytes = sum([len(f) for f in good])
+    results = {}
+
+    (t, (count, bad)) = _best(lambda: bench_framing(data), repeat)
+    results['framing'] = _result(t, count, len(data), bad_checksums=bad)
+    (t, count) = _best(lambda: bench_mmap_framing(filename), repeat)
+    results['mmap_framing'] = _result(t, count, len(data))
+    (t, count) = _best(lambda: bench_checksum(frames), repeat)
+    results['checksum'] = _result(t, count, nbytes)
+    if ublox.numpy is not None:
+        (t, sums) = _best(lambda: bench_checksum_numpy(frames), repeat)
+        results['checksum_numpy'] = _result(t, len(frames), nbytes,
+                                            differ=checksums_differ(frames, sums))
+
+    (t, messages) = _best(lambda: bench_unpack(good), repeat)
+    results['unpack'] = _result(t, len(good), good_bytes)
+    for name in sorted(by_type):
+        f = by_type[name]
+        (t, m) = _best(lambda: bench_unpack(f), repeat)
+        results['unpack.' + name] = _result(t, len(f), sum([len(x) for x in f]))
+    (t, count) = _best(lambda: bench_pack(messages), repeat)
+    results['pack'] = _result(t, count, good_bytes)
+    (t, differ) = _best(lambda: bench_roundtrip(good), repeat)
+    results['roundtrip'] = _result(t, len(good), good_bytes, differ=differ)
+    (t, count) = _best(lambda: bench_receive(filename), repeat)
+    results['receive'] = _result(t, count, len(data))
+
+    for kind in corruptions:
+        bad_data = corrupt(data, kind)
+        (t, (count, bad)) = _best(lambda: bench_framing(bad_data), repeat)
+        results['framing.' + kind] = _result(t, count, len(bad_data), bad_checksums=bad)
+        (fd, tmp) = tempfile.mkstemp(suffix='.ubx')
+        try:
+            os.write(fd, bad_data)
+            os.close(fd)
+            (t, count) = _best(lambda: bench_receive(tmp), repeat)
+        finally:
+            os.unlink(tmp)
+        results['receive.' + kind] = _result(t, count, len(bad_data))
+    return results
+
+def run_benchmarks(logs=None, repeat=3, corruptions=CORRUPTIONS):
+    '''benchmark a list of logs, defaulting to the bundled logs.
+    Returns a dictionary describing the run, with results keyed by
+    log name and then benchmark name'''
+    if logs is None:
+        logs = bundled_logs()
+    ret = {'time': time.time(),
+           'python': platform.python_version(),
+           'platform': platform.platform(),
+           'numpy': ublox.numpy is not None,
+           'repeat': repeat,
+           'results': {}}
+    for filename in logs:
+        ret['results'][os.path.basename(filename)] = benchmark_log(filename, repeat, corruptions)
+    return ret
+
+def save_results(results, filename):
+    '''save benchmark results as JSON'''
+    f = open(filename, 'w')
+    json.dump(results, f, indent=1, sort_keys=True)
+    f.close()
+
+def load_results(filename):
+    '''load benchmark results saved by save_results()'''
+    f = open(filename)
+    ret = json.load(f)
+    f.close()
+    return ret
+
+def compare_results(old, new, threshold=0.1):
+    '''return a list of (log, benchmark, old msgs/s, new msgs/s) for the
+    benchmarks that are more than threshold slower in new than in old'''
+    ret = []
+    for log in sorted(new['results']):
+        if not log in old['results']:
+            continue
+        for name in sorted(new['results'][log]):
+            if not name in old['results'][log]:
+                continue
+            a = old['results'][log][name]['msgs_per_sec']
+            b = new['results'][log][name]['msgs_per_sec']
+            if a > 0 and b < a * (1 - threshold):
+                ret.append((log, name, a, b))
+    return ret
+
+def format_results(results):
+    '''return the results of a run as a table'''
+    lines = ['python %s on %s, numpy %s' % (results['python'], results['platform'],
+                                             'yes' if results['numpy'] else 'no')]
+    for log in sorted(results['results']):
+        lines.append(log)
+        r = results['results'][log]
+        for name in sorted(r):
+            line = '  %-28s %8u msgs %12.0f msgs/s %8.2f MB/s' % (
+                name, r[name]['messages'], r[name]['msgs_per_sec'], r[name]['mb_per_sec'])
+            if r[name].get('bad_checksums', 0):
+                line += ' %u bad' % r[name]['bad_checksums']
+            if r[name].get('differ', 0):
+                line += ' %u differ' % r[name]['differ']
+            lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+'''
+Sidecar index files for UBlox logs
+
+The index records the offset, class, id, payload length and GPS time
+of every frame in a log, so a reader can seek to a time or pull out
+selected message types without scanning the whole log.
+
+Released under GNU GPL version 3 or later
+'''
+
+import struct, os
+import numpy
+import ublox
+
+INDEX_MAGIC = b'UBXIDX1\0'
+
+# index file header: magic, log bytes scanned
+INDEX_HEADER = struct.Struct('<8sQ')
+
+# one entry per frame: offset, class, id, payload length, iTOW (ms), GPS week
+INDEX_ENTRY = struct.Struct('<QBBHih')
+
+INDEX_DTYPE = numpy.dtype([('offset', '<u8'),
+                           ('msg_class', 'u1'),
+                           ('msg_id', 'u1'),
+                           ('length', '<u2'),
+                           ('itow', '<i4'),
+                           ('week', '<i2')])
+
+WEEK_MS = 7*86400*1000
+
+def index_filename(logfile):
+    '''return the sidecar index filename for a log'''
+    return logfile + '.idx'
+
+class _TimeTracker:
+    '''work out the GPS time of each frame. Frames without an iTOW are
+    given the time of the last frame that had one'''
+    def __init__(self, itow=-1, week=-1):
+        self.itow = itow
+        self.week = week
+        self.fields = {}
+        for t in ublox.msg_types:
+            layout = ublox.msg_types[t]._field_layout
+            self.fields[t] = (layout.get('iTOW', None), layout.get('week', None))
+
+    def update(self, msg_type, frame):
+        '''update the time from a frame'''
+        if not msg_type in self.fields:
+            return
+        (itow, week) = self.fields[msg_type]
+        if week is not None and week[3] <= len(frame) - 2:
+            self.week = week[0].unpack_from(frame, week[1])[0]
+        if itow is not None and itow[3] <= len(frame) - 2:
+            t = int(itow[0].unpack_from(frame, itow[1])[0])
+            if week is None and self.week != -1 and t < self.itow - WEEK_MS//2:
+                # iTOW went backwards, we've crossed into a new week
+                self.week += 1
+            self.itow = t
+
+def build_index(logfile, indexfile=None, chunk_size=1<<20):
+    '''build or extend the index for a log, returning the index filename.
+
+    An existing index is extended from the point where it was last
+    built, so it can be kept up to date for a log that is still growing
+    '''
+    if indexfile is None:
+        indexfile = index_filename(logfile)
+    logsize = os.path.getsize(logfile)
+
+    start = 0
+    tracker = None
+    if os.path.exists(indexfile):
+        idx = open(indexfile, 'r+b')
+        hdr = idx.read(INDEX_HEADER.size)
+        nbytes = os.path.getsize(indexfile) - INDEX_HEADER.size
+        if (len(hdr) == INDEX_HEADER.size and nbytes % INDEX_ENTRY.size == 0 and
+            INDEX_HEADER.unpack(hdr)[0] == INDEX_MAGIC and
+            INDEX_HEADER.unpack(hdr)[1] <= logsize):
+            start = INDEX_HEADER.unpack(hdr)[1]
+            if nbytes > 0:
+                idx.seek(-INDEX_ENTRY.size, 2)
+                (offset, msg_class, msg_id, length, itow, week) = INDEX_ENTRY.unpack(idx.read(INDEX_ENTRY.size))
+                tracker = _TimeTracker(itow, week)
+            idx.seek(0, 2)
+        else:
+            # stale or damaged, start again
+            idx.close()
+            idx = None
+    else:
+        idx = None
+    if idx is None:
+        idx = open(indexfile, 'wb')
+        idx.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+    if tracker is None:
+        tracker = _TimeTracker()
+
+    log = open(logfile, 'rb')
+    log.seek(start)
+    framer = ublox.UBloxFramer()
+    framer.reset(start)
+    scanned = start
+    while True:
+        data = log.read(chunk_size)
+        if not data:
+            break
+        framer.feed(data)
+        entries = []
+        for frame in framer.frames():
+            msg_class = frame[2]
+            msg_id = frame[3]
+            if not isinstance(msg_class, int):
+                # python2 memoryviews index as strings
+                msg_class = ord(msg_class)
+                msg_id = ord(msg_id)
+            tracker.update((msg_class, msg_id), frame)
+            entries.append(INDEX_ENTRY.pack(framer.frame_offset, msg_class, msg_id, len(frame) - 8,
+                                            tracker.itow, tracker.week))
+            scanned = framer.frame_offset + len(frame)
+        idx.write(b''.join(entries))
+    log.close()
+
+    idx.seek(0)
+    idx.write(INDEX_HEADER.pack(INDEX_MAGIC, scanned))
+    idx.close()
+    return indexfile
+
+class UBloxIndex:
+    '''random access to a UBlox log through its sidecar index
+
+    Times are given as iTOW in milliseconds, with an optional GPS week.
+    Without a week, the week the log starts in is assumed, allowing for
+    one rollover.
+    '''
+    def __init__(self, logfile, indexfile=None, update=True):
+        self.logfile = logfile
+        if indexfile is None:
+            indexfile = index_filename(logfile)
+        self.indexfile = indexfile
+        if update or not os.path.exists(indexfile):
+            build_index(logfile, indexfile)
+        f = open(indexfile, 'rb')
+        f.seek(INDEX_HEADER.size)
+        self.entries = numpy.fromfile(f, dtype=INDEX_DTYPE)
+        f.close()
+        weeks = self.entries['week'].astype(numpy.int64)
+        self._first_week = 0
+        known = weeks[weeks >= 0]
+        if len(known) > 0:
+            self._first_week = int(known[0])
+        weeks[weeks < 0] = self._first_week
+        self.times = weeks * WEEK_MS + self.entries['itow']
+        # frame times are not monotonic, RXM_RAW for instance is stamped
+        # 1ms before the NAV messages logged ahead of it. Searches use the
+        # running maximum to find a position in the log, and the stable
+        # time order to find the frames in a window
+        self._latest = numpy.maximum.accumulate(self.times)
+        self._order = numpy.argsort(self.times, kind='mergesort')
+        self._sorted = self.times[self._order]
+        self._log = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def time_key(self, itow, week=None):
+        '''return the sort key for a GPS time'''
+        if week is not None:
+            return week * WEEK_MS + itow
+        key = self._first_week * WEEK_MS + itow
+        if len(self.times) > 0 and key < self.times[0] - WEEK_MS//2:
+            key += WEEK_MS
+        return key
+
+    def find_time(self, itow, week=None):
+        '''return the position in the index of the first frame at or after a time'''
+        return int(numpy.searchsorted(self._latest, self.time_key(itow, week), side='left'))
+
+    def select(self, types=None, start=None, end=None, week=None):
+        '''return the positions in the index of the frames in the time
+        window [start, end) with a type in the types list, in log order'''
+        if start is None and end is None:
+            sel = numpy.arange(len(self.entries))
+        else:
+            first = 0
+            last = len(self.entries)
+            if start is not None:
+                first = int(numpy.searchsorted(self._sorted, self.time_key(start, week), side='left'))
+            if end is not None:
+                last = int(numpy.searchsorted(self._sorted, self.time_key(end, week), side='left'))
+            sel = numpy.sort(self._order[first:max(first, last)])
+        if types is not None:
+            e = self.entries[sel]
+            mask = numpy.zeros(len(e), dtype=bool)
+            for (msg_class, msg_id) in types:
+                mask |= (e['msg_class'] == msg_class) & (e['msg_id'] == msg_id)
+            sel = sel[mask]
+        return sel
+
+    def read_message(self, i):
+        '''read the frame at a position in the index'''
+        if self._log is None:
+            self._log = open(self.logfile, 'rb')
+        e = self.entries[i]
+        self._log.seek(int(e['offset']))
+        msg = ublox.UBloxMessage()
+        msg._buf = self._log.read(int(e['length']) + 8)
+        msg._lazy_unpack = True
+        return msg
+
+    def messages(self, types=None, start=None, end=None, week=None):
+        '''iterate over the messages in a time window with a type in the types list'''
+        for i in self.select(types, start, end, week):
+            yield self.read_message(i)
+
+    def seek(self, dev, itow, week=None):
+        '''position a UBlox reader on this log at the first frame at or after a time'''
+        i = self.find_time(itow, week)
+        if i >= len(self.entries):
+            dev.seek_percent(100)
+        else:
+            dev.seek(int(self.entries[i]['offset']))
+
+    def close(self):
+        '''close the log file'''
+        if self._log is not None:
+            self._log.close()
+            self._log = None
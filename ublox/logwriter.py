@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+'''
+Background log writer for UBlox captures
+
+Data handed to write() is queued and written by a separate thread in
+large batches, so slow storage does not stall the receive path. The
+writer can fsync at a fixed interval, rotate to a new file by size or
+age, and compress the output as it goes.
+
+Released under GNU GPL version 3 or later
+'''
+
+import os, re, time, threading, atexit, zlib, bz2
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import ublox
+
+# writers that still need flushing when the program exits
+_open_writers = set()
+
+def _close_all():
+    for w in list(_open_writers):
+        w.close()
+
+atexit.register(_close_all)
+
+class UBloxLogWriter:
+    '''file-like log writer fed through a queue by UBlox.set_logfile()
+
+    filename may contain time.strftime() escapes, which are expanded
+    each time a new file is opened. If rotation would reuse a name or
+    the file already exists, a sequence number is added before the
+    extension, so earlier logs are never overwritten. With append the
+    latest existing file of the series, name or name-NNN, is appended
+    to, so a reopened capture carries on where it left off.
+
+    rotate_size is the size in bytes and rotate_interval the age in
+    seconds at which a new file is started. fsync_interval is how
+    often in seconds the data is forced to disk. compress may be
+    'gz' or 'bz2', in which case the matching extension is added.
+    '''
+    def __init__(self, filename, append=False, rotate_size=None, rotate_interval=None,
+                 fsync_interval=None, compress=None, batch_size=1<<20):
+        if not compress in (None, 'gz', 'bz2'):
+            raise ublox.UBloxError("unknown log compression %s" % compress)
+        self.template = filename
+        self.append = append
+        self.rotate_size = rotate_size
+        self.rotate_interval = rotate_interval
+        self.fsync_interval = fsync_interval
+        self.compress = compress
+        self.batch_size = batch_size
+        self.filename = None
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self.bytes_written = 0
+        self.error = None
+        self._queue = queue.Queue()
+        self._file = None
+        self._compressor = None
+        self._sequence = 0
+        self._closed = False
+        self._open()
+        self._thread = threading.Thread(target=self._run, name='UBloxLogWriter')
+        self._thread.daemon = True
+        self._thread.start()
+        _open_writers.add(self)
+
+    def _suffix(self):
+        '''return the compression extension of the log files'''
+        if self.compress is not None:
+            return '.' + self.compress
+        return ''
+
+    def _sequence_name(self, name, sequence):
+        '''return the filename with a sequence number, 0 meaning none'''
+        if sequence == 0:
+            return name + self._suffix()
+        (root, ext) = os.path.splitext(name)
+        return '%s-%03u%s%s' % (root, sequence, ext, self._suffix())
+
+    def _latest_sequence(self, name):
+        '''return the highest sequence number of the existing files of a
+        series, or None if there are none'''
+        ret = None
+        if os.path.exists(self._sequence_name(name, 0)):
+            ret = 0
+        (root, ext) = os.path.splitext(name)
+        (dirname, base) = os.path.split(root)
+        pattern = re.compile(re.escape(base) + r'-(\d{3,})' + re.escape(ext + self._suffix()) + '$')
+        for f in os.listdir(dirname or '.'):
+            m = pattern.match(f)
+            if m is not None and (ret is None or int(m.group(1)) > ret):
+                ret = int(m.group(1))
+        return ret
+
+    def _next_filename(self):
+        '''work out the name of the next log file'''
+        name = time.strftime(self.template)
+        if self.filename is None and self.append:
+            latest = self._latest_sequence(name)
+            if latest is not None:
+                self._sequence = latest
+                return self._sequence_name(name, latest)
+        ret = self._sequence_name(name, 0)
+        while ret == self.filename or os.path.exists(ret):
+            self._sequence += 1
+            ret = self._sequence_name(name, self._sequence)
+        return ret
+
+    def _open(self):
+        '''open a new log file'''
+        self.filename = self._next_filename()
+        if self.append:
+            mode = 'ab'
+        else:
+            mode = 'wb'
+        self._file = open(self.filename, mode=mode)
+        if self.compress == 'gz':
+            # a gzip stream. Appended streams form a valid multi-member
+            # file, as do concatenated bz2 streams
+            self._compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif self.compress == 'bz2':
+            self._compressor = bz2.BZ2Compressor()
+        else:
+            self._compressor = None
+        self._opened = time.time()
+        self._size = self._file.tell()
+        self._last_sync = self._opened
+        # only the first file is appended to
+        self.append = False
+
+    def _finish(self):
+        '''flush and close the current file'''
+        if self._compressor is not None:
+            self._file.write(self._compressor.flush())
+        self._file.flush()
+        if self.fsync_interval is not None:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def _write_batch(self, data):
+        '''write one batch of data, rotating if needed. The next file is
+        only opened once there is data for it'''
+        if self._file is None:
+            if not data:
+                return
+            self._open()
+        if self._compressor is not None:
+            out = self._compressor.compress(data)
+        else:
+            out = data
+        self._file.write(out)
+        self._size += len(out)
+        self.bytes_written += len(data)
+        now = time.time()
+        if self.fsync_interval is not None and now - self._last_sync >= self.fsync_interval:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+        if ((self.rotate_size is not None and self._size >= self.rotate_size) or
+            (self.rotate_interval is not None and now - self._opened >= self.rotate_interval)):
+            self._finish()
+
+    def _run(self):
+        '''writer thread'''
+        done = False
+        while not done:
+            timeout = None
+            if self.fsync_interval is not None:
+                timeout = self.fsync_interval
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = b''
+            batch = []
+            nbytes = 0
+            while True:
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+                nbytes += len(item)
+                if nbytes >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if self.error is not None:
+                continue
+            try:
+                self._write_batch(b''.join(batch))
+                if done and self._file is not None:
+                    self._finish()
+            except (IOError, OSError) as e:
+                self.error = e
+            with self._pending_lock:
+                self.pending -= nbytes
+
+    def write(self, data):
+        '''queue some bytes for writing'''
+        if self.error is not None:
+            raise ublox.UBloxError("log write failed: %s" % self.error)
+        if self._closed:
+            raise ublox.UBloxError("log is closed")
+        with self._pending_lock:
+            self.pending += len(data)
+        self._queue.put(bytes(data))
+
+    def flush(self):
+        '''queued data is written by the writer thread, so there is nothing to do here'''
+        pass
+
+    def close(self):
+        '''write out all queued data and close the log'''
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        _open_writers.discard(self)
+        if self.error is not None:
+            raise ublox.UBloxError("log write failed: %s" % self.error)
+
+def add_options(parser):
+    '''add the background log writer options to an OptionParser'''
+    parser.add_option("--log-rotate-size", type='float', default=None, help='start a new log file after this many MB')
+    parser.add_option("--log-rotate-time", type='float', default=None, help='start a new log file after this many hours')
+    parser.add_option("--log-fsync", type='float', default=None, help='fsync the log at this interval in seconds')
+    parser.add_option("--log-compress", default=None, help='compress the log (gz or bz2)')
+
+def writer_options(opts):
+    '''return the UBlox.set_logfile() keywords for options added by
+    add_options(), converting MB and hours to bytes and seconds'''
+    rotate_size = None
+    rotate_interval = None
+    if opts.log_rotate_size is not None:
+        rotate_size = int(opts.log_rotate_size * 1024 * 1024)
+    if opts.log_rotate_time is not None:
+        rotate_interval = opts.log_rotate_time * 3600
+    return dict(background=True, rotate_size=rotate_size, rotate_interval=rotate_interval,
+                fsync_interval=opts.log_fsync, compress=opts.log_compress)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+'''
+Parallel decoding of large UBlox logs
+
+The log is split into byte ranges that are decoded by a pool of
+processes, each reading the log through its own memory mapping. The
+start of each range is resynchronised on a frame whose checksum is
+good and which is directly followed by another good frame, so a
+preamble pattern inside a payload is not mistaken for a frame. The
+per-range arrays are joined back together in file order.
+
+Released under GNU GPL version 3 or later
+'''
+
+import os, multiprocessing
+import numpy
+import ublox
+from . import arrays
+
+# default number of bytes of log handed to each worker
+CHUNK_SIZE = 1<<24
+
+def _sync(log, pos, size):
+    '''return the offset of the first frame at or after pos that is
+    followed directly by another good frame or the end of the log'''
+    while True:
+        log.seek(pos)
+        if log.next_frame() is None:
+            return None
+        start = log.frame_offset
+        end = log.tell()
+        if end >= size or (log.next_frame() is not None and log.frame_offset == end):
+            return start
+        pos = start + 1
+
+def split_log(logfile, chunk_size=CHUNK_SIZE):
+    '''split a log into a list of (start, end) byte ranges of about
+    chunk_size bytes, each beginning at a frame boundary'''
+    size = os.path.getsize(logfile)
+    log = ublox.UBloxMmapLog(logfile)
+    bounds = []
+    for pos in range(0, size, chunk_size):
+        start = _sync(log, pos, size)
+        if start is None:
+            break
+        if bounds and start <= bounds[-1]:
+            # a single frame spans the whole chunk
+            continue
+        bounds.append(start)
+    log.close()
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def decode_range(logfile, start, end, types, parent_fields=['iTOW', 'week'], messages=False):
+    '''decode the frames of a log beginning in [start, end) into a
+    dictionary of arrays keyed by message type, as log_records() does
+    for a whole log. If messages is set, a tuple of dictionaries of
+    the repeated records and of the main fields of every type is
+    returned instead'''
+    log = ublox.UBloxMmapLog(logfile)
+    log.allow = set(types)
+    log.seek(start)
+    collector = arrays._LogArrays(types, parent_fields, messages)
+    while True:
+        frame = log.next_frame()
+        if frame is None or log.frame_offset >= end:
+            break
+        msg = ublox.UBloxMessage()
+        msg._buf = frame
+        collector.add(msg)
+    if messages:
+        ret = (collector.record_arrays(), collector.message_arrays())
+    else:
+        ret = collector.arrays()
+    log.close()
+    return ret
+
+def _decode_task(args):
+    '''pool wrapper for decode_range()'''
+    return decode_range(*args)
+
+def _merge(results, types):
+    '''join per-range dictionaries of arrays, keying them by message name'''
+    ret = {}
+    for t in types:
+        parts = [r[t] for r in results if t in r]
+        if parts:
+            ret[ublox.msg_types[t].name] = numpy.concatenate(parts)
+    return ret
+
+def parallel_log_records(logfile, types=None, parent_fields=['iTOW', 'week'],
+                         processes=None, chunk_size=CHUNK_SIZE, messages=False):
+    '''decode a log like arrays.log_records(), spreading the work over
+    processes worker processes (all CPUs by default). Returns a
+    dictionary of arrays keyed by message name, in file order.
+    Messages are decoded as logged, without the changes that
+    UBlox.special_handling() makes to configuration messages. With
+    messages set, returns a tuple of the record arrays and of the main
+    field arrays of every type'''
+    if types is None:
+        types = [t for t in ublox.msg_types if ublox.msg_types[t].format2 is not None]
+    types = list(types)
+    tasks = [(logfile, start, end, types, parent_fields, messages)
+             for (start, end) in split_log(logfile, chunk_size)]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(tasks))
+    if processes <= 1:
+        results = [_decode_task(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_decode_task, tasks, 1)
+        finally:
+            pool.close()
+            pool.join()
+
+    if messages:
+        return (_merge([r[0] for r in results], types), _merge([r[1] for r in results], types))
+    return _merge(results, types)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+'''
+Event reactor for servicing several UBlox devices from one thread
+
+Each device's file descriptor is watched with epoll (or select where
+epoll is not available) and its messages are passed to a handler as
+soon as they arrive, so a quiet receiver doesn't delay the others.
+
+Released under GNU GPL version 3 or later
+'''
+
+import select, time
+import ublox
+
+class _ReactorDevice:
+    '''a device registered with a UBloxReactor'''
+    def __init__(self, dev, handler, idle_timeout, idle_handler):
+        self.dev = dev
+        self.handler = handler
+        self.idle_timeout = idle_timeout
+        self.idle_handler = idle_handler
+        # logs are always ready to read, so aren't polled
+        if dev.read_only:
+            self.fd = None
+        else:
+            self.fd = dev.fileno()
+        self.active = True
+        self.last_message = time.time()
+
+class UBloxReactor:
+    '''multiplex any number of UBlox devices
+
+    add() registers a device with a handler, which is called as
+    handler(msg) for each message received. The default handler is
+    the device's own dispatch(), which passes the message to the
+    handlers subscribed to its type. If idle_timeout is given
+    and no message arrives for that many seconds, idle_handler(dev) is
+    called, for example to re-open the device. A device that reaches
+    end of file or fails stops being read but stays registered until
+    remove() is called, so its idle_handler still runs.
+    '''
+    def __init__(self):
+        self.devices = {}
+        self._running = False
+        if hasattr(select, 'epoll'):
+            self._epoll = select.epoll()
+        else:
+            self._epoll = None
+
+    def add(self, dev, handler=None, idle_timeout=None, idle_handler=None):
+        '''start servicing a device'''
+        if handler is None:
+            handler = dev.dispatch
+        d = _ReactorDevice(dev, handler, idle_timeout, idle_handler)
+        self.devices[dev] = d
+        if self._epoll is not None and d.fd is not None:
+            self._epoll.register(d.fd, select.EPOLLIN)
+        # anything already buffered by earlier blocking reads
+        self._dispatch(d)
+
+    def remove(self, dev):
+        '''stop servicing a device'''
+        d = self.devices.pop(dev, None)
+        if d is not None:
+            self._deactivate(d)
+
+    def _deactivate(self, d):
+        '''stop reading from a device'''
+        if d.active and self._epoll is not None and d.fd is not None:
+            try:
+                self._epoll.unregister(d.fd)
+            except (IOError, OSError, ValueError):
+                pass
+        d.active = False
+
+    def _dispatch(self, d, limit=None):
+        '''pass complete buffered messages of a device to its handler,
+        up to limit messages. Returns the number of messages'''
+        count = 0
+        while d.dev in self.devices and (limit is None or count < limit):
+            try:
+                msg = d.dev.next_buffered_message()
+                if msg is None:
+                    break
+                count += 1
+                d.last_message = time.time()
+                d.handler(msg)
+            except ublox.UBloxError as e:
+                print(e)
+        return count
+
+    def _service(self, d):
+        '''read from a device that is ready. Logs are replayed a
+        message at a time in turn, as the receivers they were recorded
+        from would have sent them'''
+        limit = None
+        if d.fd is None:
+            limit = 1
+            if self._dispatch(d, limit):
+                return
+        try:
+            data = d.dev.read_available()
+        except Exception as e:
+            # serial exceptions don't share a common base with OSError
+            print(e)
+            data = None
+        if not data:
+            self._deactivate(d)
+            return
+        d.dev.feed(data)
+        self._dispatch(d, limit)
+
+    def _wait(self, timeout):
+        '''return the devices ready to read'''
+        active = [d for d in self.devices.values() if d.active]
+        ready = [d for d in active if d.fd is None]
+        if ready:
+            timeout = 0
+        fds = dict([(d.fd, d) for d in active if d.fd is not None])
+        if self._epoll is not None:
+            if not fds:
+                time.sleep(timeout)
+                return ready
+            try:
+                events = self._epoll.poll(timeout)
+            except (IOError, OSError):
+                # interrupted by a signal
+                return ready
+            return ready + [fds[fd] for (fd, mask) in events if fd in fds]
+        if not fds:
+            time.sleep(timeout)
+            return ready
+        try:
+            (rin, win, xin) = select.select(list(fds.keys()), [], [], timeout)
+        except (IOError, OSError, select.error):
+            return ready
+        return ready + [fds[fd] for fd in rin]
+
+    def _check_idle(self):
+        '''call the idle handler of any device that has gone quiet,
+        returning the time until the next idle check is due'''
+        now = time.time()
+        next_check = None
+        for d in list(self.devices.values()):
+            if d.idle_timeout is None:
+                continue
+            remaining = d.last_message + d.idle_timeout - now
+            if remaining <= 0:
+                d.last_message = now
+                if d.idle_handler is not None:
+                    d.idle_handler(d.dev)
+                remaining = d.idle_timeout
+            if next_check is None or remaining < next_check:
+                next_check = remaining
+        return next_check
+
+    def run_once(self, timeout=1.0):
+        '''wait up to timeout seconds for data and dispatch any messages'''
+        next_check = self._check_idle()
+        if next_check is not None:
+            timeout = min(timeout, max(next_check, 0))
+        for d in self._wait(timeout):
+            if d.dev in self.devices and d.active:
+                self._service(d)
+
+    def run(self, timeout=None):
+        '''service the devices until stop() is called, all devices are
+        removed or have finished, or for timeout seconds'''
+        self._running = True
+        start = time.time()
+        while self._running and self.devices:
+            if not any(d.active or d.idle_handler is not None for d in self.devices.values()):
+                break
+            wait = 1.0
+            if timeout is not None:
+                wait = start + timeout - time.time()
+                if wait <= 0:
+                    break
+                wait = min(wait, 1.0)
+            self.run_once(wait)
+        self._running = False
+
+    def stop(self):
+        '''make run() return'''
+        self._running = False
+
+    def close(self):
+        '''release the poller'''
+        if self._epoll is not None:
+            self._epoll.close()
+            self._epoll = None
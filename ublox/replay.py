@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+'''
+Replay a UBlox log as if it came from a live receiver
+
+The frames of a log are written to TCP clients and/or a pseudo
+terminal, paced by the iTOW of the messages at real time, a multiple
+of it, or as fast as possible. CFG messages sent by the clients are
+answered with ACK_ACK, so configuration code runs unchanged against a
+replay.
+
+Released under GNU GPL version 3 or later
+'''
+
+import struct
+import ublox
+from .server import UBloxServer
+
+# the most frames sent before servicing the clients again
+_MAX_BURST = 256
+
+class UBloxReplayer(UBloxServer):
+    '''serve the frames of a log to TCP clients and/or a pty
+
+    speed is the replay rate relative to real time, with 0 meaning as
+    fast as the outputs will take the data. The schedule is anchored
+    to the first iTOW of the log and follows the latest iTOW seen, so
+    frames stamped slightly earlier than the ones before them, such as
+    RXM_RAW after the NAV messages, are sent straight after them. A
+    jump of more than max_gap seconds in iTOW either way restarts the
+    timing rather than pausing. With loop set the log is replayed
+    continuously. With ack set, CFG messages received from the clients
+    are acknowledged.
+    '''
+    def __init__(self, logfile, speed=1.0, loop=False, ack=True, max_gap=10.0):
+        UBloxServer.__init__(self)
+        self.logfile = logfile
+        self.speed = speed
+        self.loop = loop
+        self.ack = ack
+        self.max_gap = max_gap
+        self.log = ublox.UBloxMmapLog(logfile)
+        self.messages = 0
+        self.bytes = 0
+        self.loops = 0
+        # the latest any frame was sent after it was due, in seconds
+        self.max_late = 0
+        self._next = None
+        self._t0 = None
+        self._itow0 = None
+        self._latest_itow = None
+        self._last_due = None
+        # where to find the iTOW in each message type
+        self._itow_layout = {}
+        for t in ublox.msg_types:
+            layout = ublox.msg_types[t]._field_layout.get('iTOW', None)
+            if layout is not None and layout[2] == -1:
+                self._itow_layout[t] = layout
+
+    def _itow(self, frame):
+        '''return the iTOW of a frame in seconds, or None'''
+        (msg_class, msg_id) = struct.unpack_from('<BB', frame, 2)
+        layout = self._itow_layout.get((msg_class, msg_id), None)
+        if layout is None or layout[3] > len(frame) - 2:
+            return None
+        return layout[0].unpack_from(frame, layout[1])[0] * 0.001
+
+    def _next_frame(self, now):
+        '''return (due, frame) for the next frame of the log, or None at
+        the end of the log'''
+        frame = self.log.next_frame()
+        if frame is None and self.loop:
+            self.log.seek(0)
+            self.loops += 1
+            self._latest_itow = None
+            frame = self.log.next_frame()
+        if frame is None:
+            return None
+        if self.speed <= 0:
+            return (now, frame)
+        itow = self._itow(frame)
+        if itow is None:
+            # sent along with the timed frame before it
+            if self._last_due is None:
+                return (now, frame)
+            return (self._last_due, frame)
+        if (self._latest_itow is None or abs(itow - self._latest_itow) > self.max_gap):
+            # restart the timing from here
+            self._t0 = now if self._last_due is None else max(now, self._last_due)
+            self._itow0 = itow
+            self._latest_itow = itow
+        self._latest_itow = max(self._latest_itow, itow)
+        self._last_due = self._t0 + (self._latest_itow - self._itow0) / self.speed
+        return (self._last_due, frame)
+
+    def handle_frame(self, out, msg_class, msg_id, frame):
+        '''acknowledge CFG messages from the clients'''
+        if self.ack and msg_class == ublox.CLASS_CFG and msg_id != ublox.MSG_CFG_RST:
+            self.reply(out, ublox.UBlox.pack_message(ublox.CLASS_ACK, ublox.MSG_ACK_ACK,
+                                                     struct.pack('<BB', msg_class, msg_id)))
+
+    def service(self, now):
+        '''send the frames that are due'''
+        for burst in range(_MAX_BURST):
+            if self.speed <= 0 and self.backlogged():
+                # as fast as possible is as fast as the outputs drain
+                return 0.1
+            if self._next is None:
+                self._next = self._next_frame(now)
+                if self._next is None:
+                    return None
+            (due, frame) = self._next
+            if due > now:
+                return due - now
+            self.max_late = max(self.max_late, now - due)
+            frame = bytes(frame)
+            self.broadcast(frame)
+            self.messages += 1
+            self.bytes += len(frame)
+            self._next = None
+        # let the clients be heard
+        return 0
+
+    def run(self, duration=None, wait=True):
+        '''replay until the end of the log, or for duration seconds. With
+        wait set and no pty, the replay starts when the first TCP client
+        connects'''
+        UBloxServer.run(self, duration, wait)
+
+    def close(self):
+        '''close the log and all outputs'''
+        UBloxServer.close(self)
+        self.log.close()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+'''
+Serve UBX data to clients over TCP and/or a pseudo terminal
+
+UBloxServer keeps the client connections of the log replayer and the
+simulated receiver. Subclasses produce output from service() and
+answer the frames clients send in handle_frame().
+
+Released under GNU GPL version 3 or later
+'''
+
+import os, select, socket, struct, time, errno, fcntl
+import ublox
+
+# errors meaning a non-blocking read or write would have blocked
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+def _set_nonblocking(fd):
+    '''make a file descriptor non-blocking'''
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+class _Output:
+    '''a connection being fed with data. Data that can't be written
+    straight away is kept, up to max_backlog bytes, after which it is
+    dropped as a receiver would drop output nobody reads'''
+    def __init__(self, fd, sock=None, max_backlog=1<<20):
+        self.fd = fd
+        self.sock = sock
+        self.max_backlog = max_backlog
+        self.pending = bytearray()
+        self.framer = ublox.UBloxFramer()
+        self.dropped = 0
+
+    def write(self, data):
+        '''queue some bytes'''
+        if len(self.pending) + len(data) > self.max_backlog:
+            self.dropped += len(self.pending)
+            self.pending = bytearray()
+        self.pending.extend(data)
+        self.flush()
+
+    def flush(self):
+        '''write as much as possible without blocking'''
+        if not self.pending:
+            return
+        try:
+            if self.sock is not None:
+                n = self.sock.send(self.pending)
+            else:
+                n = os.write(self.fd, self.pending)
+        except (IOError, OSError) as e:
+            if e.errno in _WOULD_BLOCK:
+                return
+            raise
+        del self.pending[:n]
+
+    def read(self):
+        '''read what the client has sent, returning an empty string when
+        it has gone away'''
+        try:
+            if self.sock is not None:
+                return self.sock.recv(4096)
+            return os.read(self.fd, 4096)
+        except (IOError, OSError) as e:
+            if e.errno in _WOULD_BLOCK:
+                return None
+            return b''
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        else:
+            os.close(self.fd)
+
+class UBloxServer:
+    '''the client side of a UBX server: a TCP listener and/or a pty,
+    with a select loop that calls service() for output and
+    handle_frame() for each frame a client sends'''
+    def __init__(self):
+        self.outputs = []
+        self.listener = None
+        self.pty_name = None
+        self._pty_slave = None
+        self._running = False
+
+    def listen_tcp(self, port, host=''):
+        '''accept TCP clients on a port, returning the port number'''
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(5)
+        return self.listener.getsockname()[1]
+
+    def open_pty(self):
+        '''create a pseudo terminal to serve, returning the name of the
+        device for the client to open'''
+        import pty, tty
+        (master, slave) = pty.openpty()
+        # the data is binary, so no line processing or echo
+        tty.setraw(slave)
+        tty.setraw(master)
+        _set_nonblocking(master)
+        self.pty_name = os.ttyname(slave)
+        # holding the slave open keeps the pty usable while clients
+        # come and go
+        self._pty_slave = slave
+        self.outputs.append(_Output(master))
+        return self.pty_name
+
+    def _accept(self):
+        '''accept a new TCP client'''
+        (sock, addr) = self.listener.accept()
+        sock.setblocking(0)
+        sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+        self.outputs.append(_Output(sock.fileno(), sock))
+
+    def _drop(self, out):
+        '''forget a client that has gone away'''
+        self.outputs.remove(out)
+        out.close()
+
+    def _client_input(self, out):
+        '''read from a client and pass on the frames it has sent'''
+        data = out.read()
+        if data is None:
+            return
+        if not data:
+            if out.sock is not None:
+                self._drop(out)
+            return
+        out.framer.feed(data)
+        for frame in out.framer.frames():
+            (msg_class, msg_id) = struct.unpack_from('<BB', frame, 2)
+            self.handle_frame(out, msg_class, msg_id, frame)
+
+    def handle_frame(self, out, msg_class, msg_id, frame):
+        '''called for each frame received from the client out'''
+        pass
+
+    def reply(self, out, msg):
+        '''send a message to one client'''
+        try:
+            out.write(msg._buf)
+        except (IOError, OSError):
+            if out.sock is not None:
+                self._drop(out)
+
+    def broadcast(self, data):
+        '''write bytes to every client'''
+        for out in list(self.outputs):
+            try:
+                out.write(data)
+            except (IOError, OSError):
+                if out.sock is not None:
+                    self._drop(out)
+
+    def clients(self):
+        '''return the number of connected TCP clients'''
+        return len([out for out in self.outputs if out.sock is not None])
+
+    def backlogged(self):
+        '''return True if any client has output waiting'''
+        return any(out.pending for out in self.outputs)
+
+    def service(self, now):
+        '''produce output due by now. Returns the seconds until more is
+        due, or None when there will be no more output'''
+        return None
+
+    def run(self, duration=None, wait=True):
+        '''serve clients until service() finishes, or for duration
+        seconds. With wait set and no pty, output starts when the first
+        TCP client connects'''
+        self._running = True
+        finished = False
+        start = time.time()
+        while self._running:
+            now = time.time()
+            if duration is not None and now - start >= duration:
+                break
+            timeout = 0.1
+            if not finished and (not wait or self.pty_name is not None or self.clients() > 0):
+                due = self.service(now)
+                if due is None:
+                    finished = True
+                else:
+                    timeout = min(timeout, due)
+            rlist = [out.fd for out in self.outputs]
+            if self.listener is not None:
+                rlist.append(self.listener.fileno())
+            wlist = [out.fd for out in self.outputs if out.pending]
+            if finished and not wlist:
+                break
+            try:
+                (rin, win, xin) = select.select(rlist, wlist, [], max(timeout, 0))
+            except (IOError, OSError, select.error):
+                continue
+            for out in list(self.outputs):
+                if out.fd in rin:
+                    self._client_input(out)
+                if out in self.outputs and out.fd in win:
+                    try:
+                        out.flush()
+                    except (IOError, OSError):
+                        self._drop(out)
+            if self.listener is not None and self.listener.fileno() in rin:
+                self._accept()
+        self._running = False
+
+    def stop(self):
+        '''make run() return'''
+        self._running = False
+
+    def close(self):
+        '''close all outputs'''
+        for out in self.outputs:
+            out.close()
+        self.outputs = []
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        if self._pty_slave is not None:
+            os.close(self._pty_slave)
+            self._pty_slave = None
+            self.pty_name = None
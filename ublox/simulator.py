@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+'''
+A simulated UBlox receiver
+
+The simulator speaks UBX over TCP and/or a pseudo terminal. It keeps a
+configuration which CFG messages set and poll, answering with ACK_ACK
+or ACK_NACK, acknowledges MGA assistance with MGA_ACK when ack-aiding
+is enabled in CFG_NAVX5, and dumps the uploaded MGA_DBD database when
+polled. Synthetic NAV and RXM messages are output at the rates set
+with CFG_MSG and CFG_RATE, with a 3D fix appearing ttff seconds after
+a (re)start, or aided_ttff seconds with assistance:
+
+    sim = ublox.simulator.UBloxSimulator()
+    print(sim.open_pty())
+    sim.run()
+
+Released under GNU GPL version 3 or later
+'''
+
+import math, struct, time
+import ublox
+from .server import UBloxServer
+
+# seconds from the Unix epoch to the GPS epoch, and GPS-UTC
+GPS_EPOCH = 315964800
+LEAP_SECONDS = 18
+
+# message types output by the simulator
+OUTPUT_TYPES = [
+    (ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_STATUS),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_DOP),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_SOL),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_PVT),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_VELNED),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_VELECEF),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_TIMEGPS),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_TIMEUTC),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_CLOCK),
+    (ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO),
+    (ublox.CLASS_RXM, ublox.MSG_RXM_RAW),
+]
+
+# GPS L1 wavelength in metres
+L1_WAVELENGTH = 299792458.0 / 1575.42e6
+
+def build_message(msg_type, values={}, recs=[]):
+    '''return a UBloxMessage of a known type, taking field values from
+    the values dictionary and zero for fields it doesn't have. recs is
+    a list of dictionaries for the repeated records, which also sets
+    the count field'''
+    desc = ublox.msg_types[msg_type]
+    fields = {}
+    for f in desc.fields:
+        (name, alen) = ublox.ArrayParse(f)
+        if name in values:
+            fields[name] = values[name]
+            continue
+        s = desc._field_layout[name][0]
+        zero = s.unpack(b'\0' * s.size)
+        fields[name] = list(zero) if alen != -1 else zero[0]
+    records = []
+    if desc.format2 is not None:
+        zero = dict(zip(desc.fields2, desc._struct2.unpack(b'\0' * desc._struct2.size)))
+        for r in recs:
+            rec = dict(zero)
+            rec.update(r)
+            records.append(rec)
+        if desc.count_field != '_remaining':
+            fields[desc.count_field] = len(records)
+    msg = ublox.UBloxMessage()
+    msg._fields = fields
+    msg._recs = records
+    msg._unpacked = True
+    desc.pack(msg, msg_type[0], msg_type[1])
+    return msg
+
+def _payload(msg_type, values):
+    '''return the payload of a message built by build_message()'''
+    return bytes(build_message(msg_type, values)._buf[6:-2])
+
+def _field(msg_type, payload, name):
+    '''return one field of a payload'''
+    (s, ofs, alen, end) = ublox.msg_types[msg_type]._field_layout[name]
+    return s.unpack_from(payload, ofs - 6)[0]
+
+def _ecef(lat, lon, alt):
+    '''convert WGS84 lat/lon/alt in degrees and metres to ECEF metres'''
+    a = 6378137.0
+    e2 = 6.69437999014e-3
+    lat = math.radians(lat)
+    lon = math.radians(lon)
+    n = a / math.sqrt(1.0 - e2 * math.sin(lat)**2)
+    return ((n + alt) * math.cos(lat) * math.cos(lon),
+            (n + alt) * math.cos(lat) * math.sin(lon),
+            (n * (1 - e2) + alt) * math.sin(lat))
+
+class UBloxSimulator(UBloxServer):
+    '''a simulated receiver serving TCP clients and/or a pty
+
+    position is the (lat, lon, alt) reported once there is a fix, with
+    num_sv satellites. Output is on port (the port whose CFG_MSG rate
+    applies), every rate_ms until changed with CFG_RATE. rates maps
+    message types to their initial output rates. A fix appears ttff
+    seconds after a start without assistance, or aided_ttff seconds
+    after one with MGA time and position, MGA ephemeris or a hot
+    start. Replies are sent reply_delay seconds after the message
+    they answer, to model the receiver's processing time.
+
+    CFG messages replace the stored configuration whole, their masks
+    are not interpreted.
+    '''
+    def __init__(self, position=(-35.3632621, 149.1652374, 584.0), num_sv=10, rate_ms=1000,
+                 rates={}, ttff=30.0, aided_ttff=5.0, port=ublox.PORT_SERIAL1, baudrate=115200,
+                 reply_delay=0.0, sw_version='ROM CORE 3.01 (107888)', hw_version='00080000'):
+        UBloxServer.__init__(self)
+        self.position = position
+        self.num_sv = num_sv
+        self.ttff = ttff
+        self.aided_ttff = aided_ttff
+        self.port = port
+        self.baudrate = baudrate
+        self.reply_delay = reply_delay
+        self.sw_version = sw_version
+        self.hw_version = hw_version
+        self.default_config = self._default_config(rate_ms, rates)
+        self.saved_config = self.default_config
+        self._set_config(self.default_config)
+        # uploaded MGA_DBD frames, dumped back when polled
+        self.database = []
+        self.epochs = 0
+        self.received = 0
+        self.acks = 0
+        self.nacks = 0
+        self.mga_acks = 0
+        self.resets = 0
+        self._replies = []
+        self._next_epoch = None
+        self._restart(time.time(), hot=False)
+
+    def _default_config(self, rate_ms, rates):
+        '''return the configuration after a cold start: a dictionary of
+        payloads keyed by CFG message type, CFG_PRT also keyed by port,
+        and the CFG_MSG rates keyed by message type'''
+        config = {}
+        config[(ublox.CLASS_CFG, ublox.MSG_CFG_RATE)] = _payload(
+            (ublox.CLASS_CFG, ublox.MSG_CFG_RATE), {'measRate': rate_ms, 'navRate': 1, 'timeRef': 1})
+        config[(ublox.CLASS_CFG, ublox.MSG_CFG_NAV5)] = _payload(
+            (ublox.CLASS_CFG, ublox.MSG_CFG_NAV5),
+            {'mask': 0xffff, 'dynModel': ublox.DYNAMIC_MODEL_PORTABLE, 'fixMode': 3,
+             'fixedAltVar': 10000, 'minElev': 5, 'pDop': 250, 'tDop': 250, 'pAcc': 100,
+             'tAcc': 300, 'dgpsTimeOut': 60})
+        config[(ublox.CLASS_CFG, ublox.MSG_CFG_NAVX5)] = _payload(
+            (ublox.CLASS_CFG, ublox.MSG_CFG_NAVX5),
+            {'minSVs': 3, 'maxSVs': 16, 'minCNO': 6, 'wknRollover': 1867, 'aopOrbMaxErr': 100})
+        for port in [ublox.PORT_DDC, ublox.PORT_SERIAL1, ublox.PORT_SERIAL2, ublox.PORT_USB, ublox.PORT_SPI]:
+            values = {'portID': port, 'inProtoMask': 7, 'outProtoMask': 3}
+            if port in [ublox.PORT_SERIAL1, ublox.PORT_SERIAL2]:
+                values['mode'] = 0x8d0
+                values['baudRate'] = self.baudrate
+            config[(ublox.CLASS_CFG, ublox.MSG_CFG_PRT, port)] = _payload(
+                (ublox.CLASS_CFG, ublox.MSG_CFG_PRT), values)
+        msg_rates = {}
+        for t in rates:
+            msg_rates[tuple(t)] = [rates[t]] * 6
+        return (config, msg_rates)
+
+    def _set_config(self, config):
+        '''make a copy of a configuration current'''
+        self.config = dict(config[0])
+        self.rates = dict([(t, list(r)) for (t, r) in config[1].items()])
+
+    def _get_config(self):
+        '''return a copy of the current configuration'''
+        return (dict(self.config), dict([(t, list(r)) for (t, r) in self.rates.items()]))
+
+    def _restart(self, now, hot):
+        '''start navigating from scratch. A hot start keeps the
+        assistance and last fix, anything else loses them'''
+        self._start = now
+        self._fix_time = None
+        if not hot:
+            self.time_aided = False
+            self.position_aided = False
+            self.orbits_aided = False
+
+    def ack_aiding(self):
+        '''return True if MGA messages are acknowledged'''
+        msg_type = (ublox.CLASS_CFG, ublox.MSG_CFG_NAVX5)
+        return _field(msg_type, self.config[msg_type], 'ackAiding') != 0
+
+    def meas_rate(self):
+        '''return the measurement period in seconds'''
+        msg_type = (ublox.CLASS_CFG, ublox.MSG_CFG_RATE)
+        return _field(msg_type, self.config[msg_type], 'measRate') * 0.001
+
+    def have_fix(self, now):
+        '''return True if the receiver has a fix at time now'''
+        if self._fix_time is not None:
+            return True
+        aided = self.orbits_aided or (self.time_aided and self.position_aided)
+        if now - self._start >= (self.aided_ttff if aided else self.ttff):
+            self._fix_time = now
+            # a hot start keeps what was needed for this fix
+            self.orbits_aided = True
+            return True
+        return False
+
+    def _respond(self, out, msg):
+        '''send a reply to a client after the reply delay'''
+        if self.reply_delay <= 0:
+            self.reply(out, msg)
+        else:
+            self._replies.append((time.time() + self.reply_delay, out, msg))
+
+    def _ack(self, out, msg_class, msg_id, ok=True):
+        '''acknowledge a CFG message'''
+        if ok:
+            self.acks += 1
+        else:
+            self.nacks += 1
+        self._respond(out, ublox.UBlox.pack_message(ublox.CLASS_ACK,
+                                                    ublox.MSG_ACK_ACK if ok else ublox.MSG_ACK_NACK,
+                                                    struct.pack('<BB', msg_class, msg_id)))
+
+    def handle_frame(self, out, msg_class, msg_id, frame):
+        '''answer a message from a client'''
+        self.received += 1
+        payload = bytes(bytearray(frame[6:-2]))
+        if msg_class == ublox.CLASS_CFG:
+            self._handle_cfg(out, msg_id, payload)
+        elif msg_class == ublox.CLASS_MGA:
+            self._handle_mga(out, msg_id, payload, frame)
+        elif (msg_class, msg_id) == (ublox.CLASS_MON, ublox.MSG_MON_VER) and not payload:
+            self._respond(out, build_message((ublox.CLASS_MON, ublox.MSG_MON_VER),
+                                             {'swVersion': self.sw_version.encode('ascii'),
+                                              'hwVersion': self.hw_version.encode('ascii')}))
+
+    def _handle_cfg(self, out, msg_id, payload):
+        '''apply or answer a poll of a CFG message'''
+        msg_type = (ublox.CLASS_CFG, msg_id)
+        n = len(payload)
+        if msg_id == ublox.MSG_CFG_RST:
+            # not acknowledged
+            if n == 4:
+                (navBbrMask, resetMode) = struct.unpack_from('<HB', payload)
+                self.resets += 1
+                if resetMode in [ublox.RESET_HW, ublox.RESET_HW_GRACEFUL]:
+                    # the configuration in RAM is lost
+                    self._set_config(self.saved_config)
+                self._restart(time.time(), hot=(navBbrMask == ublox.RESET_HOT))
+            return
+        if msg_id == ublox.MSG_CFG_MSG:
+            if n == 2:
+                t = struct.unpack('<BB', payload)
+                rates = self.rates.get(t, [0] * 6)
+                self._respond(out, ublox.UBlox.pack_message(ublox.CLASS_CFG, ublox.MSG_CFG_MSG,
+                                                            payload + struct.pack('<6B', *rates)))
+            elif n == 3:
+                (c, i, rate) = struct.unpack('<BBB', payload)
+                self.rates.setdefault((c, i), [0] * 6)[self.port] = rate
+            elif n == 8:
+                v = struct.unpack('<BB6B', payload)
+                self.rates[(v[0], v[1])] = list(v[2:])
+            else:
+                self._ack(out, ublox.CLASS_CFG, msg_id, False)
+                return
+            self._ack(out, ublox.CLASS_CFG, msg_id)
+            return
+        if msg_id == ublox.MSG_CFG_PRT and n <= 1:
+            port = struct.unpack('<B', payload)[0] if n else self.port
+            key = msg_type + (port,)
+            if not key in self.config:
+                self._ack(out, ublox.CLASS_CFG, msg_id, False)
+                return
+            self._respond(out, ublox.UBlox.pack_message(ublox.CLASS_CFG, msg_id, self.config[key]))
+            self._ack(out, ublox.CLASS_CFG, msg_id)
+            return
+        if msg_id == ublox.MSG_CFG_CFG and n in [12, 13]:
+            (clearMask, saveMask, loadMask) = struct.unpack_from('<III', payload)
+            if clearMask:
+                self.saved_config = self.default_config
+            if saveMask:
+                self.saved_config = self._get_config()
+            if loadMask:
+                self._set_config(self.saved_config)
+            self._ack(out, ublox.CLASS_CFG, msg_id)
+            return
+        if n == 0:
+            # a poll
+            if not msg_type in self.config:
+                self._ack(out, ublox.CLASS_CFG, msg_id, False)
+                return
+            self._respond(out, ublox.UBlox.pack_message(ublox.CLASS_CFG, msg_id, self.config[msg_type]))
+            self._ack(out, ublox.CLASS_CFG, msg_id)
+            return
+        desc = ublox.msg_types.get(msg_type, None)
+        if desc is not None and desc.format2 is None and not n in [desc._pack_full.size, desc._pack_short.size]:
+            self._ack(out, ublox.CLASS_CFG, msg_id, False)
+            return
+        if msg_id == ublox.MSG_CFG_PRT:
+            msg_type += (struct.unpack_from('<B', payload)[0],)
+        elif msg_id == ublox.MSG_CFG_RATE and (_field(msg_type, payload, 'measRate') < 25 or
+                                                 _field(msg_type, payload, 'navRate') == 0):
+            self._ack(out, ublox.CLASS_CFG, msg_id, False)
+            return
+        self.config[msg_type] = payload
+        self._ack(out, ublox.CLASS_CFG, msg_id)
+
+    def _handle_mga(self, out, msg_id, payload, frame):
+        '''take assistance data, or dump the database when polled'''
+        if msg_id == ublox.MSG_MGA_DBD and not payload:
+            for f in self.database:
+                self._respond(out, ublox.UBlox.pack_message(ublox.CLASS_MGA, ublox.MSG_MGA_DBD, f))
+            self._respond(out, build_message((ublox.CLASS_MGA, ublox.MSG_MGA_ACK),
+                                             {'type': 1, 'msgId': msg_id,
+                                              'msgPayloadStart': list(bytearray(struct.pack('<I', len(self.database))))}))
+            return
+        if msg_id == ublox.MSG_MGA_INI_TIME_UTC and payload:
+            ini_type = struct.unpack_from('<B', payload)[0]
+            if ini_type == ublox.MSG_MGA_INI_TYPE_TIME_UTC:
+                self.time_aided = True
+            elif ini_type == ublox.MSG_MGA_INI_TYPE_POS_LLH:
+                self.position_aided = True
+        elif msg_id == ublox.MSG_MGA_DBD:
+            self.database.append(payload)
+            self.orbits_aided = True
+        else:
+            self.orbits_aided = True
+        if self.ack_aiding():
+            self.mga_acks += 1
+            start = bytearray(payload[:4].ljust(4, b'\0'))
+            self._respond(out, build_message((ublox.CLASS_MGA, ublox.MSG_MGA_ACK),
+                                             {'type': 1, 'msgId': msg_id,
+                                              'msgPayloadStart': list(start)}))
+
+    def solution(self, now):
+        '''return the field values of the navigation solution at time
+        now, named as in the NAV messages'''
+        gps = now - GPS_EPOCH + LEAP_SECONDS
+        week = int(gps // 604800)
+        itow = int(round((gps - week * 604800) * 1000))
+        utc = time.gmtime(now)
+        fix = self.have_fix(now)
+        v = {'iTOW': itow, 'week': week, 'fTOW': 0, 'leapS': LEAP_SECONDS,
+             'year': utc.tm_year, 'month': utc.tm_mon, 'day': utc.tm_mday,
+             'hour': utc.tm_hour, 'min': utc.tm_min, 'sec': utc.tm_sec,
+             'nano': 0, 'tAcc': 30, 'fAcc': 100, 'msss': int((now - self._start) * 1000)}
+        if not fix:
+            v.update({'valid': 0, 'hAcc': 0xffffffff, 'vAcc': 0xffffffff, 'pAcc': 0xffffffff,
+                      'sAcc': 0xffffffff, 'pDOP': 9999})
+            return v
+        (lat, lon, alt) = self.position
+        (x, y, z) = _ecef(lat, lon, alt)
+        v.update({'gpsFix': 3, 'fixType': 3, 'valid': 0x07, 'numSV': self.num_sv,
+                  'flags': 0x0d, 'fixStat': 0, 'flags2': 0,
+                  'ttff': int((self._fix_time - self._start) * 1000),
+                  'lat': int(round(lat * 1e7)), 'lon': int(round(lon * 1e7)),
+                  'Latitude': int(round(lat * 1e7)), 'Longitude': int(round(lon * 1e7)),
+                  'height': int(round(alt * 1000)), 'hMSL': int(round(alt * 1000)),
+                  'hAcc': 2500, 'vAcc': 4000, 'sAcc': 100, 'pAcc': 300,
+                  'ecefX': int(round(x * 100)), 'ecefY': int(round(y * 100)), 'ecefZ': int(round(z * 100)),
+                  'gDOP': 180, 'pDOP': 150, 'tDOP': 90, 'vDOP': 120, 'hDOP': 90, 'nDOP': 70, 'eDOP': 60})
+        return v
+
+    def records(self, msg_type, now):
+        '''return the repeated records of an output message'''
+        if self._fix_time is None:
+            return []
+        if msg_type == (ublox.CLASS_RXM, ublox.MSG_RXM_RAW):
+            ret = []
+            for sv in range(1, self.num_sv + 1):
+                pr = 2.0e7 + sv * 1.0e5
+                ret.append({'prMes': pr, 'cpMes': pr / L1_WAVELENGTH, 'doMes': 0.0,
+                            'sv': sv, 'mesQI': 7, 'cno': 40, 'lli': 0})
+            return ret
+        if msg_type == (ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO):
+            return [{'chn': i, 'svid': sv, 'flags': 0x0d, 'quality': 7, 'cno': 40,
+                     'elev': 45, 'azim': (sv * 36) % 360, 'prRes': 0}
+                    for (i, sv) in enumerate(range(1, self.num_sv + 1))]
+        return []
+
+    def _epoch(self, now):
+        '''output the messages due at a navigation epoch'''
+        self.epochs += 1
+        v = None
+        for msg_type in OUTPUT_TYPES:
+            rates = self.rates.get(msg_type, None)
+            if rates is None or rates[self.port] == 0 or self.epochs % rates[self.port] != 0:
+                continue
+            if v is None:
+                v = self.solution(now)
+            self.broadcast(build_message(msg_type, v, self.records(msg_type, now))._buf)
+
+    def service(self, now):
+        '''send due replies and run the navigation epochs'''
+        while self._replies and self._replies[0][0] <= now:
+            (due, out, msg) = self._replies.pop(0)
+            if out in self.outputs:
+                self.reply(out, msg)
+        period = self.meas_rate()
+        if self._next_epoch is None or now - self._next_epoch > 1:
+            # epochs fall on whole multiples of the measurement period
+            self._next_epoch = math.ceil(now / period) * period
+        if now >= self._next_epoch:
+            self._epoch(self._next_epoch)
+            self._next_epoch += period
+        wait = self._next_epoch - now
+        if self._replies:
+            wait = min(wait, self._replies[0][0] - now)
+        return max(wait, 0)
+
+    def run(self, duration=None, wait=False):
+        '''run the receiver, for duration seconds if given. With wait
+        set and no pty, output starts when the first TCP client
+        connects'''
+        UBloxServer.run(self, duration, wait)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+import ublox, ublox.benchmark, sys
+
+from optparse import OptionParser
+
+parser = OptionParser("ublox_bench.py [options] [file...]")
+parser.add_option("--repeat", type='int', default=3, help="runs of each benchmark, the fastest is kept")
+parser.add_option("--output", default=None, help="save the results as JSON")
+parser.add_option("--compare", default=None, help="JSON results of an earlier run to check for regressions")
+parser.add_option("--threshold", type='float', default=0.1, help="slowdown counted as a regression")
+parser.add_option("--no-corrupt", action='store_true', default=False, help="skip the corrupted logs")
+
+(opts, args) = parser.parse_args()
+
+logs = args
+if not logs:
+    logs = ublox.benchmark.bundled_logs()
+if not logs:
+    print("No logs to benchmark")
+    sys.exit(1)
+
+corruptions = [] if opts.no_corrupt else ublox.benchmark.CORRUPTIONS
+results = ublox.benchmark.run_benchmarks(logs, repeat=opts.repeat, corruptions=corruptions)
+print(ublox.benchmark.format_results(results))
+if opts.output is not None:
+    ublox.benchmark.save_results(results, opts.output)
+
+if opts.compare is not None:
+    old = ublox.benchmark.load_results(opts.compare)
+    if old['python'] != results['python']:
+        print("Warning: comparing python %s results with python %s" % (old['python'], results['python']))
+    regressions = ublox.benchmark.compare_results(old, results, opts.threshold)
+    for (log, name, a, b) in regressions:
+        print("REGRESSION %s %s: %.0f -> %.0f msgs/s" % (log, name, a, b))
+    if regressions:
+        sys.exit(2)
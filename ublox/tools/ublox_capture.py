@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-import ublox, sys
+import ublox, ublox.logwriter, sys
 
 from optparse import OptionParser
 
@@ -15,15 +15,17 @@ parser.add_option("--show", action='store_true', default=False, help='show messa
 parser.add_option("--dynModel", type='int', default=None, help='set dynamic navigation model')
 parser.add_option("--usePPP", action='store_true', default=None, help='enable precise point positioning')
 parser.add_option("--dots", action='store_true', default=False, help='print a dot on each message')
+ublox.logwriter.add_options(parser)
 
 
 (opts, args) = parser.parse_args()
+
 if len(args):
     print("ublox_capture.py has no positional arguments")
     sys.exit(1)
 
 dev = ublox.UBlox(opts.port, baudrate=opts.baudrate, timeout=2)
-dev.set_logfile(opts.log, append=opts.append)
+dev.set_logfile(opts.log, append=opts.append, **ublox.logwriter.writer_options(opts))
 dev.set_binary()
 dev.configure_poll_port()
 dev.configure_poll(ublox.CLASS_CFG, ublox.MSG_CFG_USB)
@@ -35,26 +37,29 @@ dev.configure_poll_port()
 dev.configure_poll_port(ublox.PORT_SERIAL1)
 dev.configure_poll_port(ublox.PORT_SERIAL2)
 dev.configure_poll_port(ublox.PORT_USB)
-dev.configure_solution_rate(rate_ms=1000)
+with dev.transaction() as t:
+    dev.configure_solution_rate(rate_ms=1000)
 
-dev.set_preferred_dynamic_model(opts.dynModel)
-dev.set_preferred_usePPP(opts.usePPP)
+    dev.set_preferred_dynamic_model(opts.dynModel)
+    dev.set_preferred_usePPP(opts.usePPP)
 
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH, 1)
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_STATUS, 1)
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELNED, 1)
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO, 1)
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELECEF, 1)
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF, 1)
-dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_RAW, 1)
-dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SFRB, 1)
-dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SVSI, 1)
-dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_ALM, 1)
-dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_EPH, 1)
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_TIMEGPS, 5)
-dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_CLOCK, 5)
-#dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_DGPS, 5)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSLLH, 1)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_STATUS, 1)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELNED, 1)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SVINFO, 1)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_VELECEF, 1)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_POSECEF, 1)
+    dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_RAW, 1)
+    dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SFRB, 1)
+    dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_SVSI, 1)
+    dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_ALM, 1)
+    dev.configure_message_rate(ublox.CLASS_RXM, ublox.MSG_RXM_EPH, 1)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_TIMEGPS, 5)
+    dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_CLOCK, 5)
+    #dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_DGPS, 5)
+for r in t.failed():
+    print(r)
 
 while True:
     msg = dev.receive_message()
@@ -62,7 +67,7 @@ while True:
         if opts.reopen:
             dev.close()
             dev = ublox.UBlox(opts.port, baudrate=opts.baudrate, timeout=2)
-            dev.set_logfile(opts.log, append=True)
+            dev.set_logfile(opts.log, append=True, **ublox.logwriter.writer_options(opts))
             sys.stdout.write('R')
             continue
         break
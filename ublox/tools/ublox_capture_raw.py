@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-import ublox, sys, time, struct
+import ublox, ublox.logwriter, sys, time, struct
 import ephemeris
 
 from optparse import OptionParser
@@ -16,12 +16,13 @@ parser.add_option("--show", action='store_true', default=False, help='show messa
 parser.add_option("--dynModel", type='int', default=None, help='set dynamic navigation model')
 parser.add_option("--usePPP", action='store_true', default=False, help='enable precise point positioning')
 parser.add_option("--dots", action='store_true', default=False, help='print a dot on each message')
+ublox.logwriter.add_options(parser)
 
 
 (opts, args) = parser.parse_args()
 
 dev = ublox.UBlox(opts.port, baudrate=opts.baudrate, timeout=2)
-dev.set_logfile(opts.log, append=opts.append)
+dev.set_logfile(opts.log, append=opts.append, **ublox.logwriter.writer_options(opts))
 dev.set_binary()
 dev.configure_poll_port()
 dev.configure_poll(ublox.CLASS_CFG, ublox.MSG_CFG_USB)
@@ -66,7 +67,7 @@ while True:
         if opts.reopen:
             dev.close()
             dev = ublox.UBlox(opts.port, baudrate=opts.baudrate, timeout=2)
-            dev.set_logfile(opts.log, append=True)
+            dev.set_logfile(opts.log, append=True, **ublox.logwriter.writer_options(opts))
             continue
         break
     if opts.show:
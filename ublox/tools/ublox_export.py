@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+import ublox, ublox.archive, sys, time
+
+from optparse import OptionParser
+
+parser = OptionParser("ublox_export.py [options] <file...>")
+parser.add_option("--output", default=None, help="archive filename, ending in .npz for a single file or a directory name otherwise (default <log>.npz)")
+parser.add_option("--types", default=None, help="comma separated list of message names to export (default all)")
+parser.add_option("--processes", type='int', default=None, help="number of decoding processes (default all CPUs)")
+parser.add_option("--no-compress", action='store_true', default=False, help="don't compress .npz archives")
+parser.add_option("--summary", action='store_true', default=False, help="show the exported message types")
+
+(opts, args) = parser.parse_args()
+
+if opts.output is not None and len(args) > 1:
+    print("--output can only be used with a single log")
+    sys.exit(1)
+
+types = None
+if opts.types is not None:
+    names = dict([(ublox.msg_types[t].name, t) for t in ublox.msg_types])
+    types = []
+    for name in opts.types.split(','):
+        if not name in names:
+            print("Unknown message type %s" % name)
+            sys.exit(1)
+        types.append(names[name])
+
+for logfile in args:
+    t0 = time.time()
+    filename = ublox.archive.export_log(logfile, opts.output, types=types,
+                                        processes=opts.processes, compress=not opts.no_compress)
+    print("%s: exported in %.2fs" % (filename, time.time() - t0))
+    if not opts.summary:
+        continue
+    archive = ublox.archive.UBloxArchive(filename)
+    for name in archive.names():
+        columns = archive[name]
+        line = "  %-16s %u" % (name, len(columns))
+        if columns.recs is not None:
+            line += " (%u records)" % len(columns.recs)
+        print(line)
+    archive.close()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+import ublox, ublox.index, sys, time
+
+from optparse import OptionParser
+
+parser = OptionParser("ublox_index.py [options] <file...>")
+parser.add_option("--rebuild", action='store_true', default=False, help="rebuild the index from scratch")
+parser.add_option("--summary", action='store_true', default=False, help="show message counts and time range")
+
+(opts, args) = parser.parse_args()
+
+for logfile in args:
+    indexfile = ublox.index.index_filename(logfile)
+    if opts.rebuild:
+        open(indexfile, 'wb').close()
+    t0 = time.time()
+    ublox.index.build_index(logfile, indexfile)
+    index = ublox.index.UBloxIndex(logfile, update=False)
+    print("%s: %u frames indexed in %.2fs" % (indexfile, len(index), time.time() - t0))
+    if not opts.summary or len(index) == 0:
+        continue
+    e = index.entries
+    timed = e[e['itow'] >= 0]
+    if len(timed) > 0:
+        print("  iTOW %.3f to %.3f" % (timed['itow'][0]*1.0e-3, timed['itow'][-1]*1.0e-3))
+    counts = {}
+    for (msg_class, msg_id) in zip(e['msg_class'], e['msg_id']):
+        t = (int(msg_class), int(msg_id))
+        counts[t] = counts.get(t, 0) + 1
+    for t in sorted(counts.keys()):
+        if t in ublox.msg_types:
+            name = ublox.msg_types[t].name
+        else:
+            name = '(0x%02x 0x%02x)' % t
+        print("  %-16s %u" % (name, counts[t]))
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+import ublox, ublox.replay, sys, time
+
+from optparse import OptionParser
+
+parser = OptionParser("ublox_replay.py [options] <file>")
+parser.add_option("--tcp", type='int', default=None, help="TCP port to serve the log on")
+parser.add_option("--host", default='', help="address to listen on (default all)")
+parser.add_option("--pty", action='store_true', default=False, help="replay into a pseudo terminal")
+parser.add_option("--speed", type='float', default=1.0, help="replay speed relative to real time, 0 for as fast as possible")
+parser.add_option("--loop", action='store_true', default=False, help="replay the log continuously")
+parser.add_option("--no-ack", action='store_true', default=False, help="don't acknowledge CFG messages")
+parser.add_option("--duration", type='float', default=None, help="stop after this many seconds")
+parser.add_option("--no-wait", action='store_true', default=False, help="start without waiting for a TCP client")
+
+(opts, args) = parser.parse_args()
+
+if len(args) != 1:
+    parser.print_help()
+    sys.exit(1)
+
+if opts.tcp is None and not opts.pty:
+    print("Need --tcp or --pty")
+    sys.exit(1)
+
+replay = ublox.replay.UBloxReplayer(args[0], speed=opts.speed, loop=opts.loop,
+                                    ack=not opts.no_ack)
+if opts.tcp is not None:
+    port = replay.listen_tcp(opts.tcp, opts.host)
+    print("Serving %s on tcp:%s:%u" % (args[0], opts.host or '0.0.0.0', port))
+if opts.pty:
+    print("Replaying %s into %s" % (args[0], replay.open_pty()))
+sys.stdout.flush()
+
+t0 = time.time()
+try:
+    replay.run(duration=opts.duration, wait=not opts.no_wait)
+except KeyboardInterrupt:
+    pass
+print("%u messages, %u bytes in %.1fs, %u loops, max late %.3fs" % (
+    replay.messages, replay.bytes, time.time() - t0, replay.loops, replay.max_late))
+replay.close()
@@ -8,6 +8,9 @@ parser = OptionParser("ublox_show.py [options] <file>")
 parser.add_option("--types", default='*', help="comma separated list of types to show (wildcards allowed)")
 parser.add_option("--seek", type='float', default=0, help="seek percentage to start in log")
 parser.add_option("-f", "--follow", action='store_true', default=False, help="ignore EOF")
+parser.add_option("--start", type='float', default=None, help="GPS time of week in seconds to start at, using the log index")
+parser.add_option("--end", type='float', default=None, help="GPS time of week in seconds to stop at, using the log index")
+parser.add_option("--fast-skip", action='store_true', default=False, help="skip unwanted types without checking their checksums")
 
 (opts, args) = parser.parse_args()
 
@@ -18,22 +21,36 @@ if opts.seek != 0:
 
 types = opts.types.split(',')
 
+# work out the wanted (class, id) pairs up front so the framer can skip
+# everything else
+allow = None
+if types != ['*']:
+    allow = []
+    for (msg_type, desc) in ublox.msg_types.items():
+        for t in types:
+            if fnmatch.fnmatch(desc.name, t):
+                allow.append(msg_type[:2])
+                break
+    dev.set_message_filter(allow, verify_checksum=not opts.fast_skip)
+
+indexed = None
+if opts.start is not None or opts.end is not None:
+    import ublox.index
+    index = ublox.index.UBloxIndex(args[0])
+    start = end = None
+    if opts.start is not None:
+        start = int(opts.start*1000)
+    if opts.end is not None:
+        end = int(opts.end*1000)
+    indexed = index.messages(types=allow, start=start, end=end)
+
 while True:
-    msg = dev.receive_message(ignore_eof=opts.follow)
+    if indexed is not None:
+        msg = next(indexed, None)
+    else:
+        msg = dev.receive_message(ignore_eof=opts.follow)
     if msg is None:
         break
-    if types != ['*']:
-        matched = False
-        try:
-            name = msg.name()
-        except ublox.UBloxError as e:
-            continue
-        for t in types:
-            if fnmatch.fnmatch(name, t):
-                matched = True
-                break
-        if not matched:
-            continue
     try:
         print(str(msg))
     except ublox.UBloxError as e:
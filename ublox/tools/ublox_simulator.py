@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+import ublox, ublox.simulator, sys, time
+
+from optparse import OptionParser
+
+parser = OptionParser("ublox_simulator.py [options]")
+parser.add_option("--tcp", type='int', default=None, help="TCP port to listen on")
+parser.add_option("--host", default='', help="address to listen on (default all)")
+parser.add_option("--pty", action='store_true', default=False, help="serve a pseudo terminal")
+parser.add_option("--position", default="-35.3632621,149.1652374,584.0", help="position of the fix as lat,lon,alt")
+parser.add_option("--num-sv", type='int', default=10, help="number of satellites in the fix")
+parser.add_option("--rate-ms", type='int', default=1000, help="initial measurement period in ms")
+parser.add_option("--messages", default=None, help="comma separated list of message names to output from the start")
+parser.add_option("--ttff", type='float', default=30.0, help="seconds to a fix without assistance")
+parser.add_option("--aided-ttff", type='float', default=5.0, help="seconds to a fix with assistance")
+parser.add_option("--reply-delay", type='float', default=0.0, help="seconds before replying to a message")
+parser.add_option("--duration", type='float', default=None, help="stop after this many seconds")
+
+(opts, args) = parser.parse_args()
+
+if opts.tcp is None and not opts.pty:
+    print("Need --tcp or --pty")
+    sys.exit(1)
+
+position = tuple([float(x) for x in opts.position.split(',')])
+if len(position) != 3:
+    print("position must be lat,lon,alt")
+    sys.exit(1)
+
+rates = {}
+if opts.messages is not None:
+    names = dict([(ublox.msg_types[t].name, t) for t in ublox.simulator.OUTPUT_TYPES])
+    for name in opts.messages.split(','):
+        if not name in names:
+            print("Can't output %s" % name)
+            sys.exit(1)
+        rates[names[name]] = 1
+
+sim = ublox.simulator.UBloxSimulator(position=position, num_sv=opts.num_sv, rate_ms=opts.rate_ms,
+                                     rates=rates, ttff=opts.ttff, aided_ttff=opts.aided_ttff,
+                                     reply_delay=opts.reply_delay)
+if opts.tcp is not None:
+    port = sim.listen_tcp(opts.tcp, opts.host)
+    print("Listening on tcp:%s:%u" % (opts.host or '0.0.0.0', port))
+if opts.pty:
+    print("Simulating on %s" % sim.open_pty())
+sys.stdout.flush()
+
+t0 = time.time()
+try:
+    sim.run(duration=opts.duration)
+except KeyboardInterrupt:
+    pass
+print("%u epochs in %.1fs, %u messages received, %u ACK, %u NACK, %u MGA_ACK, %u resets" % (
+    sim.epochs, time.time() - t0, sim.received, sim.acks, sim.nacks, sim.mga_acks, sim.resets))
+sim.close()
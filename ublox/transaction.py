@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+'''
+Pipelined configuration transactions for UBlox receivers
+
+The receiver answers every CFG message with an ACK_ACK or ACK_NACK
+carrying the class and id of the message. A transaction keeps up to
+window messages in flight, matches each acknowledgement to the oldest
+outstanding message of that type (the receiver handles its input in
+order), and resends messages that are not acknowledged in time. Bring
+up then takes about one round trip per window of messages, and the
+outcome of each message is known:
+
+    with dev.transaction() as t:
+        dev.configure_message_rate(ublox.CLASS_NAV, ublox.MSG_NAV_SOL, 1)
+        dev.configure_solution_rate(rate_ms=200)
+    for r in t.failed():
+        print(r)
+
+Released under GNU GPL version 3 or later
+'''
+
+import select, time
+import ublox
+
+# result status values
+ACK = 'ack'
+NACK = 'nack'
+TIMEOUT = 'timeout'
+NOT_SENT = 'not sent'
+
+# CFG messages that are not acknowledged
+_UNACKED = set([(ublox.CLASS_CFG, ublox.MSG_CFG_RST)])
+
+class UBloxConfigResult:
+    '''the outcome of one message of a transaction. status is None
+    while the message is outstanding, and rtt is the time from the last
+    send to the acknowledgement'''
+    def __init__(self, msg):
+        self.msg = msg
+        self.key = msg.msg_type()
+        self.status = None
+        self.attempts = 0
+        self.sent = None
+        self.rtt = None
+
+    def name(self):
+        '''return the name of the message type'''
+        desc = ublox.msg_types.get(self.key, None)
+        if desc is None:
+            return '(0x%02x 0x%02x)' % self.key
+        return desc.name
+
+    def __str__(self):
+        ret = '%s: %s after %u attempt%s' % (self.name(), self.status, self.attempts,
+                                             '' if self.attempts == 1 else 's')
+        if self.rtt is not None:
+            ret += ' (%.0fms)' % (self.rtt * 1000)
+        return ret
+
+class UBloxConfigTransaction:
+    '''send a batch of CFG messages and track their acknowledgements
+
+    Messages are added with add(), or by calling the configure_*()
+    methods of the device inside a with block, which runs the
+    transaction on exit. At most window messages are outstanding at
+    once. A message not acknowledged within timeout seconds is sent
+    again, up to retries times.
+
+    run() drives the transaction from the device directly. For a device
+    serviced elsewhere, call start(), pass received messages to
+    handle() and call check() periodically until done()
+    '''
+    def __init__(self, dev, window=8, timeout=1.0, retries=3):
+        self.dev = dev
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self.results = []
+        self._queue = []
+        self._inflight = []
+        # for each type with messages outstanding, the messages of that
+        # type acknowledged since it last had none outstanding. If one
+        # of its messages was lost, the later acknowledgements have been
+        # matched to the wrong messages, so these are sent again
+        self._suspect = {}
+
+    def collect(self, msg):
+        '''add a message being sent by the device if it is an
+        acknowledged CFG message, returning True if it was added'''
+        t = msg.msg_type()
+        if t[0] != ublox.CLASS_CFG or t in _UNACKED:
+            return False
+        self.add(msg)
+        return True
+
+    def add(self, msg):
+        '''add a message to the transaction, returning its UBloxConfigResult'''
+        r = UBloxConfigResult(msg)
+        self.results.append(r)
+        self._queue.append(r)
+        return r
+
+    def __enter__(self):
+        self.dev._transaction = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.dev._transaction = None
+        if exc_type is None:
+            self.run()
+
+    def _send(self, r, now):
+        '''send a message, making it outstanding'''
+        r.attempts += 1
+        r.sent = now
+        self._inflight.append(r)
+        self.dev.send(r.msg)
+
+    def _fill(self, now):
+        '''send queued messages while there is room in the window'''
+        while self._queue and len(self._inflight) < self.window:
+            self._send(self._queue.pop(0), now)
+
+    def start(self):
+        '''send the first window of messages'''
+        if self.dev.read_only:
+            for r in self._queue:
+                r.status = NOT_SENT
+            self._queue = []
+            return
+        self._fill(time.time())
+
+    def handle(self, msg):
+        '''match a received message against the outstanding messages,
+        returning True if it acknowledged one of them'''
+        t = msg.msg_type()
+        if t != (ublox.CLASS_ACK, ublox.MSG_ACK_ACK) and t != (ublox.CLASS_ACK, ublox.MSG_ACK_NACK):
+            return False
+        msg.unpack()
+        key = (msg.clsID, msg.msgID)
+        for r in self._inflight:
+            if r.key == key:
+                break
+        else:
+            return False
+        now = time.time()
+        self._inflight.remove(r)
+        if t[1] == ublox.MSG_ACK_ACK:
+            r.status = ACK
+        else:
+            r.status = NACK
+        r.rtt = now - r.sent
+        if any(x.key == key for x in self._inflight):
+            self._suspect.setdefault(key, []).append(r)
+        else:
+            self._suspect.pop(key, None)
+        self._fill(now)
+        return True
+
+    def check(self):
+        '''resend or give up on messages that have timed out'''
+        now = time.time()
+        resend = []
+        for r in list(self._inflight):
+            if now - r.sent < self.timeout:
+                continue
+            self._inflight.remove(r)
+            for x in self._suspect.pop(r.key, []):
+                if x.attempts <= self.retries:
+                    x.status = None
+                    x.rtt = None
+                    resend.append(x)
+            if r.attempts <= self.retries:
+                resend.append(r)
+            else:
+                r.status = TIMEOUT
+        if resend:
+            # keep the original order, which the receiver answers in
+            order = dict([(id(r), i) for (i, r) in enumerate(self.results)])
+            resend.sort(key=lambda r: order[id(r)])
+            self._queue = resend + self._queue
+        self._fill(now)
+
+    def next_timeout(self):
+        '''return the time until the next message times out, or None'''
+        if not self._inflight:
+            return None
+        return max(min([r.sent for r in self._inflight]) + self.timeout - time.time(), 0)
+
+    def done(self):
+        '''return True when every message has a result'''
+        return not self._queue and not self._inflight
+
+    def _abandon(self, status):
+        '''give up on all outstanding messages'''
+        for r in self._queue + self._inflight:
+            r.status = status
+        self._queue = []
+        self._inflight = []
+
+    def run(self):
+        '''send the messages and wait for their acknowledgements,
+        returning the results. Other messages received meanwhile are
+        passed to the device's dispatch()'''
+        self.start()
+        while not self.done():
+            msg = self.dev.next_buffered_message()
+            if msg is not None:
+                if not self.handle(msg):
+                    self.dev.dispatch(msg)
+                continue
+            self.check()
+            wait = self.next_timeout()
+            if wait is None:
+                continue
+            try:
+                (rin, win, xin) = select.select([self.dev.fileno()], [], [], wait)
+            except (IOError, OSError, select.error):
+                continue
+            if not rin:
+                continue
+            data = self.dev.read_available()
+            if not data:
+                # the device has gone away
+                self._abandon(TIMEOUT)
+                break
+            self.dev.feed(data)
+        return self.results
+
+    def failed(self):
+        '''return the results of the messages that were sent but not
+        acknowledged'''
+        return [r for r in self.results if r.status != ACK and r.status != NOT_SENT]
+
+    def ok(self):
+        '''return True if every message sent was acknowledged'''
+        return not self.failed()
@@ -8,8 +8,11 @@ Released under GNU GPL version 3 or later
 
 import struct
 from datetime import datetime
-import time, os
-import StringIO
+import time, os, mmap, operator
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # protocol constants
 PREAMBLE1 = 0xb5
@@ -169,6 +172,14 @@ RESET_HW_GRACEFUL   = 4
 RESET_GPS_STOP      = 8
 RESET_GPS_START     = 9
 
+if bytes is str:
+    # python2, indexing a byte string gives a string
+    byte_value = ord
+else:
+    def byte_value(b):
+        '''return the integer value of an element of a byte string'''
+        return b
+
 class UBloxError(Exception):
     '''Ublox error class'''
     def __init__(self, msg):
@@ -187,12 +198,84 @@ class UBloxAttrDict(dict):
             raise AttributeError(name)
 
     def __setattr__(self, name, value):
-        if self.__dict__.has_key(name):
+        if name in self.__dict__:
             # allow set on normal attributes
             dict.__setattr__(self, name, value)
         else:
             self.__setitem__(name, value)
 
+class UBloxRecord(object):
+    '''one record of the repeated part of a message. A subclass with
+    __slots__ for its fields is made for each descriptor, so records
+    carry no per-instance dict. Fields can be read as attributes or
+    items'''
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def keys(self):
+        return list(self._fields)
+
+    def values(self):
+        return [getattr(self, f) for f in self._fields]
+
+    def items(self):
+        return list(zip(self._fields, self.values()))
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def __eq__(self, other):
+        if isinstance(other, UBloxRecord):
+            return self._fields == other._fields and self.values() == other.values()
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __getstate__(self):
+        return self.values()
+
+    def __setstate__(self, state):
+        for (f, v) in zip(self._fields, state):
+            setattr(self, f, v)
+
+def RecordClass(name, fields):
+    '''make the UBloxRecord subclass for the records of a message type.
+    The class is added to this module so its records can be pickled'''
+    fields = tuple(fields)
+    # a positional constructor, so records can be made straight from
+    # the values unpacked from a frame
+    src = 'def __init__(self, %s):\n' % ', '.join(fields)
+    src += ''.join(['    self.%s = %s\n' % (f, f) for f in fields])
+    namespace = {}
+    exec(src, namespace)
+    cls = type('UBloxRecord_' + name, (UBloxRecord,),
+               {'__slots__' : fields, '_fields' : fields,
+                '__init__' : namespace['__init__'], '__module__' : __name__})
+    globals()[cls.__name__] = cls
+    return cls
+
 def ArrayParse(field):
     '''parse an array descriptor'''
     arridx = field.find('[')
@@ -202,6 +285,27 @@ def ArrayParse(field):
     fieldname = field[:arridx]
     return (fieldname, alen)
 
+def FormatTokens(fmt):
+    '''split a struct format into its byte order prefix and a list of
+    tokens, one per value, with padding tokens holding no value'''
+    fmt = fmt.replace(' ', '')
+    order = ''
+    if fmt and fmt[0] in '@=<>!':
+        order = fmt[0]
+        fmt = fmt[1:]
+    tokens = []
+    count = ''
+    for c in fmt:
+        if c.isdigit():
+            count += c
+            continue
+        if c in 'spx':
+            tokens.append(count + c)
+        else:
+            tokens.extend([c] * int(count or 1))
+        count = ''
+    return (order, tokens)
+
 class UBloxDescriptor:
     '''class used to describe the layout of a UBlox message'''
     def __init__(self, name, msg_format, fields=[], count_field=None, format2=None, fields2=None):
@@ -211,108 +315,239 @@ class UBloxDescriptor:
         self.count_field = count_field
         self.format2 = format2
         self.fields2 = fields2
-	
+        self.compile()
+
+    def compile(self):
+        '''precompute the struct layouts and field slots used by unpack and pack'''
+        # each comma separated block of msg_format becomes a
+        # (Struct, names, slots) tuple. names is the list of field names
+        # when the block has no array fields, otherwise slots is a list
+        # of (fieldname, alen) giving the values each field consumes
+        self._blocks = []
+        fields = list(self.fields)
+        for fmt in self.msg_format.split(','):
+            s = struct.Struct(fmt)
+            nvalues = len(s.unpack(b'\0' * s.size))
+            slots = []
+            while nvalues > 0 and fields:
+                (fieldname, alen) = ArrayParse(fields.pop(0))
+                slots.append((fieldname, alen))
+                nvalues -= max(alen, 1)
+            if nvalues != 0:
+                raise UBloxError("%s: fields do not match format %s" % (self.name, self.msg_format))
+            if all(alen == -1 for (fieldname, alen) in slots):
+                self._blocks.append((s, [fieldname for (fieldname, alen) in slots], None))
+            else:
+                self._blocks.append((s, None, slots))
+
+        # the position of each field in the frame, for lazy decoding.
+        # Maps fieldname to (Struct, offset, alen, block_end)
+        self._field_layout = {}
+        base = 6
+        for (s, names, slots) in self._blocks:
+            if slots is None:
+                slots = [(fieldname, -1) for fieldname in names]
+            (order, tokens) = FormatTokens(s.format)
+            values = []
+            for i in range(len(tokens)):
+                if tokens[i].endswith('x'):
+                    continue
+                # offset of the token, allowing for any native alignment
+                ofs = struct.calcsize(order + ''.join(tokens[:i+1])) - struct.calcsize(order + tokens[i])
+                values.append((ofs, tokens[i]))
+            i = 0
+            for (fieldname, alen) in slots:
+                n = max(alen, 1)
+                fmt = order + ''.join([tok for (ofs, tok) in values[i:i+n]])
+                self._field_layout[fieldname] = (struct.Struct(fmt), base + values[i][0], alen, base + s.size)
+                i += n
+            base += s.size
+        self._pack_full = struct.Struct(self.msg_format.replace(',', ''))
+        self._pack_short = self._blocks[0][0]
+        if self.format2 is not None:
+            self._struct2 = struct.Struct(self.format2)
+            self._record_class = RecordClass(self.name, self.fields2)
+        else:
+            self._struct2 = None
+            self._record_class = None
+
     def unpack(self, msg):
-	'''unpack a UBloxMessage, creating the .fields and ._recs attributes in msg'''
+        '''unpack a UBloxMessage, creating the .fields and ._recs attributes in msg'''
         msg._fields = {}
-
-        # unpack main message blocks. A comm
-        formats = self.msg_format.split(',')
-        buf = msg._buf[6:-2]
-        count = 0
         msg._recs = []
-        fields = self.fields[:]
-        for fmt in formats:
-            size1 = struct.calcsize(fmt)
-            if size1 > len(buf):
-                raise UBloxError("%s INVALID_SIZE1: %u>%u" % (self.name, size1, len(buf)))
-            f1 = list(struct.unpack(fmt, buf[:size1]))
-            i = 0
-            while i < len(f1):
-                field = fields.pop(0)
-                (fieldname, alen) = ArrayParse(field)
-                if alen == -1:
-                    msg._fields[fieldname] = f1[i]
-                    if self.count_field == fieldname:
-                        count = int(f1[i])
-                    i += 1
-                else:
-                    msg._fields[fieldname] = [0]*alen
-                    for a in range(alen):
-                        msg._fields[fieldname][a] = f1[i]
+
+        # unpack main message blocks. Blocks after the first are optional
+        buf = msg._buf
+        ofs = 6
+        end = len(buf) - 2
+        for (s, names, slots) in self._blocks:
+            if s.size > end - ofs:
+                raise UBloxError("%s INVALID_SIZE1: %u>%u" % (self.name, s.size, end - ofs))
+            f1 = s.unpack_from(buf, ofs)
+            if names is not None:
+                msg._fields.update(zip(names, f1))
+            else:
+                i = 0
+                for (fieldname, alen) in slots:
+                    if alen == -1:
+                        msg._fields[fieldname] = f1[i]
                         i += 1
-            buf = buf[size1:]
-            if len(buf) == 0:
+                    else:
+                        msg._fields[fieldname] = list(f1[i:i+alen])
+                        i += alen
+            ofs += s.size
+            if ofs == end:
                 break
 
+        count = 0
         if self.count_field == '_remaining':
-            count = len(buf) / struct.calcsize(self.format2)
+            count = (end - ofs) // self._struct2.size
+        elif self.count_field in msg._fields:
+            count = int(msg._fields[self.count_field])
 
         if count == 0:
             msg._unpacked = True
-            if len(buf) != 0:
-                raise UBloxError("EXTRA_BYTES=%u" % len(buf))
+            if ofs != end:
+                raise UBloxError("EXTRA_BYTES=%u" % (end - ofs))
             return
 
-        size2 = struct.calcsize(self.format2)
+        s2 = self._struct2
+        record = self._record_class
         for c in range(count):
-            r = UBloxAttrDict()
-            if size2 > len(buf):
-                raise UBloxError("INVALID_SIZE=%u, " % len(buf))
-            f2 = list(struct.unpack(self.format2, buf[:size2]))
-            for i in range(len(self.fields2)):
-                r[self.fields2[i]] = f2[i]
-            buf = buf[size2:]
-            msg._recs.append(r)
-        if len(buf) != 0:
-            raise UBloxError("EXTRA_BYTES=%u" % len(buf))
+            if s2.size > end - ofs:
+                raise UBloxError("INVALID_SIZE=%u, " % (end - ofs))
+            msg._recs.append(record(*s2.unpack_from(buf, ofs)))
+            ofs += s2.size
+        if ofs != end:
+            raise UBloxError("EXTRA_BYTES=%u" % (end - ofs))
         msg._unpacked = True
 
+    def layout(self, msg):
+        '''check the payload length of a UBloxMessage against the
+        descriptor without decoding it, returning a tuple of the frame
+        offset of the repeated records and the record count'''
+        buf = msg._buf
+        ofs = 6
+        end = len(buf) - 2
+        for (s, names, slots) in self._blocks:
+            if s.size > end - ofs:
+                raise UBloxError("%s INVALID_SIZE1: %u>%u" % (self.name, s.size, end - ofs))
+            ofs += s.size
+            if ofs == end:
+                break
+
+        count = 0
+        if self.count_field == '_remaining':
+            count = (end - ofs) // self._struct2.size
+        elif self.count_field in self._field_layout:
+            (s, fofs, alen, block_end) = self._field_layout[self.count_field]
+            if block_end <= ofs:
+                count = int(s.unpack_from(buf, fofs)[0])
+
+        if count == 0:
+            if ofs != end:
+                raise UBloxError("EXTRA_BYTES=%u" % (end - ofs))
+        else:
+            size2 = self._struct2.size
+            if count * size2 > end - ofs:
+                raise UBloxError("INVALID_SIZE=%u, " % ((end - ofs) % size2))
+            if count * size2 != end - ofs:
+                raise UBloxError("EXTRA_BYTES=%u" % (end - ofs - count * size2))
+        return (ofs, count)
+
+    def unpack_lazy(self, msg):
+        '''check the layout of a UBloxMessage without decoding it. Fields
+        are decoded by decode_field() on first access, and repeated
+        records as they are used'''
+        (ofs, count) = self.layout(msg)
+        msg._fields = {}
+        msg._recs = []
+        msg._lazy = self
+        msg._lazy_end = ofs
+        if count != 0:
+            msg._recs = UBloxLazyRecords(self._struct2, self._record_class, msg._buf, ofs, count)
+        msg._unpacked = True
+
+    def have_field(self, msg, name):
+        '''return True if a lazily unpacked message contains the given field'''
+        layout = self._field_layout.get(name, None)
+        return layout is not None and layout[3] <= msg._lazy_end
+
+    def decode_field(self, msg, name):
+        '''decode a single field of a lazily unpacked message'''
+        layout = self._field_layout.get(name, None)
+        if layout is None or layout[3] > msg._lazy_end:
+            raise AttributeError(name)
+        (s, ofs, alen, block_end) = layout
+        v = s.unpack_from(msg._buf, ofs)
+        if alen == -1:
+            v = v[0]
+        else:
+            v = list(v)
+        msg._fields[name] = v
+        return v
+
+    def unpack_remaining(self, msg):
+        '''fully decode a lazily unpacked message, keeping any fields
+        and records that have already been accessed or changed'''
+        fields = msg._fields
+        recs = msg._recs
+        self.unpack(msg)
+        msg._fields.update(fields)
+        if isinstance(recs, UBloxLazyRecords):
+            for (i, r) in recs.decoded():
+                msg._recs[i] = r
+        msg._lazy = None
+
     def pack(self, msg, msg_class=None, msg_id=None):
-	'''pack a UBloxMessage from the .fields and ._recs attributes in msg'''
+        '''pack a UBloxMessage from the .fields and ._recs attributes in msg'''
+        if msg._lazy is not None:
+            self.unpack_remaining(msg)
         f1 = []
         if msg_class is None:
             msg_class = msg.msg_class()
         if msg_id is None:
             msg_id = msg.msg_id()
-        msg._buf = ''
-
-        fields = self.fields[:]
-        for f in fields:
-            (fieldname, alen) = ArrayParse(f)
-            if not fieldname in msg._fields:
-                break
-            if alen == -1:
-                f1.append(msg._fields[fieldname])
+        msg._buf = b''
+
+        for (s, names, slots) in self._blocks:
+            if slots is None:
+                slots = [(fieldname, -1) for fieldname in names]
+            for (fieldname, alen) in slots:
+                if not fieldname in msg._fields:
+                    break
+                if alen == -1:
+                    f1.append(msg._fields[fieldname])
+                else:
+                    f1.extend(msg._fields[fieldname][:alen])
             else:
-                for a in range(alen):
-                    f1.append(msg._fields[fieldname][a])                    
+                continue
+            break
         try:
             # try full length message
-            fmt = self.msg_format.replace(',', '')
-            msg._buf = struct.pack(fmt, *tuple(f1))
+            msg._buf = self._pack_full.pack(*f1)
         except Exception as e:
             # try without optional part
-            fmt = self.msg_format.split(',')[0]
-            msg._buf = struct.pack(fmt, *tuple(f1))
+            msg._buf = self._pack_short.pack(*f1)
 
         length = len(msg._buf)
         if msg._recs:
-            length += len(msg._recs) * struct.calcsize(self.format2)
+            length += len(msg._recs) * self._struct2.size
         header = struct.pack('<BBBBH', PREAMBLE1, PREAMBLE2, msg_class, msg_id, length)
         msg._buf = header + msg._buf
 
-        for r in msg._recs:
-            f2 = []
-            for f in self.fields2:
-                f2.append(r[f])
-            msg._buf += struct.pack(self.format2, *tuple(f2))            
+        if msg._recs:
+            pack2 = self._struct2.pack
+            fields2 = self.fields2
+            msg._buf += b''.join([pack2(*[r[f] for f in fields2]) for r in msg._recs])
         msg._buf += struct.pack('<BB', *msg.checksum(data=msg._buf[2:]))
 
     def format(self, msg):
-	'''return a formatted string for a message'''
+        '''return a formatted string for a message'''
         if not msg._unpacked:
             self.unpack(msg)
+        if msg._lazy is not None:
+            self.unpack_remaining(msg)
         ret = self.name + ': '
         for f in self.fields:
             (fieldname, alen) = ArrayParse(f)
@@ -324,8 +559,11 @@ class UBloxDescriptor:
                 for a in range(alen):
                     ret += '%s, ' % v[a]
                 ret = ret[:-2] + '], '
-            elif isinstance(v, str):
-                ret += '%s="%s", ' % (f, v.rstrip(' \0'))
+            elif isinstance(v, bytes):
+                v = v.rstrip(b' \0')
+                if not isinstance(v, str):
+                    v = v.decode('latin-1')
+                ret += '%s="%s", ' % (f, v)
             else:
                 ret += '%s=%s, ' % (f, v)
         for r in msg._recs:
@@ -335,7 +573,40 @@ class UBloxDescriptor:
                 ret += '%s=%s, ' % (f, v)
             ret = ret[:-2] + ' ], '
         return ret[:-2]
-        
+
+class UBloxLazyRecords(object):
+    '''list-like holder for the repeated records of a lazily unpacked
+    message. Each record is decoded the first time it is used'''
+    __slots__ = ('_struct', '_record', '_buf', '_ofs', '_recs')
+
+    def __init__(self, s, record, buf, ofs, count):
+        self._struct = s
+        self._record = record
+        self._buf = buf
+        self._ofs = ofs
+        self._recs = [None] * count
+
+    def __len__(self):
+        return len(self._recs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self._recs)))]
+        r = self._recs[i]
+        if r is None:
+            if i < 0:
+                i += len(self._recs)
+            r = self._record(*self._struct.unpack_from(self._buf, self._ofs + i*self._struct.size))
+            self._recs[i] = r
+        return r
+
+    def __iter__(self):
+        for i in range(len(self._recs)):
+            yield self[i]
+
+    def decoded(self):
+        '''return (index, record) for the records decoded so far'''
+        return [(i, r) for (i, r) in enumerate(self._recs) if r is not None]
 
 # list of supported message types.
 msg_types = {
@@ -460,6 +731,7 @@ msg_types = {
                                                   ['chn', 'svid', 'dwrd[10]']),
     (CLASS_AID, MSG_AID_ALM)   : UBloxDescriptor('AID_ALM',
                                                   '<II',
+                                                  ['svid', 'week'],
                                                  '_remaining',
                                                  'I',
                                                  ['dwrd']),
@@ -530,17 +802,25 @@ msg_types = {
                                                 ["type","version","svId","gnssId","year","month","day","reserved1","data[64]","reserved2[4]"]),
 }
 
-class UBloxMessage:
+class UBloxMessage(object):
     '''UBlox message class - holds a UBX binary message'''
+    # fields are kept in _fields, so messages need no instance dict
+    __slots__ = ('_buf', '_fields', '_recs', '_unpacked', '_lazy', '_lazy_unpack',
+                 '_lazy_end', '_checked_buf', 'debug_level')
+
     def __init__(self):
-        self._buf = ""
+        self._buf = b""
         self._fields = {}
         self._recs = []
         self._unpacked = False
+        self._lazy = None
+        self._lazy_unpack = False
+        # the buffer whose checksum has been verified
+        self._checked_buf = None
         self.debug_level = 0
 
     def __str__(self):
-	'''format a message as a string'''
+        '''format a message as a string'''
         if not self.valid():
             return 'UBloxMessage(INVALID)'
         type = self.msg_type()
@@ -550,22 +830,49 @@ class UBloxMessage:
 
     def __getattr__(self, name):
         '''allow access to message fields'''
+        if name.startswith('_'):
+            raise AttributeError(name)
         try:
             return self._fields[name]
         except KeyError:
             if name == 'recs':
                 return self._recs
+            if self._lazy is not None:
+                return self._lazy.decode_field(self, name)
             raise AttributeError(name)
 
     def __setattr__(self, name, value):
         '''allow access to message fields'''
-        if name.startswith('_'):
-            self.__dict__[name] = value
+        if name.startswith('_') or name == 'debug_level':
+            object.__setattr__(self, name, value)
         else:
             self._fields[name] = value
 
+    def __getstate__(self):
+        '''fully decode a lazily unpacked message before pickling, as the
+        descriptor and any memory mapped buffer can't be pickled'''
+        if self._lazy is not None:
+            self._lazy.unpack_remaining(self)
+        state = {}
+        for name in self.__slots__:
+            if hasattr(self, name):
+                state[name] = getattr(self, name)
+        if not isinstance(self._buf, bytes):
+            state['_buf'] = bytes(self._buf)
+            state['_checked_buf'] = None
+            if self._checked_buf is self._buf:
+                state['_checked_buf'] = state['_buf']
+        return state
+
+    def __setstate__(self, state):
+        self.__init__()
+        for name in state:
+            setattr(self, name, state[name])
+
     def have_field(self, name):
         '''return True if a message contains the given field'''
+        if self._lazy is not None and self._lazy.have_field(self, name):
+            return True
         return name in self._fields
 
     def debug(self, level, msg):
@@ -574,16 +881,19 @@ class UBloxMessage:
             print(msg)
 
     def unpack(self):
-	'''unpack a message'''
+        '''unpack a message'''
         if not self.valid():
             raise UBloxError('INVALID MESSAGE')
         type = self.msg_type()
         if not type in msg_types:
             raise UBloxError('Unknown message (0x%02x 0x%02x) length=%u' % (type[0], type[1], len(self._buf)))
-        msg_types[type].unpack(self)
+        if self._lazy_unpack:
+            msg_types[type].unpack_lazy(self)
+        else:
+            msg_types[type].unpack(self)
 
     def pack(self):
-	'''pack a message'''
+        '''pack a message'''
         if not self.valid():
             raise UbloxError('INVALID MESSAGE')
         type = self.msg_type()
@@ -592,7 +902,7 @@ class UBloxMessage:
         msg_types[type].pack(self)
 
     def name(self):
-	'''return the short string name for a message'''
+        '''return the short string name for a message'''
         if not self.valid():
             raise UbloxError('INVALID MESSAGE')
         type = self.msg_type()
@@ -601,27 +911,27 @@ class UBloxMessage:
         return msg_types[type].name
 
     def msg_class(self):
-	'''return the message class'''
-        return ord(self._buf[2])
+        '''return the message class'''
+        return byte_value(self._buf[2])
 
     def msg_id(self):
-	'''return the message id within the class'''
-        return ord(self._buf[3])
+        '''return the message id within the class'''
+        return byte_value(self._buf[3])
 
     def msg_type(self):
-	'''return the message type tuple (class, id)'''
+        '''return the message type tuple (class, id)'''
         return (self.msg_class(), self.msg_id())
 
     def msg_length(self):
-	'''return the payload length'''
+        '''return the payload length'''
         (payload_length,) = struct.unpack('<H', self._buf[4:6])
         return payload_length
 
     def valid_so_far(self):
-	'''check if the message is valid so far'''
-        if len(self._buf) > 0 and ord(self._buf[0]) != PREAMBLE1:
+        '''check if the message is valid so far'''
+        if len(self._buf) > 0 and byte_value(self._buf[0]) != PREAMBLE1:
             return False
-        if len(self._buf) > 1 and ord(self._buf[1]) != PREAMBLE2:
+        if len(self._buf) > 1 and byte_value(self._buf[1]) != PREAMBLE2:
             self.debug(1, "bad pre2")
             return False
         if self.needed_bytes() == 0 and not self.valid():
@@ -633,28 +943,28 @@ class UBloxMessage:
         return True
 
     def add(self, bytes):
-	'''add some bytes to a message'''
+        '''add some bytes to a message'''
         self._buf += bytes
         while not self.valid_so_far() and len(self._buf) > 0:
-	    '''handle corrupted streams'''
-            self._buf = self._buf[1:]
+            '''handle corrupted streams'''
+            # skip straight to the next possible preamble rather than
+            # dropping one byte at a time
+            idx = self._buf.find(PREAMBLE[:1], 1)
+            if idx == -1:
+                self._buf = b""
+            else:
+                self._buf = self._buf[idx:]
         if self.needed_bytes() < 0:
-            self._buf = ""
+            self._buf = b""
 
     def checksum(self, data=None):
-	'''return a checksum tuple for a message'''
+        '''return a checksum tuple for a message'''
         if data is None:
             data = self._buf[2:-2]
-        cs = 0
-        ck_a = 0
-        ck_b = 0
-        for i in data:
-            ck_a = (ck_a + ord(i)) & 0xFF
-            ck_b = (ck_b + ck_a) & 0xFF
-        return (ck_a, ck_b)
+        return fletcher_checksum(data)
 
     def valid_checksum(self):
-	'''check if the checksum is OK'''
+        '''check if the checksum is OK'''
         (ck_a, ck_b) = self.checksum()
         d = self._buf[2:-2]
         (ck_a2, ck_b2) = struct.unpack('<BB', self._buf[-2:])
@@ -667,27 +977,336 @@ class UBloxMessage:
         return self.msg_length() + 8 - len(self._buf)
 
     def valid(self):
-	'''check if a message is valid'''
-        return len(self._buf) >= 8 and self.needed_bytes() == 0 and self.valid_checksum()
+        '''check if a message is valid'''
+        if self._checked_buf is self._buf:
+            return True
+        if len(self._buf) >= 8 and self.needed_bytes() == 0 and self.valid_checksum():
+            self._checked_buf = self._buf
+            return True
+        return False
 
     def raw(self):
         '''return the raw bytes'''
         return self._buf
 
+PREAMBLE = struct.pack('<BB', PREAMBLE1, PREAMBLE2)
+
+# below this many bytes the per-call overhead of numpy outweighs its speed
+NUMPY_CHECKSUM_MIN = 512
+
+def fletcher_checksum(data):
+    '''return the UBX checksum tuple (ck_a, ck_b) of some bytes'''
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    n = len(data)
+    if numpy is not None and n >= NUMPY_CHECKSUM_MIN:
+        d = numpy.frombuffer(data, dtype=numpy.uint8)
+        ck_a = int(d.sum(dtype=numpy.uint64))
+        ck_b = int(numpy.dot(numpy.arange(n, 0, -1, dtype=numpy.uint64), d.astype(numpy.uint64)))
+    else:
+        # ck_b is the sum of the running sums, so byte i is counted n-i times
+        ck_a = sum(data)
+        ck_b = sum(map(operator.mul, range(n, 0, -1), data))
+    return (ck_a & 0xFF, ck_b & 0xFF)
+
+class BufferChecksums:
+    '''UBX checksums of any range within buf[start:end]
+
+    The first and second cumulative sums of the bytes are computed in
+    one numpy pass, after which the checksum of each frame in the
+    buffer is a few subtractions. The sums wrap modulo 2**64, which
+    leaves the low 8 bits needed for the checksum intact. No reference
+    to buf is kept, so a bytearray can still be resized afterwards'''
+    def __init__(self, buf, start, end):
+        self.start = start
+        self.end = end
+        d = numpy.frombuffer(buf, dtype=numpy.uint8, count=end-start, offset=start)
+        self._s1 = numpy.zeros(end-start+1, dtype=numpy.uint64)
+        numpy.cumsum(d, dtype=numpy.uint64, out=self._s1[1:])
+        self._s2 = numpy.cumsum(self._s1, dtype=numpy.uint64)
+        d = None
+
+    def covers(self, start, end):
+        '''return True if the sums cover buf[start:end]'''
+        return start >= self.start and end <= self.end
+
+    def checksum(self, start, end):
+        '''return the checksum tuple of buf[start:end]'''
+        i = start - self.start
+        j = end - self.start
+        s1i = int(self._s1[i])
+        ck_a = int(self._s1[j]) - s1i
+        ck_b = int(self._s2[j]) - int(self._s2[i]) - (j - i) * s1i
+        return (ck_a & 0xFF, ck_b & 0xFF)
+
+    def checksums(self, starts, ends):
+        '''return arrays of ck_a and ck_b for many ranges at once'''
+        i = numpy.asarray(starts, dtype=numpy.int64) - self.start
+        j = numpy.asarray(ends, dtype=numpy.int64) - self.start
+        s1i = self._s1[i]
+        ck_a = self._s1[j] - s1i
+        ck_b = self._s2[j] - self._s2[i] - (j - i).astype(numpy.uint64) * s1i
+        return (ck_a & 0xFF, ck_b & 0xFF)
+
+def verify_frames(buf, starts, ends):
+    '''check the checksums of many frames in a buffer at once. starts
+    and ends give the preamble offset and end of each frame. Returns a
+    numpy boolean array'''
+    starts = numpy.asarray(starts, dtype=numpy.int64)
+    ends = numpy.asarray(ends, dtype=numpy.int64)
+    if len(starts) == 0:
+        return numpy.zeros(0, dtype=bool)
+    lo = int(starts.min())
+    hi = int(ends.max())
+    sums = BufferChecksums(buf, lo, hi)
+    (ck_a, ck_b) = sums.checksums(starts + 2, ends - 2)
+    d = numpy.frombuffer(buf, dtype=numpy.uint8, count=hi-lo, offset=lo)
+    ok = (ck_a == d[ends - 2 - lo]) & (ck_b == d[ends - 1 - lo])
+    d = None
+    return ok
+
+_frame_header = struct.Struct('<BBH')
+
+def find_frame(buf, pos, buflen, allow=None, verify_skipped=True, sums=None):
+    '''search buf[pos:buflen] for a UBX frame with a valid checksum. buf
+    may be a bytearray or an mmap. Returns a tuple (start, end, bad),
+    where start is where the search stopped, end is the end of the
+    frame at start or None if more data is needed, and bad is the
+    number of candidate frames skipped because of bad checksums.
+
+    If allow is a set of (class, id) tuples, frames of other types are
+    skipped using just their header. Their checksums are only checked
+    if verify_skipped is set, which guards against a corrupted length
+    causing good frames to be skipped. sums is an optional
+    BufferChecksums for buf'''
+    bad = 0
+    while True:
+        start = buf.find(PREAMBLE, pos, buflen)
+        if start == -1:
+            # a trailing first preamble byte may start the next frame
+            start = buflen
+            if buflen > pos and struct.unpack_from('<B', buf, buflen-1)[0] == PREAMBLE1:
+                start -= 1
+            return (start, None, bad)
+        if buflen - start < 8:
+            return (start, None, bad)
+        (msg_class, msg_id, length) = _frame_header.unpack_from(buf, start+2)
+        end = start + length + 8
+        if end > buflen:
+            return (start, None, bad)
+        wanted = allow is None or (msg_class, msg_id) in allow
+        if wanted or verify_skipped:
+            if sums is not None and sums.covers(start+2, end-2):
+                ck = sums.checksum(start+2, end-2)
+            else:
+                ck = fletcher_checksum(buf[start+2:end-2])
+            if ck != struct.unpack_from('<BB', buf, end-2):
+                # not a real frame, resync after this preamble
+                bad += 1
+                pos = start + 1
+                continue
+        if not wanted:
+            pos = end
+            continue
+        return (start, end, bad)
+
+class UBloxFramer:
+    '''split a stream of bytes into UBX frames
+
+    Data is appended to a reusable bytearray with feed(), and frames
+    are found by searching for the preamble, so corrupted data is
+    skipped in one step rather than a byte at a time. Frames are
+    returned as memoryviews into the buffer without copying. A view
+    is only guaranteed to reflect the frame until the next feed() or
+    reset(); use tobytes() to keep it.
+
+    frame_offset is the stream offset of the last frame returned,
+    counted from the last reset()
+    '''
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+        self._base = 0
+        self.frame_offset = None
+        self.bad_checksums = 0
+        self.allow = None
+        self.verify_skipped = True
+        self._sums = None
+
+    def reset(self, offset=0):
+        '''discard any buffered data, with the stream now at the given offset'''
+        self._buf = bytearray()
+        self._pos = 0
+        self._sums = None
+        self._base = offset
+        self.frame_offset = None
+
+    def feed(self, data):
+        '''add some bytes to the stream'''
+        self._base += self._pos
+        self._sums = None
+        try:
+            if self._pos:
+                del self._buf[:self._pos]
+            self._buf.extend(data)
+        except BufferError:
+            # frames returned earlier are still referenced, leave them
+            # with the old buffer
+            self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+
+    def buffered(self):
+        '''return the number of bytes not yet consumed'''
+        return len(self._buf) - self._pos
+
+    def needed_bytes(self):
+        '''return the minimum number of bytes needed to complete the next frame'''
+        avail = len(self._buf) - self._pos
+        if avail < 6:
+            return 8 - avail
+        (length,) = struct.unpack_from('<H', self._buf, self._pos+4)
+        return max(length + 8 - avail, 1)
+
+    def next_frame(self):
+        '''return the next complete frame as a memoryview, or None if
+        more data is needed'''
+        if (self._sums is None and numpy is not None and
+            len(self._buf) - self._pos >= NUMPY_CHECKSUM_MIN):
+            # checksum everything buffered in one pass
+            self._sums = BufferChecksums(self._buf, self._pos, len(self._buf))
+        (start, end, bad) = find_frame(self._buf, self._pos, len(self._buf),
+                                       self.allow, self.verify_skipped, self._sums)
+        self.bad_checksums += bad
+        self._pos = start
+        if end is None:
+            return None
+        self._pos = end
+        self.frame_offset = self._base + start
+        return memoryview(self._buf)[start:end]
+
+    def frames(self):
+        '''iterate over all complete frames currently buffered'''
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+            # drop our reference so the buffer can be compacted
+            frame = None
+
+# message types that UBlox.special_handling() acts on
+SPECIAL_HANDLING_TYPES = set([(CLASS_CFG, MSG_CFG_NAV5), (CLASS_CFG, MSG_CFG_NAVX5)])
+
+try:
+    buffer
+    def _frame_view(obj, start, end):
+        '''return a read-only view of obj[start:end]'''
+        return buffer(obj, start, end-start)
+except NameError:
+    def _frame_view(obj, start, end):
+        '''return a read-only view of obj[start:end]'''
+        return memoryview(obj)[start:end]
+
+# bytes of a memory mapped log covered by each BufferChecksums
+MMAP_CHECKSUM_WINDOW = 1<<18
+
+class UBloxMmapLog:
+    '''read-only memory mapped UBlox log
+
+    Frames are found directly in the mapping and returned as read-only
+    views of it, so no per-message copies are made and processes
+    scanning the same log share the OS page cache. The views keep the
+    mapping alive after close(). Enough of the file interface is
+    provided for UBlox to read and seek it like an ordinary log
+    '''
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        self._map = None
+        self._size = 0
+        self._pos = 0
+        self.frame_offset = None
+        self.bad_checksums = 0
+        self.allow = None
+        self.verify_skipped = True
+        self._sums = None
+        self.remap()
+
+    def remap(self):
+        '''map the file again if it has grown, returning True if it has'''
+        size = os.fstat(self._file.fileno()).st_size
+        if size <= self._size:
+            return False
+        self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        self._size = size
+        self._sums = None
+        return True
+
+    def next_frame(self):
+        '''return the next complete frame as a read-only view, or None at
+        the end of the log'''
+        while True:
+            if self._map is None:
+                if not self.remap():
+                    return None
+            if (numpy is not None and self._pos < self._size and
+                (self._sums is None or not self._sums.covers(self._pos, self._pos+1))):
+                # checksum the mapping a window at a time
+                self._sums = BufferChecksums(self._map, self._pos, min(self._size, self._pos + MMAP_CHECKSUM_WINDOW))
+            (start, end, bad) = find_frame(self._map, self._pos, self._size,
+                                           self.allow, self.verify_skipped, self._sums)
+            self.bad_checksums += bad
+            self._pos = start
+            if end is not None:
+                break
+            if not self.remap():
+                return None
+        self._pos = end
+        self.frame_offset = start
+        return _frame_view(self._map, start, end)
+
+    def read(self, n):
+        '''read some bytes'''
+        if self._map is None or self._pos >= self._size:
+            self.remap()
+        if self._map is None:
+            return b''
+        data = self._map[self._pos:self._pos+n]
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        '''seek to a byte offset'''
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            self.remap()
+            offset += self._size
+        self._pos = max(int(offset), 0)
+
+    def tell(self):
+        '''return the current byte offset'''
+        return self._pos
+
+    def close(self):
+        '''close the log'''
+        self._file.close()
+        self._map = None
+
 class UBlox:
     '''main UBlox control class.
 
     port can be a file (for reading only) or a serial device
-    '''
-    def __init__(self, port, baudrate=115200, timeout=0):
 
-        self.serial_device = port
-        self.baudrate = baudrate
-        self.use_sendrecv = False
-        self.read_only = False
-        self.debug_level = 0
+    with lazy set, messages returned by receive_message() only decode
+    the fields that are actually accessed after unpack()
+
+    with use_mmap set, a log file is memory mapped and the messages
+    returned hold read-only views of the mapping rather than copies
+    '''
+    def __init__(self, port, baudrate=115200, timeout=0, lazy=True, use_mmap=False):
+        self._init_state(port, baudrate, lazy)
 
-        if isinstance(self.serial_device, file) or isinstance(self.serial_device, StringIO.StringIO):
+        if hasattr(self.serial_device, 'read'):
             self.dev = self.serial_device
             self.read_only = True
         elif self.serial_device.startswith("tcp:"):
@@ -701,16 +1320,40 @@ class UBlox:
             self.use_sendrecv = True
         elif os.path.isfile(self.serial_device):
             self.read_only = True
-            self.dev = open(self.serial_device, mode='rb')
+            if use_mmap:
+                self.dev = UBloxMmapLog(self.serial_device)
+            else:
+                self.dev = open(self.serial_device, mode='rb')
         else:
             import serial
             self.dev = serial.Serial(self.serial_device, baudrate=self.baudrate,
                                      dsrdtr=False, rtscts=False, xonxoff=False, timeout=timeout)
+
+    def _init_state(self, port, baudrate, lazy):
+        '''setup everything except the device itself'''
+        self.serial_device = port
+        self.baudrate = baudrate
+        self.use_sendrecv = False
+        self.read_only = False
+        self.lazy = lazy
+        self.debug_level = 0
+        self.framer = UBloxFramer()
+        # log files are read in large chunks. Live devices are asked
+        # for at least the bytes needed to complete the current frame
+        # and, with read_ahead set, whatever else they already have
+        # up to the chunk size, so most frames are framed from memory
+        self.read_chunk_size = 65536
+        self.read_ahead = True
         self.logfile = None
         self.log = None
         self.preferred_dynamic_model = None
         self.preferred_usePPP = None
         self.preferred_dgps_timeout = None
+        self.msg_filter = None
+        # subscribed handlers, keyed by (class, id)
+        self.handlers = {}
+        # configuration transaction collecting sent messages
+        self._transaction = None
 
     @staticmethod
     def pack_message(msg_class, msg_id, payload):
@@ -722,9 +1365,10 @@ class UBlox:
         return msg
 
     def close(self):
-	'''close the device'''
+        '''close the device and any log'''
         self.dev.close()
-	self.dev = None
+        self.dev = None
+        self.set_logfile(None)
 
     def set_debug(self, debug_level):
         '''set debug level'''
@@ -735,19 +1379,49 @@ class UBlox:
         if self.debug_level >= level:
             print(msg)
 
-    def set_logfile(self, logfile, append=False):
-	'''setup logging to a file'''
+    def set_logfile(self, logfile, append=False, background=False, rotate_size=None,
+                    rotate_interval=None, fsync_interval=None, compress=None):
+        '''setup logging to a file. With background set, or any of the
+        rotation, fsync or compression options, the log is written by a
+        UBloxLogWriter thread so slow storage can't stall the receive path'''
         if self.log is not None:
             self.log.close()
             self.log = None
         self.logfile = logfile
-        if self.logfile is not None:
+        if self.logfile is None:
+            return
+        if (background or rotate_size is not None or rotate_interval is not None or
+            fsync_interval is not None or compress is not None):
+            from . import logwriter
+            self.log = logwriter.UBloxLogWriter(self.logfile, append=append,
+                                                rotate_size=rotate_size,
+                                                rotate_interval=rotate_interval,
+                                                fsync_interval=fsync_interval,
+                                                compress=compress)
+        else:
             if append:
                 mode = 'ab'
             else:
                 mode = 'wb'
             self.log = open(self.logfile, mode=mode)
 
+    def set_message_filter(self, types=None, verify_checksum=True):
+        '''only receive messages with a (class, id) in the types list. Other
+        frames are skipped by the framer using just their header, and if
+        verify_checksum is False their checksums are not checked. The
+        configuration messages needed by special_handling() are always
+        framed. A types list of None removes the filter'''
+        if types is None:
+            self.msg_filter = None
+            allow = None
+        else:
+            self.msg_filter = set([tuple(t[:2]) for t in types])
+            allow = self.msg_filter | SPECIAL_HANDLING_TYPES
+        for framer in (self.framer, self.dev):
+            if isinstance(framer, (UBloxFramer, UBloxMmapLog)):
+                framer.allow = allow
+                framer.verify_skipped = verify_checksum
+
     def set_preferred_dynamic_model(self, model):
         '''set the preferred dynamic model for receiver'''
         self.preferred_dynamic_model = model
@@ -789,36 +1463,65 @@ class UBlox:
             try:
                 return self.dev.recv(n)
             except socket.error as e:
-                return ''
+                return b''
         return self.dev.read(n)
 
+    def fileno(self):
+        '''return the file descriptor of the device, for polling'''
+        return self.dev.fileno()
+
+    def read_size(self):
+        '''return the number of bytes to ask for in a blocking read'''
+        if self.read_only:
+            return self.read_chunk_size
+        needed = self.framer.needed_bytes()
+        if not self.read_ahead:
+            return needed
+        if self.use_sendrecv:
+            # recv() returns what has arrived, up to the size asked for
+            return max(needed, self.read_chunk_size)
+        return max(needed, min(self.dev.inWaiting(), self.read_chunk_size))
+
+    def read_available(self):
+        '''read the bytes that can be read without blocking, once
+        the device has been polled as ready. Returns an empty string
+        at end of file'''
+        if self.read_only:
+            return self.read(self.read_chunk_size)
+        if self.use_sendrecv:
+            return self.dev.recv(self.read_chunk_size)
+        return self.dev.read(max(self.dev.inWaiting(), 1))
+
     def send_nmea(self, msg):
         if not self.read_only:
             s = msg + "*%02X" % self.nmea_checksum(msg)
-            self.write(s)
+            self.write(s.encode('ascii'))
 
     def set_binary(self):
-	'''put a UBlox into binary mode using a NMEA string'''
+        '''put a UBlox into binary mode using a NMEA string'''
         if not self.read_only:
             print("try set binary at %u" % self.baudrate)
             for i in range(0,6):
                 self.send_nmea("$PUBX,41,%u,0007,0001,%u,0" % (i,self.baudrate))
 
     def seek_percent(self, pct):
-	'''seek to the given percentage of a file'''
-	self.dev.seek(0, 2)
-	filesize = self.dev.tell()
-	self.dev.seek(pct*0.01*filesize)
+        '''seek to the given percentage of a file'''
+        self.dev.seek(0, 2)
+        filesize = self.dev.tell()
+        self.seek(int(pct*0.01*filesize))
+
+    def seek(self, offset):
+        '''seek to a byte offset in a file'''
+        self.dev.seek(offset)
+        self.framer.reset(offset)
 
     def special_handling(self, msg):
         '''handle automatic configuration changes'''
-        try:
-            x = msg.name()
-        except UBloxError as e:
-            # ignore "ublox.ublox.UBloxError: Unknown message (0x00 0x00)  length=8"
+        msg_type = msg.msg_type()
+        if not msg_type in SPECIAL_HANDLING_TYPES:
             return
 
-        if msg.name() == 'CFG_NAV5':
+        if msg_type == (CLASS_CFG, MSG_CFG_NAV5):
             msg.unpack()
             sendit = False
             pollit = False
@@ -836,7 +1539,7 @@ class UBlox:
                 self.send(msg)
                 if pollit:
                     self.configure_poll(CLASS_CFG, MSG_CFG_NAV5)
-        if msg.name() == 'CFG_NAVX5':
+        if msg_type == (CLASS_CFG, MSG_CFG_NAVX5):
             msg.unpack()
             if (((self.preferred_usePPP is not None) and msg.usePPP != self.preferred_usePPP)
                 or msg.ackAiding != 1):
@@ -852,27 +1555,117 @@ class UBlox:
                 self.configure_poll(CLASS_CFG, MSG_CFG_NAVX5)
 
 
+    def feed(self, data):
+        '''add bytes received from the device, logging them'''
+        self.framer.feed(data)
+        if self.log is not None:
+            self.log.write(data)
+            self.log.flush()
+
+    def next_buffered_message(self):
+        '''return the next message from the data already received, or
+        None if more data is needed. This is the non-blocking part of
+        receive_message(), for callers that do their own reading'''
+        while True:
+            frame = self.framer.next_frame()
+            if frame is None:
+                return None
+            msg = UBloxMessage()
+            msg._buf = frame.tobytes()
+            msg._checked_buf = msg._buf
+            msg._lazy_unpack = self.lazy
+            frame = None
+            self.special_handling(msg)
+            if self.msg_filter is not None and not msg.msg_type() in self.msg_filter:
+                continue
+            return msg
+
     def receive_message(self, ignore_eof=False):
-	'''blocking receive of one ublox message'''
-        msg = UBloxMessage()
+        '''blocking receive of one ublox message'''
+        if isinstance(self.dev, UBloxMmapLog):
+            return self.receive_mapped_message(ignore_eof=ignore_eof)
         while True:
-            n = msg.needed_bytes()
-            b = self.read(n)
+            msg = self.next_buffered_message()
+            if msg is not None:
+                return msg
+            b = self.read(self.read_size())
             if not b:
                 if ignore_eof:
                     time.sleep(0.01)
                     continue
                 return None
-            msg.add(b)
+            self.feed(b)
+
+    def receive_mapped_message(self, ignore_eof=False):
+        '''receive one ublox message from a memory mapped log'''
+        while True:
+            frame = self.dev.next_frame()
+            if frame is None:
+                if not ignore_eof:
+                    return None
+                time.sleep(0.01)
+                continue
+            msg = UBloxMessage()
+            msg._buf = frame
+            msg._checked_buf = frame
+            msg._lazy_unpack = self.lazy
             if self.log is not None:
-                self.log.write(b)
+                self.log.write(frame)
                 self.log.flush()
-            if msg.valid():
-                self.special_handling(msg)
-                return msg
+            self.special_handling(msg)
+            if self.msg_filter is not None and not msg.msg_type() in self.msg_filter:
+                continue
+            return msg
+
+    def _type_list(self, msg_types):
+        '''return a list of (class, id) tuples from a single type or a
+        sequence of types. Longer keys, like the (class, id, type) of
+        MGA messages, are cut to the (class, id) of their frames'''
+        if len(msg_types) > 0 and isinstance(msg_types[0], int):
+            return [tuple(msg_types[:2])]
+        return [tuple(t[:2]) for t in msg_types]
+
+    def subscribe(self, msg_types, handler):
+        '''call handler(msg) from dispatch() for each message with a
+        (class, id) in msg_types, which may also be a single type
+        tuple. Messages of types that can be decoded by (class, id) are
+        unpacked before the handler is called'''
+        for t in self._type_list(msg_types):
+            self.handlers.setdefault(t, []).append(handler)
+
+    def unsubscribe(self, msg_types, handler):
+        '''remove a handler added with subscribe()'''
+        for t in self._type_list(msg_types):
+            handlers = self.handlers.get(t, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self.handlers.pop(t, None)
+
+    def dispatch(self, msg):
+        '''pass a message to the handlers subscribed to its type. Messages
+        of other types are not unpacked. Returns True if there was a
+        handler for the message'''
+        handlers = self.handlers.get(msg.msg_type(), None)
+        if handlers is None:
+            return False
+        if msg.msg_type() in msg_types:
+            msg.unpack()
+        for h in handlers:
+            h(msg)
+        return True
+
+    def dispatch_messages(self, ignore_eof=False):
+        '''receive messages and dispatch them to their handlers until the
+        end of the input'''
+        while True:
+            msg = self.receive_message(ignore_eof=ignore_eof)
+            if msg is None:
+                return
+            self.dispatch(msg)
 
     def receive_message_noerror(self, ignore_eof=False):
-	'''blocking receive of one ublox message, ignoring errors'''
+        '''blocking receive of one ublox message, ignoring errors'''
         try:
             return self.receive_message(ignore_eof=ignore_eof)
         except UBloxError as e:
@@ -885,58 +1678,67 @@ class UBlox:
             return None
 
     def send(self, msg):
-	'''send a preformatted ublox message'''
+        '''send a preformatted ublox message. Inside a transaction()
+        block, CFG messages are added to the transaction instead'''
         if not msg.valid():
             self.debug(1, "invalid send")
             return
+        if self._transaction is not None and self._transaction.collect(msg):
+            return
         if not self.read_only:
-            self.write(msg._buf)        
+            return self.write(msg._buf)
+
+    def transaction(self, window=8, timeout=1.0, retries=3):
+        '''return a UBloxConfigTransaction for sending CFG messages with
+        acknowledgement tracking, for use in a with block'''
+        from . import transaction
+        return transaction.UBloxConfigTransaction(self, window=window, timeout=timeout, retries=retries)
 
     def send_message(self, msg_class, msg_id, payload):
-	'''send a ublox message with class, id and payload'''
+        '''send a ublox message with class, id and payload'''
         msg = self.pack_message(msg_class, msg_id, payload)
-        self.send(msg)
+        return self.send(msg)
 
     def configure_solution_rate(self, rate_ms=200, nav_rate=1, timeref=0):
-	'''configure the solution rate in milliseconds'''
+        '''configure the solution rate in milliseconds'''
         payload = struct.pack('<HHH', rate_ms, nav_rate, timeref)
-        self.send_message(CLASS_CFG, MSG_CFG_RATE, payload)
+        return self.send_message(CLASS_CFG, MSG_CFG_RATE, payload)
 
     def configure_message_rate(self, msg_class, msg_id, rate):
-	'''configure the message rate for a given message'''
+        '''configure the message rate for a given message'''
         payload = struct.pack('<BBB', msg_class, msg_id, rate)
-        self.send_message(CLASS_CFG, MSG_CFG_SET_RATE, payload)
+        return self.send_message(CLASS_CFG, MSG_CFG_SET_RATE, payload)
 
     def configure_port(self, port=1, inMask=3, outMask=3, mode=2240, baudrate=None):
-	'''configure a IO port'''
+        '''configure a IO port'''
         if baudrate is None:
             baudrate = self.baudrate
         payload = struct.pack('<BBHIIHHHH', port, 0xff, 0, mode, baudrate, inMask, outMask, 0xFFFF, 0xFFFF)
-        self.send_message(CLASS_CFG, MSG_CFG_PRT, payload)
+        return self.send_message(CLASS_CFG, MSG_CFG_PRT, payload)
 
     def configure_loadsave(self, clearMask=0, saveMask=0, loadMask=0, deviceMask=0):
-	'''configure configuration load/save'''
+        '''configure configuration load/save'''
         payload = struct.pack('<IIIB', clearMask, saveMask, loadMask, deviceMask)
-        self.send_message(CLASS_CFG, MSG_CFG_CFG, payload)
+        return self.send_message(CLASS_CFG, MSG_CFG_CFG, payload)
 
-    def configure_poll(self, msg_class, msg_id, payload=''):
-	'''poll a configuration message'''
-        self.send_message(msg_class, msg_id, payload)
+    def configure_poll(self, msg_class, msg_id, payload=b''):
+        '''poll a configuration message'''
+        return self.send_message(msg_class, msg_id, payload)
 
     def configure_poll_port(self, portID=None):
-	'''poll a port configuration'''
+        '''poll a port configuration'''
         if portID is None:
-            self.configure_poll(CLASS_CFG, MSG_CFG_PRT)
+            return self.configure_poll(CLASS_CFG, MSG_CFG_PRT)
         else:
-            self.configure_poll(CLASS_CFG, MSG_CFG_PRT, struct.pack('<B', portID))
+            return self.configure_poll(CLASS_CFG, MSG_CFG_PRT, struct.pack('<B', portID))
 
     def configure_min_max_sats(self, min_sats=4, max_sats=32):
         '''Set the minimum/maximum number of satellites for a solution in the NAVX5 message'''
         payload = struct.pack('<HHIBBBBBBBBBBHIBBBBBBHII', 0, 4, 0, 0, 0, min_sats, max_sats, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
-        self.send_message(CLASS_CFG, MSG_CFG_NAVX5, payload)
+        return self.send_message(CLASS_CFG, MSG_CFG_NAVX5, payload)
 
     def module_reset(self, set, mode):
         ''' Reset the module for hot/warm/cold start'''
         payload = struct.pack('<HBB', set, mode, 0)
-        self.send_message(CLASS_CFG, MSG_CFG_RST, payload)
+        return self.send_message(CLASS_CFG, MSG_CFG_RST, payload)
 